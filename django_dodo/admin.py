@@ -1,3 +1,5 @@
+import hashlib
+
 from django.contrib import admin
 from django.contrib.admin.options import csrf_protect_m
 from django.core.cache import cache
@@ -9,9 +11,11 @@ from django.template import RequestContext
 
 import pytz
 
+from . import config
 from .models import (EmailTemplate, EmailWidget, EmailContentItem,
-                     EmailButton, EmailTheme, UserEmail, EmailStats)
+                     EmailButton, EmailTheme, UserEmail, EmailStats, OutboxMessage)
 from .forms import EmailWidgetFormSet, EmailWidgetForm
+from .utils.render import get_render_generation
 
 
 class EmailModelAdmin(admin.ModelAdmin):
@@ -111,8 +115,22 @@ class EmailTemplateAdmin(EmailModelAdmin):
         ]
         return extra_patterns + urlpatterns
 
+    def get_preview_cache_key(self, request):
+        """
+        Key the preview on the posted form and the current render generation,
+        which changes whenever a widget, theme or button is edited.
+        """
+        data = sorted((key, values) for key, values in request.POST.lists() if key != 'csrfmiddlewaretoken')
+        digest = hashlib.sha1(repr((request.GET.get('object_id'), data)).encode('utf-8')).hexdigest()
+        return 'django_dodo:preview:{}:{}'.format(get_render_generation(), digest)
+
     def preview_view(self, request):
         if request.method == 'POST':
+            cache_key = self.get_preview_cache_key(request)
+            rendered_email = cache.get(cache_key)
+            if rendered_email is not None:
+                return JsonResponse(rendered_email)
+
             obj = None
             object_id = request.GET.get('object_id', None)
             if object_id:
@@ -122,14 +140,13 @@ class EmailTemplateAdmin(EmailModelAdmin):
             form = ModelForm(request.POST, request.FILES)
             instance = form.save(commit=False)
 
-            widgets_list = form.data['widgets'].split(',')
-            widgets = []
-            for widget in widgets_list:
-                widgets.append(EmailWidget.objects.get(pk=widget))
+            widget_ids = [int(pk) for pk in form.data['widgets'].split(',') if pk]
+            widgets = EmailWidget.get_render_widgets(widget_ids)
 
             context = {'email_template': instance, 'widgets': widgets}
             # rendered_email = instance.render_preview(settings.PREVIEW_EMAIL, context=context)
             rendered_email = instance.render_preview(context=context)
+            cache.set(cache_key, rendered_email, config.PREVIEW_CACHE_TIMEOUT)
             return JsonResponse(rendered_email)
 
         return HttpResponse('Unable to process.', content_type='text/plain')
@@ -149,6 +166,15 @@ class UserEmailAdmin(admin.ModelAdmin):
         return False
 
 
+@register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('email_model', 'email_id', 'status', 'attempts', 'next_attempt_at', 'claimed_by', 'created_at')
+    list_filter = ('status', 'email_model')
+
+    def has_add_permission(self, request):
+        return False
+
+
 @register(EmailStats)
 class EmailStatsAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'delivery_attempts', 'bounces', 'complaints', 'rejects')
@@ -1,4 +1,4 @@
-from django_dodo.backends.base import BaseServiceEmailBackend
+from django_dodo.backends.base import AsyncServiceEmailBackend, BaseServiceEmailBackend
 from django_dodo.services.amazon_ses import AmazonSEService
 
 
@@ -16,3 +16,17 @@ class AmazonSESBackend(BaseServiceEmailBackend):
         """
         self.service = AmazonSEService()
         self.fail_silently = fail_silently
+
+
+class AsyncAmazonSESBackend(AsyncServiceEmailBackend):
+    """
+    Amazon SES email backend sending each batch concurrently from a single
+    thread through the asyncio service.
+    """
+
+    def __init__(self, fail_silently=False, *args, **kwargs):
+        # Imported here, the asyncio service needs Python 3.5 and aiohttp
+        from django_dodo.services.amazon_ses_async import AsyncAmazonSEService
+
+        self.service = AsyncAmazonSEService(**kwargs)
+        self.fail_silently = fail_silently
@@ -1,27 +1,41 @@
 import logging
-from time import sleep
 
-from boto.ses import SESConnection, connect_to_region
 # from boto.regioninfo import RegionInfo
 
 from django.conf import settings
 from django.core.mail.backends.base import BaseEmailBackend
-from django.core.cache import cache
 
-LOG = logging.getLogger(__name__)
+from django_dodo import config
+from django_dodo.backends.rate_limit import DEFAULT_MAX_SEND_RATE, get_max_send_rate, get_send_quota
+from django_dodo.services.amazon_ses import get_ses_connection
+from django_dodo.backends.throttling import ThrottledSender
+from django_dodo.utils import metrics
+from django_dodo.utils.concurrency import map_with_connections
+from django_dodo.utils.mime import get_raw_message
 
-DAILY_SECONDS = 24 * 60 * 60
+LOG = logging.getLogger(__name__)
 
 
 class SESBackend(BaseEmailBackend):
 
-    def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, region_name=None, region_endpoint=None):
+    def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, region_name=None, region_endpoint=None,
+                 rate_limiter=None, concurrency=None, lane=None, connection_factory=None, fail_silently=False,
+                 **kwargs):
+        super(SESBackend, self).__init__(fail_silently=fail_silently)
         self.aws_access_key_id = getattr(settings, 'AWS_SES_ACCESS_KEY_ID', aws_access_key_id)
         self.aws_secret_access_key = getattr(settings, 'AWS_SES_SECRET_ACCESS_KEY', aws_secret_access_key)
         self.region_name = getattr(settings, 'AWS_SES_REGION_NAME', region_name)
         self.region_endpoint = getattr(settings, 'AWS_SES_REGION_ENDPOINT', region_endpoint)
         self.region = None
         self.connection = None
+        self.sender = ThrottledSender(lambda: self.get_max_send_rate(), rate_limiter=rate_limiter, lane=lane)
+        self.connection_factory = connection_factory
+        self.concurrency = concurrency or config.SEND_CONCURRENCY
+
+    def _connect(self):
+        if self.connection_factory:
+            return self.connection_factory()
+        return get_ses_connection(self.aws_access_key_id, self.aws_secret_access_key, region_name=self.region_name)
 
     def open(self):
         # if self.region is None:
@@ -29,71 +43,87 @@ class SESBackend(BaseEmailBackend):
         if self.connection:
             return
 
-        self.connection = connect_to_region(self.region_name,
-                                            aws_access_key_id=self.aws_access_key_id,
-                                            aws_secret_access_key=self.aws_secret_access_key)
+        self.connection = self._connect()
 
-    def _send_email(self, email_message):
-        if not email_message.to_recipients:
+    def _send_email(self, email_message, connection=None):
+        if not email_message.to:
             return False
 
-        try:
-            self.connection.send_mail(email_message.from_email,
-                                      email_message.subject,
-                                      email_message.body,
-                                      email_message.to_recipients,
-                                      cc_addresses=email_message.cc_recipients,
-                                      bcc_addresses=email_message.bcc_recipients,
-                                      return_path=settings.MAIL_FROM_DOMAIN)
-        except Exception as e:
-            LOG.error('Failed to send email: %s', e)
+        connection = connection or self.connection
+        connection.send_email(email_message.from_email,
+                              email_message.subject,
+                              email_message.body,
+                              email_message.to,
+                              cc_addresses=email_message.cc,
+                              bcc_addresses=email_message.bcc,
+                              return_path=settings.MAIL_FROM_DOMAIN)
+        return True
+
+    def _send_raw_email(self, email_message, connection=None):
+        if not email_message.to:
             return False
 
+        connection = connection or self.connection
+        connection.send_raw_email(get_raw_message(email_message),
+                                  email_message.from_email,
+                                  email_message.recipients())
         return True
 
-    def _send_raw_email(self, email_message):
-        if not email_message.to_recipients:
-            return False
+    def _send_message(self, connection, email_message):
+        """
+        Send one message, retrying with a jittered backoff while SES throttles
+        it, see ThrottledSender.
 
-        try:
-            self.connection.send_raw_email(email_message,
-                                           email_message.from_email,
-                                           email_message.to_recipients)
-        except Exception as e:
-            LOG.error('Failed to send raw email: %s', e)
-            return False
+        :return: True if the message was sent
+        """
+        send = self._send_raw_email if getattr(email_message, 'alternatives', None) else self._send_email
+        return bool(self.sender.send(lambda: send(email_message, connection=connection)))
 
-        return True
+    def get_rate_limiter(self):
+        """
+        The token bucket every SES backend and worker draws from, sized from
+        the account's MaxSendRate. A backend of a priority lane draws from
+        the lane's bucket, with the lane's share of the rate.
+        """
+        return self.sender.get_rate_limiter()
+
+    def get_controller(self):
+        return self.sender.get_controller()
+
+    def get_concurrency(self):
+        """
+        The number of parallel senders, kept below the account's MaxSendRate
+        as each sender needs at least one message per second.
+        """
+        return max(1, min(self.concurrency, int(self.get_max_send_rate())))
 
-    def delay(self, num_sent):
+    def send_each(self, email_messages):
         """
-        Delay the email sending if needed
+        Send the messages, in parallel if a concurrency was configured. Once
+        the daily quota is exceeded the rest of the messages are not sent.
 
-        :param num_sent: current emails sent in the batch
-        :return: None
+        :return: a list with True for each message sent, in input order
         """
-        rates = self.get_send_rates()
+        self.sender.start()
+        concurrency = self.get_concurrency()
+        if concurrency > 1 and len(email_messages) > 1:
+            # The sender threads time their stages for the caller's email type
+            email_type = metrics.registry.get_email_type()
 
-        seconds_delay = DAILY_SECONDS/(rates['Max24HourSend'] - rates['SentLast24Hours'])
-        if num_sent > rates['MaxSendRate']:
-            sleep(seconds_delay*2)
+            def send_message(connection, email_message):
+                with metrics.email_type(email_type):
+                    return self._send_message(connection, email_message)
+
+            return map_with_connections(send_message, email_messages, concurrency, self._connect)
+
+        self.open()
+        return [self._send_message(self.connection, email_message) for email_message in email_messages]
 
     def send_messages(self, email_messages):
         if not email_messages:
             return
 
-        num_sent = 0
-        for email_message in email_messages:
-            self.delay(num_sent)
-            self.open()
-            if email_message.alternatives:
-                if self._send_raw_email(email_message):
-                    num_sent += 1
-            else:
-                if self._send_email(email_message):
-                    num_sent += 1
-
-        return num_sent
+        return sum(1 for sent in self.send_each(list(email_messages)) if sent)
 
     # def send_mass_mail(self, email_messages):
     #     self.send_messages(email_messages)
@@ -139,21 +169,22 @@ class SESBackend(BaseEmailBackend):
         """
         self.open()
         response_dict = self.connection.get_send_statistics()
-        return response_dict['GetSendStatisticsResponse']['GetSendStatisticsResponse']['SendDataPoints']
+        return response_dict['GetSendStatisticsResponse']['GetSendStatisticsResult']['SendDataPoints']
+
+    def _get_send_quota_result(self):
+        return self.get_send_quota()['GetSendQuotaResponse']['GetSendQuotaResult']
 
     def get_send_rates(self, current=False):
         """
-        Get the maximum send rate, we cache the value for 2 minutes to reduce calls to AWS.
+        Get the send quota, we cache the value for 2 minutes to reduce calls to AWS.
         This may need future review, but for now we try.
 
-        :return: The MaxSendRate
+        :return: The GetSendQuotaResult dict, or DEFAULT_MAX_SEND_RATE if it cannot be fetched
         """
         try:
-            if current:
-                response_dict = self.get_send_quota()
-            else:
-                response_dict = cache.get_or_set('ses_send_rate', self.get_send_quota(), 120)
+            return get_send_quota(self._get_send_quota_result, current=current)
         except Exception:
-            return 2
+            return DEFAULT_MAX_SEND_RATE
 
-        return response_dict['GetSendQuotaResponse']['GetSendQuotaResult']
+    def get_max_send_rate(self):
+        return get_max_send_rate(self._get_send_quota_result)
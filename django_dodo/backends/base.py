@@ -65,3 +65,33 @@ class BaseServiceEmailBackend(BaseEmailBackend):
             if not self.fail_silently:
                 raise
 
+
+class AsyncServiceEmailBackend(BaseServiceEmailBackend):
+    """
+    Email backend for an AsyncEmailService. Django backends are synchronous,
+    so each call to send_messages runs the service on its own event loop,
+    opening and closing its connections around the batch.
+    """
+
+    def open(self):
+        """
+        The connections belong to an event loop, they are opened for each batch
+        """
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        """
+        Sends the messages concurrently using the asyncio service
+
+        Arguments:
+        - `messages`: The list of EmailMessage instances to send
+        """
+        try:
+            return sum(1 for sent in self.service.send_messages_sync(messages) if sent)
+        except Exception as e:
+            logger.error("Sending email messages failed: %s" % e)
+            if not self.fail_silently:
+                raise
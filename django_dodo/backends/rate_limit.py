@@ -0,0 +1,268 @@
+"""
+Send rate limiting shared by every backend and worker process.
+"""
+from __future__ import division
+
+import logging
+import threading
+import time
+
+from django.core.cache import cache as default_cache
+
+from django_dodo import config
+from django_dodo.lanes import LANES, TRANSACTIONAL
+
+LOG = logging.getLogger(__name__)
+
+# Used when the quota cannot be fetched from AWS
+DEFAULT_MAX_SEND_RATE = 2
+# The GetSendQuotaResult of the account, shared by every sender
+SEND_QUOTA_CACHE_KEY = 'django_dodo:ses_send_quota'
+SEND_QUOTA_TIMEOUT = 120
+
+
+class LocalCache(object):
+    """
+    A minimal in-process stand-in for the Django cache, with the atomic
+    `add` the token bucket needs. Meant for tests.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _expired(self, key):
+        value, expires = self.data.get(key, (None, None))
+        return expires is not None and expires <= self.clock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data or self._expired(key):
+                return default
+            return self.data[key][0]
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.data[key] = (value, None if timeout is None else self.clock() + timeout)
+
+    def get_many(self, keys):
+        return dict((key, self.get(key)) for key in keys if self.get(key) is not None)
+
+    def add(self, key, value, timeout=None):
+        with self.lock:
+            if key in self.data and not self._expired(key):
+                return False
+            self.data[key] = (value, None if timeout is None else self.clock() + timeout)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+class TokenBucket(object):
+    """
+    A token bucket refilled with `rate` tokens per second, shared through the
+    cache by every process using the same `name`. The cache holds the tokens
+    left and when they were counted, updated under a short lock taken with
+    `add`, so N workers together never go above `rate` and never burst more
+    than the capacity of the bucket, a second of tokens.
+
+    A rate below one token per second gets a bucket holding a single token.
+
+    A rate adapted to the provider's throttling with `set_shared_rate` is
+    stored in the cache too, and picked up by the other processes within a
+    second.
+    """
+    KEY = 'django_dodo:token_bucket:{name}'
+    LOCK_KEY = 'django_dodo:token_bucket_lock:{name}'
+    # Held for a few cache calls, expires if its process dies holding it
+    LOCK_TIMEOUT = 1
+    RATE_KEY = 'django_dodo:token_bucket_rate:{name}'
+    RATE_CHANGE_KEY = 'django_dodo:token_bucket_rate_change:{name}'
+    # Without throttles for this long the processes start from their own rate again
+    RATE_TIMEOUT = 60 * 10
+
+    def __init__(self, rate, name='ses', cache=None, clock=time.time, sleep=time.sleep):
+        self.name = name
+        self.cache = cache if cache is not None else default_cache
+        self.clock = clock
+        self.sleep = sleep
+        self.next_sync = None
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """
+        Change the rate, e.g. when the provider throttles the sends.
+        """
+        if rate <= 0:
+            raise ValueError('The rate must be positive')
+
+        self.rate = rate
+        # The time a full bucket takes to refill, the unit the lanes track activity in
+        self.window = max(1.0, 1 / rate)
+        self.capacity = max(1, int(rate * self.window))
+
+    def set_shared_rate(self, rate):
+        """
+        Change the rate of every process using the bucket.
+        """
+        self.set_rate(rate)
+        self.cache.set(self.RATE_KEY.format(name=self.name), rate, self.RATE_TIMEOUT)
+
+    def sync_rate(self):
+        """
+        Pick up the rate another process set with `set_shared_rate`.
+        """
+        rate = self.cache.get(self.RATE_KEY.format(name=self.name))
+        if rate is not None and rate != self.rate:
+            self.set_rate(rate)
+
+    def claim_rate_change(self, cooldown):
+        """
+        :return: True for the first process asking in each `cooldown` seconds
+        """
+        return self.cache.add(self.RATE_CHANGE_KEY.format(name=self.name), True, max(1, int(cooldown)))
+
+    def try_acquire(self, tokens=1):
+        """
+        Take `tokens` tokens if the bucket has that many left, at most the
+        capacity of the bucket.
+
+        :return: (True, 0) when the tokens were taken, otherwise (False, the
+            seconds until the bucket holds them)
+        """
+        now = self.clock()
+        if self.next_sync is None or now >= self.next_sync:
+            self.next_sync = now + 1
+            self.sync_rate()
+
+        # What a lane must leave in the bucket for the others
+        floor = self.capacity - self.get_limit(int(now // self.window))
+        lock_key = self.LOCK_KEY.format(name=self.name)
+        if not self.cache.add(lock_key, True, self.LOCK_TIMEOUT):
+            return False, min(0.01, 1 / self.rate)
+
+        try:
+            key = self.KEY.format(name=self.name)
+            # A bucket missing from the cache has been idle long enough to be full
+            level, updated = self.cache.get(key) or (self.capacity, now)
+            level = min(self.capacity, level + max(0, now - updated) * self.rate)
+            # Tolerate the rounding of the refill after waiting the exact time
+            if level - tokens + 1e-9 < floor:
+                return False, (floor + tokens - level) / self.rate
+
+            self.cache.set(key, (level - tokens, now), int(self.capacity / self.rate) + 1)
+        finally:
+            self.cache.delete(lock_key)
+        return True, 0
+
+    def get_limit(self, window):
+        """
+        The tokens that may be taken out of a full bucket during `window`.
+        """
+        return self.capacity
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` tokens are available and take them, as many as
+        a window allows at a time, e.g. one per destination of a bulk send.
+
+        :return: the seconds spent waiting
+        """
+        waited = 0
+        while tokens > 0:
+            part = min(tokens, self.get_limit(int(self.clock() // self.window)))
+            acquired, wait = self.try_acquire(part)
+            if acquired:
+                tokens -= part
+                continue
+            self.sleep(wait)
+            waited += wait
+        return waited
+
+
+class LaneTokenBucket(TokenBucket):
+    """
+    A priority lane's view of the shared token bucket `name`. Every lane
+    draws from the same bucket, so together they stay within its rate.
+
+    A lane with `reserved_for` leaves `reserve`, a share of the capacity, in
+    the bucket while that lane took tokens in this window or the last one,
+    and borrows the whole rate while it is idle. The reserved lane thus
+    finds tokens waiting once it becomes busy again.
+    """
+    ACTIVE_KEY = 'django_dodo:token_bucket_active:{name}:{lane}:{window}'
+
+    def __init__(self, rate, lane, reserve=0, reserved_for=None, **kwargs):
+        self.lane = lane
+        self.reserve = reserve
+        self.reserved_for = reserved_for
+        self.active_window = None
+        self.limit = (None, None)
+        super(LaneTokenBucket, self).__init__(rate, **kwargs)
+
+    def get_limit(self, window):
+        if self.reserved_for is None:
+            return self.capacity
+
+        limit_window, limit = self.limit
+        if limit_window != window:
+            keys = [self.ACTIVE_KEY.format(name=self.name, lane=self.reserved_for, window=active_window)
+                    for active_window in (window - 1, window)]
+            if self.cache.get_many(keys):
+                limit = max(1, self.capacity - int(self.capacity * self.reserve))
+            else:
+                limit = self.capacity
+            self.limit = (window, limit)
+        return limit
+
+    def try_acquire(self, tokens=1):
+        acquired, wait = super(LaneTokenBucket, self).try_acquire(tokens)
+        window = int(self.clock() // self.window)
+        if acquired and window != self.active_window:
+            # Once per window, for the lanes giving way to this one
+            self.active_window = window
+            key = self.ACTIVE_KEY.format(name=self.name, lane=self.lane, window=window)
+            self.cache.set(key, True, int(self.window) * 2 + 1)
+        return acquired, wait
+
+
+def get_lane_rate_limiter(lane, max_send_rate, name='ses', **kwargs):
+    """
+    The token bucket of a priority lane. Transactional emails may use all of
+    `max_send_rate`, marketing emails leave config.TRANSACTIONAL_RATE_SHARE
+    of the bucket while transactional emails are being sent.
+    """
+    if lane not in LANES:
+        raise ValueError('Unknown lane: {}'.format(lane))
+
+    if lane == TRANSACTIONAL:
+        return LaneTokenBucket(max_send_rate, lane, name=name, **kwargs)
+    return LaneTokenBucket(max_send_rate, lane, reserve=config.TRANSACTIONAL_RATE_SHARE,
+                           reserved_for=TRANSACTIONAL, name=name, **kwargs)
+
+
+def get_send_quota(fetch, current=False):
+    """
+    The GetSendQuotaResult of the account, a dict of its values, cached for
+    2 minutes to reduce calls to AWS unless `current`.
+
+    :param fetch: a callable returning the GetSendQuotaResult
+    """
+    if current:
+        return fetch()
+    return default_cache.get_or_set(SEND_QUOTA_CACHE_KEY, fetch, SEND_QUOTA_TIMEOUT)
+
+
+def get_max_send_rate(fetch):
+    """
+    The account's MaxSendRate, or DEFAULT_MAX_SEND_RATE when the quota
+    cannot be fetched, see `get_send_quota`.
+    """
+    try:
+        return float(get_send_quota(fetch)['MaxSendRate'])
+    except Exception as e:
+        LOG.warning('Cannot get the send quota, using a rate of %s: %s', DEFAULT_MAX_SEND_RATE, e)
+        return DEFAULT_MAX_SEND_RATE
@@ -0,0 +1,201 @@
+"""
+Provider throttling feedback: classifying errors, backing off and adapting
+the send rate.
+"""
+from __future__ import division
+
+import logging
+import random
+import threading
+import time
+
+from boto.ses.exceptions import SESDailyQuotaExceededError, SESMaxSendingRateExceededError
+
+from django_dodo import config
+from django_dodo.backends.rate_limit import TokenBucket, get_lane_rate_limiter
+from django_dodo.utils import metrics
+
+LOG = logging.getLogger(__name__)
+
+THROTTLED = 'throttled'
+QUOTA_EXCEEDED = 'quota_exceeded'
+
+
+def classify_error(error):
+    """
+    Tell the provider's throttling and quota errors from other failures.
+
+    :return: THROTTLED, QUOTA_EXCEEDED or None
+    """
+    if isinstance(error, SESMaxSendingRateExceededError):
+        return THROTTLED
+    if isinstance(error, SESDailyQuotaExceededError):
+        return QUOTA_EXCEEDED
+
+    # Raw API errors, e.g. `Throttling: Maximum sending rate exceeded.`
+    code = getattr(error, 'error_code', None) or ''
+    message = getattr(error, 'error_message', None) or str(error)
+    if code == 'Throttling' or message.startswith('Throttling'):
+        return QUOTA_EXCEEDED if 'quota' in message.lower() else THROTTLED
+    return None
+
+
+def get_backoff(attempt, base, cap=60 * 60):
+    """
+    Exponential backoff with full jitter: a random delay of up to
+    `base * 2 ** attempt` seconds, at most `cap`.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AIMDController(object):
+    """
+    Additive increase, multiplicative decrease of a send rate. Each throttle
+    multiplies the rate by `decrease`, at most once per `cooldown` seconds so
+    a burst of throttles from one overshoot only counts once. After each
+    second's worth of successful sends the rate grows by `increase`, up to
+    `max_rate`.
+
+    The rate is shared by every process drawing from `rate_limiter`, the
+    TokenBucket of the sender, and a throttle seen by several processes at
+    once only decreases it once per `cooldown`.
+    """
+
+    def __init__(self, rate_limiter, max_rate, min_rate=1, increase=1, decrease=0.5, cooldown=1,
+                 clock=time.time):
+        self.rate_limiter = rate_limiter
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.clock = clock
+        self.rate = rate_limiter.rate
+        self.successes = 0
+        self.last_decrease = None
+        self.lock = threading.Lock()
+
+    def _set_rate(self, rate):
+        self.rate = rate
+        self.successes = 0
+        self.rate_limiter.set_shared_rate(rate)
+
+    def on_success(self):
+        with self.lock:
+            # Start from the rate the other processes may have changed
+            self.rate = self.rate_limiter.rate
+            self.successes += 1
+            if self.successes >= self.rate and self.rate < self.max_rate:
+                self._set_rate(min(self.max_rate, self.rate + self.increase))
+
+    def on_throttle(self):
+        with self.lock:
+            now = self.clock()
+            if self.last_decrease is not None and now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            if not self.rate_limiter.claim_rate_change(self.cooldown):
+                # Another process already decreased it for this overshoot
+                return
+            self._set_rate(max(self.min_rate, self.rate_limiter.rate * self.decrease))
+
+
+class ThrottledSender(object):
+    """
+    Sends through the shared token bucket, retrying with a jittered backoff
+    while the provider throttles and adapting the rate with an
+    AIMDController. Once the daily quota is exceeded `quota_exceeded` is set
+    and the rest of the batch is not sent, until `start` begins the next one.
+
+    Every SES sender, sync or asyncio, sends through one of these.
+    """
+
+    def __init__(self, get_max_send_rate, rate_limiter=None, lane=None):
+        """
+        :param get_max_send_rate: a callable returning the account's MaxSendRate
+        :param rate_limiter: the token bucket, by default the one of `lane`
+            or else of every SES sender, sized from the MaxSendRate
+        """
+        self.get_max_send_rate = get_max_send_rate
+        self.rate_limiter = rate_limiter
+        self.lane = lane
+        self.controller = None
+        self.quota_exceeded = threading.Event()
+
+    def get_rate_limiter(self):
+        if self.rate_limiter is None:
+            if self.lane:
+                self.rate_limiter = get_lane_rate_limiter(self.lane, self.get_max_send_rate())
+            else:
+                self.rate_limiter = TokenBucket(self.get_max_send_rate(), name='ses')
+        return self.rate_limiter
+
+    def get_controller(self):
+        """
+        The AIMD controller adapting the rate limiter to SES throttling,
+        between config.THROTTLE_MIN_RATE and the rate it started from.
+        """
+        if self.controller is None:
+            rate_limiter = self.get_rate_limiter()
+            self.controller = AIMDController(rate_limiter, rate_limiter.rate, min_rate=config.THROTTLE_MIN_RATE)
+        return self.controller
+
+    def start(self):
+        self.quota_exceeded.clear()
+
+    def on_success(self, tokens=1):
+        controller = self.get_controller()
+        for _ in range(tokens):
+            controller.on_success()
+        metrics.increment('sent', tokens)
+
+    def on_error(self, error, attempt):
+        """
+        Handle a failed attempt to send.
+
+        :return: the seconds to wait before the next attempt, or None when
+            the send failed for good
+        """
+        kind = classify_error(error)
+        if kind:
+            metrics.increment(kind)
+        if kind == THROTTLED and attempt < config.THROTTLE_RETRIES:
+            self.get_controller().on_throttle()
+            return get_backoff(attempt, config.THROTTLE_BACKOFF)
+
+        if kind == QUOTA_EXCEEDED:
+            self.quota_exceeded.set()
+            LOG.error('The daily sending quota is exceeded: %s', error)
+        else:
+            LOG.error('Failed to send email: %s', error)
+        metrics.increment('failed')
+        return None
+
+    def send(self, send, tokens=1):
+        """
+        Call `send()`, drawing `tokens` tokens first, e.g. one per
+        destination of a bulk call.
+
+        :return: what `send()` returned, or None if it failed
+        """
+        for attempt in range(config.THROTTLE_RETRIES + 1):
+            if self.quota_exceeded.is_set():
+                # The rest of the batch would be rejected too
+                return None
+
+            with metrics.timer('rate_limit_wait'):
+                self.get_rate_limiter().acquire(tokens)
+            try:
+                with metrics.timer('backend_call'):
+                    result = send()
+            except Exception as e:
+                wait = self.on_error(e, attempt)
+                if wait is None:
+                    return None
+                time.sleep(wait)
+                continue
+
+            # False when there was nothing to send
+            if result is not False:
+                self.on_success(tokens)
+            return result
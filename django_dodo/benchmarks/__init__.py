@@ -0,0 +1,48 @@
+"""
+Benchmarks for the hot paths of sending an email.
+
+Each module has a `run()` returning a JSON serializable dict. The database
+benchmarks create their data in a transaction that is rolled back, and
+render with the project's email templates.
+"""
+import importlib
+import platform
+import sys
+
+import django
+from django.db import transaction
+from django.utils import timezone
+
+BENCHMARKS = ('tokens', 'render', 'mime', 'send')
+
+
+class Rollback(Exception):
+    pass
+
+
+def run_benchmark(name, **options):
+    """
+    Run a single benchmark, passing `options` to its `run()`.
+    """
+    module = importlib.import_module('django_dodo.benchmarks.{}'.format(name))
+    results = {}
+    try:
+        with transaction.atomic():
+            results = module.run(**options)
+            raise Rollback()
+    except Rollback:
+        pass
+    return results
+
+
+def run(names=None):
+    """
+    Run the benchmarks, all of them by default.
+
+    :return: a dict of the results of each benchmark, and the environment
+    """
+    return {'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': sys.platform,
+            'results': dict((name, run_benchmark(name)) for name in names or BENCHMARKS)}
@@ -0,0 +1,33 @@
+"""
+MIME build time of campaign messages, each message encoded on its own
+against the shared skeleton.
+"""
+from __future__ import unicode_literals
+
+import timeit
+
+from django_dodo.benchmarks.tokens import make_body
+from django_dodo.email import build_mail, build_mass_mail
+from django_dodo.utils.mime import get_raw_message
+
+HTML_SIZE = 20 * 1024
+
+
+def run(recipients=500, html_size=HTML_SIZE):
+    """
+    :return: the seconds per message of each way of building the MIME
+    """
+    html = make_body(html_size)
+    emails = ['user{}@example.com'.format(i) for i in range(recipients)]
+
+    def full():
+        for email in emails:
+            build_mail('Subject', 'Body', email, html_body=html).message().as_bytes()
+
+    def skeleton():
+        for message in build_mass_mail('Subject', 'Body', emails, html_body=html):
+            get_raw_message(message)
+
+    return {'html_bytes': len(html.encode('utf-8')),
+            'full_seconds': timeit.timeit(full, number=1) / recipients,
+            'skeleton_seconds': timeit.timeit(skeleton, number=1) / recipients}
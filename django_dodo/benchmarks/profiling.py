@@ -0,0 +1,117 @@
+"""
+Profiling the send path of a template: rendering, token replacement,
+building and sending synthetic messages, under cProfile then tracemalloc.
+"""
+from __future__ import division, unicode_literals
+
+import cProfile
+import pstats
+import timeit
+
+from django.core.mail import get_connection
+from django.utils.six import StringIO
+
+from django_dodo.backends.backends import SESBackend
+from django_dodo.backends.rate_limit import LocalCache, TokenBucket
+from django_dodo.benchmarks.send import FAKE_RATE
+from django_dodo.benchmarks.tokens import TOKEN_CONTEXT
+from django_dodo.email import build_mail
+from django_dodo.services.fake_ses import FakeSES
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+NULL_BACKEND = 'django.core.mail.backends.dummy.EmailBackend'
+
+
+def get_backend(name, latency=0):
+    """
+    :param name: 'fake' for SESBackend against an in process fake SES, 'null'
+        for a backend that drops the messages, 'settings' for EMAIL_BACKEND,
+        or the dotted path of a backend
+    """
+    if name == 'fake':
+        fake = FakeSES(max_send_rate=FAKE_RATE, max_24h=FAKE_RATE, latency=latency, keep_messages=False)
+        backend = SESBackend(connection_factory=fake.connect, rate_limiter=TokenBucket(FAKE_RATE, cache=LocalCache()))
+        backend.get_max_send_rate = lambda: FAKE_RATE
+        return backend
+    if name == 'null':
+        return get_connection(NULL_BACKEND)
+    if name == 'settings':
+        return get_connection()
+    return get_connection(name)
+
+
+def get_sender(email_template, backend, compiled=None):
+    """
+    :return: a function rendering and sending the message of index `i`
+    """
+    def send(i):
+        context = dict(TOKEN_CONTEXT, user_email='user{}@example.com'.format(i))
+        email_data = email_template.render(context, compiled=compiled)
+        backend.send_messages([build_mail(email_data['subject'], email_data['text_body'], context['user_email'],
+                                          html_body=email_data['html_body'])])
+    return send
+
+
+def run_profile(send, count, sort='cumulative', top=25):
+    profile = cProfile.Profile()
+    start = timeit.default_timer()
+    profile.enable()
+    for i in range(count):
+        send(i)
+    profile.disable()
+    seconds = timeit.default_timer() - start
+
+    stream = StringIO()
+    pstats.Stats(profile, stream=stream).strip_dirs().sort_stats(sort).print_stats(top)
+    return {'seconds': seconds,
+            'messages_per_second': count / seconds,
+            'stats': stream.getvalue()}
+
+
+def run_tracemalloc(send, count, top=10):
+    """
+    The peak memory of the run, and what is left allocated after it per
+    message, overall and by the lines that allocated it.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            send(i)
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'lineno')
+    return {'peak_bytes': peak - baseline,
+            'retained_bytes_per_message': (current - baseline) / count,
+            'retained_blocks_per_message': sum(stat.count_diff for stat in stats) / count,
+            'top_allocations': [str(stat) for stat in stats[:top]]}
+
+
+def profile_send(email_template, backend, count=100, compiled=None, sort='cumulative', top=25):
+    """
+    Render and send `count` synthetic messages of `email_template` through
+    `backend`, once under cProfile and once under tracemalloc so neither
+    distorts the other. The first message is sent beforehand to fill the
+    caches and open the connection.
+
+    :return: a dict of the cProfile stats and timings, and of the memory
+        use when tracemalloc is available
+    """
+    send = get_sender(email_template, backend, compiled=compiled)
+    backend.open()
+    try:
+        send(0)
+        results = {'messages': count, 'profile': run_profile(send, count, sort=sort, top=top)}
+        if tracemalloc is not None:
+            results['memory'] = run_tracemalloc(send, count, top=top)
+    finally:
+        backend.close()
+    return results
@@ -0,0 +1,71 @@
+"""
+EmailTemplate rendering throughput and queries, by the number of widgets.
+"""
+from __future__ import unicode_literals
+
+import timeit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_dodo.benchmarks.tokens import TOKEN_CONTEXT
+from django_dodo.models import EmailButton, EmailTemplate, EmailTheme, EmailWidget
+
+WIDGET_COUNTS = (1, 5, 10, 25)
+
+
+def make_email_template(widget_count, email_type=EmailTemplate.WEEKLY_NOTIFICATION):
+    """
+    Create a template with `widget_count` body widgets, each with its own
+    themes and button. Run it in a transaction that is rolled back.
+    """
+    email_template = EmailTemplate.objects.create(email_type=email_type,
+                                                  subject='Hi { USER_FIRST_NAME }',
+                                                  title='Benchmark',
+                                                  pre_header='Benchmark',
+                                                  base_theme=EmailTheme.objects.create())
+    for i in range(widget_count):
+        button = EmailButton.objects.create(description='Button {}'.format(i), theme=EmailTheme.objects.create(),
+                                            url_link='http://example.com/{}'.format(i))
+        widget = EmailWidget.objects.create(widget_type='body',
+                                            theme=EmailTheme.objects.create(),
+                                            header_theme=EmailTheme.objects.create(),
+                                            header='Header {}'.format(i),
+                                            body_theme=EmailTheme.objects.create(),
+                                            body='Hi { USER_FIRST_NAME }, see <a href="{ PROFILE_URL }">this</a>.',
+                                            button=button)
+        email_template.widgets.add(widget)
+
+    return email_template
+
+
+def measure(render, number):
+    """
+    :return: the seconds per call and the queries of one call of `render`
+    """
+    with CaptureQueriesContext(connection) as queries:
+        render()
+    return {'seconds': timeit.timeit(render, number=number) / number,
+            'queries': len(queries)}
+
+
+def run(widget_counts=WIDGET_COUNTS, number=20):
+    """
+    :return: for each widget count, the live and the compiled render
+    """
+    results = {}
+    for widget_count in widget_counts:
+        email_template = make_email_template(widget_count)
+
+        def live():
+            EmailTemplate.get_for_render(email_template.pk).render(TOKEN_CONTEXT, compiled=False)
+
+        def compiled():
+            EmailTemplate.get_for_render(email_template.pk).render(TOKEN_CONTEXT, compiled=True)
+
+        compiled()
+        results[widget_count] = {'live': measure(live, number), 'compiled': measure(compiled, number)}
+        for result in results[widget_count].values():
+            result['renders_per_second'] = 1 / result['seconds']
+
+    return results
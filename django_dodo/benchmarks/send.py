@@ -0,0 +1,69 @@
+"""
+End to end sending: messages per second through SESBackend against the
+local fake SES, and the queries of sending a campaign chunk.
+"""
+from __future__ import unicode_literals
+
+import timeit
+
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from django_dodo.backends.backends import SESBackend
+from django_dodo.backends.rate_limit import LocalCache, TokenBucket
+from django_dodo.benchmarks.render import make_email_template
+from django_dodo.benchmarks.tokens import make_body
+from django_dodo.email import close_worker_connections
+from django_dodo.models import EmailRecipient, MarketEmail
+from django_dodo.services.fake_ses import FakeSES
+from django_dodo.tasks import send_market_email_chunk
+
+# High enough that only our own code is measured
+FAKE_RATE = 10 ** 6
+
+
+def get_messages(count, html):
+    messages = []
+    for i in range(count):
+        message = EmailMultiAlternatives('Subject', 'Body', 'from@example.com', ['user{}@example.com'.format(i)])
+        message.attach_alternative(html, 'text/html')
+        messages.append(message)
+    return messages
+
+
+def run_backend(count, concurrency, latency):
+    fake = FakeSES(max_send_rate=FAKE_RATE, max_24h=FAKE_RATE, latency=latency, keep_messages=False)
+    backend = SESBackend(connection_factory=fake.connect, concurrency=concurrency,
+                         rate_limiter=TokenBucket(FAKE_RATE, cache=LocalCache()))
+    backend.get_max_send_rate = lambda: FAKE_RATE
+    messages = get_messages(count, make_body(20 * 1024))
+
+    seconds = timeit.timeit(lambda: backend.send_messages(messages), number=1)
+    return {'messages': count, 'concurrency': concurrency, 'latency': latency,
+            'messages_per_second': count / seconds}
+
+
+def run_chunk_queries(recipients):
+    """
+    The queries of sending one campaign chunk to `recipients` recipients.
+    """
+    email_template = make_email_template(5)
+    recipient_objs = [EmailRecipient.objects.create(email='user{}@example.com'.format(i)) for i in range(recipients)]
+    email = MarketEmail.objects.create(email_template=email_template, primary_to=recipient_objs[0])
+    email.to.add(*recipient_objs)
+    chunk = email.create_chunks(chunk_size=recipients)[0]
+
+    with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+        close_worker_connections()
+        with CaptureQueriesContext(connection) as queries:
+            send_market_email_chunk(chunk.pk)
+        close_worker_connections()
+
+    return {'recipients': recipients, 'queries': len(queries)}
+
+
+def run(count=200):
+    return {'backend': [run_backend(count, concurrency, latency)
+                        for concurrency, latency in ((1, 0), (1, 0.005), (8, 0.005))],
+            'chunk': run_chunk_queries(50)}
@@ -0,0 +1,78 @@
+"""
+Compare the single pass token replacement against the previous
+`str.replace` loop on large HTML bodies.
+"""
+from __future__ import unicode_literals
+
+import timeit
+
+from django_dodo.utils.tokens import Tokens, USER_TOKENS
+
+BODY_SIZE = 100 * 1024
+
+TOKEN_CONTEXT = {
+    'user_first_name': 'Jane',
+    'user_full_name': 'Jane Doe',
+    'user_email': 'janedoe@example.com',
+    'sender_first_name': 'Sally',
+    'sender_full_name': 'Sally Smith',
+    'profile_url': '/janedoe',
+    'account_settings_url': '/settings',
+    'email_management_url': '/email',
+}
+
+PARAGRAPH = ('<tr><td style="padding: 20px; font-size: 16px; font-family: Helvetica, Arial, sans-serif;">'
+             'Hi { USER_FIRST_NAME }, { SENDER_FULL_NAME } wants you to see '
+             '<a href="{ PROFILE_URL }">your profile</a>.</td></tr>\n')
+FILLER = ('<tr><td style="padding: 20px; font-size: 16px; font-family: Helvetica, Arial, sans-serif;">'
+          'Lorem ipsum dolor sit amet, consectetur adipiscing elit.</td></tr>\n')
+
+
+def make_body(size=BODY_SIZE, dense=False):
+    """
+    A dense body has tokens in every paragraph, a sparse one only has
+    them at the top and bottom like a typical email.
+    """
+    if dense:
+        return (PARAGRAPH * (size // len(PARAGRAPH) + 1))[:size]
+
+    filler_size = size - 6 * len(PARAGRAPH)
+    return PARAGRAPH * 3 + (FILLER * (filler_size // len(FILLER) + 1))[:filler_size] + PARAGRAPH * 3
+
+
+def replace_tokens_loop(context, dirty_text, token_dict=USER_TOKENS, domain_url='https://morgynstryker.com'):
+    """
+    The previous implementation: one `str.replace` over the text per token.
+    """
+    context = dict(context)
+    for key in token_dict:
+        action_url = context.get(key)
+        if key.endswith('_url') and action_url:
+            context[key] = '{domain_url}{action_url}'.format(domain_url=domain_url, action_url=action_url)
+
+    clean_text = dirty_text
+    for key, value in context.items():
+        token = token_dict.get(key)
+        if token:
+            clean_text = clean_text.replace(token, value)
+
+    return clean_text
+
+
+def run(size=BODY_SIZE, number=200):
+    """
+    :return: a dict with the seconds per call of each implementation, for
+        a sparse and a dense body
+    """
+    results = {}
+    for name, dense in (('sparse', False), ('dense', True)):
+        body = make_body(size, dense=dense)
+        assert replace_tokens_loop(TOKEN_CONTEXT, body) == Tokens.replace_tokens(TOKEN_CONTEXT, body)
+
+        loop = timeit.timeit(lambda: replace_tokens_loop(TOKEN_CONTEXT, body), number=number) / number
+        single_pass = timeit.timeit(lambda: Tokens.replace_tokens(TOKEN_CONTEXT, body), number=number) / number
+        results[name] = {'body_bytes': len(body.encode('utf-8')),
+                         'loop_seconds': loop,
+                         'single_pass_seconds': single_pass}
+
+    return results
@@ -1,3 +1,96 @@
 from django.conf import settings
 
-# TODO: Get Django Dodo settings and use default values here if they are not specified
+# Django Dodo settings, using the default values here if they are not specified
+
+# Render the recipient independent parts of an email once per template version
+# and only replace the tokens on each send.
+COMPILED_RENDER = getattr(settings, 'DODO_COMPILED_RENDER', False)
+RENDER_CACHE_TIMEOUT = getattr(settings, 'DODO_RENDER_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# Strip comments, dedupe inline styles and collapse whitespace in the
+# rendered HTML, once per template version.
+OPTIMIZE_HTML = getattr(settings, 'DODO_OPTIMIZE_HTML', False)
+
+# Derive the plain text alternative from the rendered HTML instead of the
+# static django_dodo/base.txt template.
+TEXT_FROM_HTML = getattr(settings, 'DODO_TEXT_FROM_HTML', True)
+
+# How long an admin preview is kept for identical form data
+PREVIEW_CACHE_TIMEOUT = getattr(settings, 'DODO_PREVIEW_CACHE_TIMEOUT', 60 * 10)
+
+# The number of threads sending in parallel, each with its own connection.
+# It is always kept below the account's maximum send rate.
+SEND_CONCURRENCY = getattr(settings, 'DODO_SEND_CONCURRENCY', 1)
+
+# The asyncio SES service keeps up to ASYNC_MAX_IN_FLIGHT sends outstanding
+# over ASYNC_MAX_CONNECTIONS keep-alive connections. SES_ENDPOINT overrides
+# the regional endpoint, e.g. to point at a local fake.
+SES_ENDPOINT = getattr(settings, 'DODO_SES_ENDPOINT', None)
+ASYNC_MAX_CONNECTIONS = getattr(settings, 'DODO_ASYNC_MAX_CONNECTIONS', 4)
+ASYNC_MAX_IN_FLIGHT = getattr(settings, 'DODO_ASYNC_MAX_IN_FLIGHT', 200)
+
+# The number of recipients sent by each subtask of a campaign. A chunk whose
+# subtask has not finished after CAMPAIGN_CHUNK_CLAIM_TIMEOUT seconds is sent
+# again when the campaign is resumed.
+CAMPAIGN_CHUNK_SIZE = getattr(settings, 'DODO_CAMPAIGN_CHUNK_SIZE', 500)
+CAMPAIGN_CHUNK_CLAIM_TIMEOUT = getattr(settings, 'DODO_CAMPAIGN_CHUNK_CLAIM_TIMEOUT', 60 * 60)
+# A chunk that failed to send is tried again after CAMPAIGN_CHUNK_RETRY_DELAY
+# seconds, doubled after each attempt, and given up after
+# CAMPAIGN_CHUNK_MAX_ATTEMPTS attempts.
+CAMPAIGN_CHUNK_RETRY_DELAY = getattr(settings, 'DODO_CAMPAIGN_CHUNK_RETRY_DELAY', 60)
+CAMPAIGN_CHUNK_MAX_ATTEMPTS = getattr(settings, 'DODO_CAMPAIGN_CHUNK_MAX_ATTEMPTS', 5)
+
+# Send campaign chunks with SES SendBulkTemplatedEmail, storing each released
+# template with SES and passing only the token values of each recipient.
+BULK_TEMPLATED_SEND = getattr(settings, 'DODO_BULK_TEMPLATED_SEND', False)
+
+# Queue emails in the OutboxMessage table for the outbox dispatchers instead
+# of sending them right away. Failed messages are retried with a jittered
+# exponential backoff starting at OUTBOX_RETRY_DELAY seconds, and a claim is
+# released if its dispatcher has not finished after OUTBOX_CLAIM_TIMEOUT.
+OUTBOX = getattr(settings, 'DODO_OUTBOX', False)
+OUTBOX_BATCH_SIZE = getattr(settings, 'DODO_OUTBOX_BATCH_SIZE', 100)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'DODO_OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_DELAY = getattr(settings, 'DODO_OUTBOX_RETRY_DELAY', 30)
+OUTBOX_CLAIM_TIMEOUT = getattr(settings, 'DODO_OUTBOX_CLAIM_TIMEOUT', 60 * 10)
+
+# Sends throttled by the provider are retried up to THROTTLE_RETRIES times
+# with a jittered backoff starting at THROTTLE_BACKOFF seconds. Each throttle
+# halves the send rate, down to THROTTLE_MIN_RATE per second, and it grows
+# back while the sends succeed.
+THROTTLE_RETRIES = getattr(settings, 'DODO_THROTTLE_RETRIES', 3)
+THROTTLE_BACKOFF = getattr(settings, 'DODO_THROTTLE_BACKOFF', 0.5)
+THROTTLE_MIN_RATE = getattr(settings, 'DODO_THROTTLE_MIN_RATE', 1)
+
+# Transactional emails (EmailTemplate.USER_EMAILS) and marketing emails can
+# be sent from their own Celery queues, e.g. 'dodo_transactional' and
+# 'dodo_marketing', by default the tasks use Celery's default queue. While
+# transactional emails are sent, marketing emails leave them
+# TRANSACTIONAL_RATE_SHARE of the rate limiter's bucket, a second of sends,
+# otherwise they may use all of it.
+TRANSACTIONAL_QUEUE = getattr(settings, 'DODO_TRANSACTIONAL_QUEUE', None)
+MARKETING_QUEUE = getattr(settings, 'DODO_MARKETING_QUEUE', None)
+TRANSACTIONAL_RATE_SHARE = getattr(settings, 'DODO_TRANSACTIONAL_RATE_SHARE', 0.2)
+
+# Release the chunks of a campaign over time, as the 24 hour sending quota
+# allows, keeping TRANSACTIONAL_QUOTA_RESERVE of the quota for transactional
+# emails.
+SCHEDULE_CAMPAIGNS = getattr(settings, 'DODO_SCHEDULE_CAMPAIGNS', False)
+# A campaign that cannot be planned, e.g. as the stats show no quota, is
+# tried again after CAMPAIGN_RETRY_DELAY seconds.
+CAMPAIGN_RETRY_DELAY = getattr(settings, 'DODO_CAMPAIGN_RETRY_DELAY', 60 * 60)
+TRANSACTIONAL_QUOTA_RESERVE = getattr(settings, 'DODO_TRANSACTIONAL_QUOTA_RESERVE', 0.1)
+
+# Time each stage of sending an email into per email type histograms, served
+# in the Prometheus text format by the `dodo-metrics` view. METRICS_HOOKS are
+# dotted paths to callables called with `(kind, name, email_type, value)` for
+# every timing and count, e.g. to push them to statsd from Celery workers.
+# METRICS_TOKEN is required as a bearer token by the view, which is not served
+# until it is set.
+METRICS = getattr(settings, 'DODO_METRICS', True)
+METRICS_HOOKS = getattr(settings, 'DODO_METRICS_HOOKS', ())
+METRICS_TOKEN = getattr(settings, 'DODO_METRICS_TOKEN', None)
+
+# Seconds the users of EmailRecipient are kept in the shared cache, they are
+# dropped from it as soon as the user is saved or deleted.
+USER_CACHE_TIMEOUT = getattr(settings, 'DODO_USER_CACHE_TIMEOUT', 60 * 5)
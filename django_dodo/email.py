@@ -1,13 +1,95 @@
 from __future__ import unicode_literals
 
+import logging
+import os
+import smtplib
+import socket
+import threading
+
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import request_finished
+from django.utils.six.moves import http_client
 
+from django_dodo.utils.mime import MessageSkeleton, RecipientEmailMessage
 
-def send_mail(subject, body, recipients, from_email=settings.DEFAULT_FROM_EMAIL, html_body=None,
-              bcc=None, cc=None):
+LOG = logging.getLogger(__name__)
+
+# Opened backends, one per process, thread and backend path
+_worker_connections = {}
+
+
+def get_worker_connection(backend=None, lane=None):
+    """
+    Get an opened email backend that lives for the life of the worker
+    process, so each send does not reconnect to the provider. Keyed on the
+    process id so a forked worker never reuses its parent's connection.
+    Each priority lane has its own connection, drawing from its own share
+    of the send rate.
+    """
+    key = (os.getpid(), threading.current_thread().ident, backend, lane)
+    connection = _worker_connections.get(key)
+    if connection is None:
+        connection = get_connection(backend, lane=lane) if lane else get_connection(backend)
+        connection.open()
+        _worker_connections[key] = connection
+    return connection
+
+
+def discard_worker_connection(connection):
+    for key, pooled in list(_worker_connections.items()):
+        if pooled is connection:
+            del _worker_connections[key]
+    try:
+        connection.close()
+    except Exception as e:
+        LOG.warning('Failed to close email connection: %s', e)
+
+
+def close_worker_connections(**kwargs):
+    """
+    Close every pooled connection of this process. Connected to the Celery
+    worker shutdown signals in tasks.py.
+    """
+    pid = os.getpid()
+    for key, connection in list(_worker_connections.items()):
+        if key[0] == pid:
+            discard_worker_connection(connection)
+
+
+def close_thread_connections(**kwargs):
+    """
+    Close the pooled connections of this thread. Connected to Django's
+    request_finished signal, so a web process sending an email does not
+    keep its connection open between requests.
+    """
+    key = (os.getpid(), threading.current_thread().ident)
+    for pooled_key, connection in list(_worker_connections.items()):
+        if pooled_key[:2] == key:
+            discard_worker_connection(connection)
+
+
+request_finished.connect(close_thread_connections)
+
+
+def is_connection_error(error):
+    """
+    Whether `error` means the connection to the provider is broken, e.g. it
+    went stale while the worker was idle, rather than the provider
+    rejecting the messages.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        # The server answered, e.g. refused a recipient
+        return False
+    return isinstance(error, (socket.error, http_client.HTTPException))
+
+
+def build_mail(subject, body, recipients, from_email=settings.DEFAULT_FROM_EMAIL, html_body=None,
+               bcc=None, cc=None, connection=None):
     """
-    Sends a django.core.mail.EmailMultiAlternatives to `to_email`.
+    Builds the django.core.mail.EmailMultiAlternatives for `send_mail`.
     """
     # Email subject *must not* contain newlines
     subject = ''.join(subject.splitlines())
@@ -20,9 +102,91 @@ def send_mail(subject, body, recipients, from_email=settings.DEFAULT_FROM_EMAIL,
         from_email=from_email,
         to=recipients,
         cc=cc,
-        bcc=bcc
+        bcc=bcc,
+        connection=connection
     )
     if html_body is not None:
         email_message.attach_alternative(html_body, 'text/html')
 
-    email_message.send()
+    return email_message
+
+
+def build_mass_mail(subject, body, recipients, from_email=settings.DEFAULT_FROM_EMAIL, html_body=None,
+                    unsubscribe_urls=None):
+    """
+    Builds one message per recipient for an email with the same content for
+    everyone. The MIME is encoded once and shared by all the messages.
+
+    :param unsubscribe_urls: an optional dict of recipient to List-Unsubscribe url
+    :return: a list of RecipientEmailMessage
+    """
+    recipients = list(recipients)
+    if not recipients:
+        return []
+
+    unsubscribe_urls = unsubscribe_urls or {}
+    skeleton = MessageSkeleton(build_mail(subject, body, recipients[0], from_email=from_email, html_body=html_body))
+    subject = ''.join(subject.splitlines())
+    email_messages = []
+    for recipient in recipients:
+        email_message = RecipientEmailMessage(skeleton, unsubscribe_urls.get(recipient),
+                                              subject=subject, body=body, from_email=from_email, to=[recipient])
+        if html_body is not None:
+            email_message.attach_alternative(html_body, 'text/html')
+        email_messages.append(email_message)
+
+    return email_messages
+
+
+def send_mail(subject, body, recipients, from_email=settings.DEFAULT_FROM_EMAIL, html_body=None,
+              bcc=None, cc=None, connection=None):
+    """
+    Sends a django.core.mail.EmailMultiAlternatives to `to_email`. Pass an
+    opened `connection` to reuse it, otherwise the default backend opens
+    and closes its own.
+    """
+    email_message = build_mail(subject, body, recipients, from_email=from_email, html_body=html_body,
+                               bcc=bcc, cc=cc, connection=connection)
+    return email_message.send()
+
+
+def send_messages(email_messages, connection=None, lane=None):
+    """
+    Sends the messages over `connection`, or the pooled worker connection
+    of `lane` when none is given. When the pooled connection turns out to
+    be broken the batch is sent again, once, on a fresh connection.
+
+    :return: the number of emails sent
+    """
+    if connection is not None:
+        return connection.send_messages(email_messages) or 0
+
+    connection = get_worker_connection(lane=lane)
+    try:
+        return connection.send_messages(email_messages) or 0
+    except Exception as e:
+        # The connection may be broken, the next batch will reconnect
+        discard_worker_connection(connection)
+        if not is_connection_error(e):
+            raise
+        LOG.warning('The email connection failed, sending again on a new one: %s', e)
+
+    connection = get_worker_connection(lane=lane)
+    try:
+        return connection.send_messages(email_messages) or 0
+    except Exception:
+        discard_worker_connection(connection)
+        raise
+
+
+def send_mass_mail_alternatives(messages, from_email=settings.DEFAULT_FROM_EMAIL, connection=None, lane=None):
+    """
+    Sends many emails over a single backend connection, the pooled worker
+    connection unless one is given.
+
+    :param messages: an iterable of (subject, body, recipients, html_body) tuples
+    :return: the number of emails sent
+    """
+    email_messages = [build_mail(subject, body, recipients, from_email=from_email, html_body=html_body)
+                      for subject, body, recipients, html_body in messages]
+    return send_messages(email_messages, connection=connection, lane=lane)
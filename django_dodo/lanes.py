@@ -0,0 +1,35 @@
+"""
+Priority lanes. Transactional emails (EmailTemplate.USER_EMAILS) and
+marketing emails can have their own Celery queue, and transactional emails
+have priority on the send rate, so a campaign never delays a password
+reset. The lane of an email is the lane of its template.
+"""
+from __future__ import division
+
+from django_dodo import config
+
+TRANSACTIONAL = 'transactional'
+MARKETING = 'marketing'
+LANES = (TRANSACTIONAL, MARKETING)
+
+
+def get_lane(email_type):
+    from django_dodo.models import EmailTemplate
+
+    return TRANSACTIONAL if email_type in EmailTemplate.USER_EMAILS else MARKETING
+
+
+def get_queue(lane):
+    return config.TRANSACTIONAL_QUEUE if lane == TRANSACTIONAL else config.MARKETING_QUEUE
+
+
+def get_lane_rate(lane, max_send_rate):
+    """
+    The share of the account's send rate `lane` can count on, whatever
+    the other lane sends.
+    """
+    if lane not in LANES:
+        raise ValueError('Unknown lane: {}'.format(lane))
+
+    share = config.TRANSACTIONAL_RATE_SHARE
+    return max_send_rate * (share if lane == TRANSACTIONAL else 1 - share)
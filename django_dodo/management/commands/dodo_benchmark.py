@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_dodo import benchmarks
+
+
+class Command(BaseCommand):
+    """
+    Run the benchmarks and write the results as JSON, to compare them
+    between releases. The data the benchmarks create is rolled back.
+    """
+    help = 'Benchmark rendering, token replacement, MIME building and sending'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*',
+                            help='The benchmarks to run, all of them by default: {}'.format(
+                                ', '.join(benchmarks.BENCHMARKS)))
+        parser.add_argument('--output', help='Write the JSON to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(benchmarks.BENCHMARKS)
+        if unknown:
+            raise CommandError('Unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+
+        results = json.dumps(benchmarks.run(options['names']), indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(results)
+        else:
+            self.stdout.write(results)
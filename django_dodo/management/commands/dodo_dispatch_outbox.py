@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_dodo import config
+from django_dodo.lanes import LANES
+from django_dodo.models import OutboxMessage
+from django_dodo.tasks import dispatch_outbox
+
+
+class Command(BaseCommand):
+    """
+    Send the queued outbox messages. Any number of dispatchers can run at
+    once, each message is only claimed by one of them.
+    """
+    help = 'Dispatch the queued outbox messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=config.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when no message is due')
+        parser.add_argument('--lane', choices=LANES, help='Only dispatch the messages of this priority lane')
+        parser.add_argument('--once', action='store_true', help='Dispatch a single batch and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            OutboxMessage.release_stale()
+            sent = dispatch_outbox(options['batch_size'], lane=options['lane'])
+            if options['verbosity'] > 1:
+                self.stdout.write('Sent {}, queue depth {}'.format(sent, OutboxMessage.get_queue_depth()))
+
+            if options['once']:
+                return
+            if not sent and not OutboxMessage.get_due(options['lane']).exists():
+                time.sleep(options['interval'])
@@ -0,0 +1,77 @@
+import csv
+import io
+import sys
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+
+from django_dodo.models import EmailRecipient
+
+
+class Command(BaseCommand):
+    """
+    Import email recipients from a CSV file, streamed in chunks through
+    EmailRecipient.bulk_get_or_create so memory stays bounded whatever the
+    size of the file. Importing the same file again is harmless.
+    """
+    help = 'Import email recipients from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The CSV file, or '-' for stdin")
+        parser.add_argument('--column', default='0',
+                            help='The index of the email column, or its name when the file has a header row')
+        parser.add_argument('--header', action='store_true', help='Skip the first row, implied by a column name')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='The addresses imported per chunk')
+
+    def get_emails(self, rows, column, header):
+        if not column.isdigit():
+            header = next(rows, [])
+            if column not in header:
+                raise CommandError('No {} column in the header row'.format(column))
+            index = header.index(column)
+        else:
+            index = int(column)
+            if header:
+                next(rows, None)
+
+        for row in rows:
+            if len(row) <= index:
+                self.invalid += 1
+                continue
+            try:
+                validate_email(row[index].strip())
+            except ValidationError:
+                self.invalid += 1
+                continue
+            yield row[index]
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        if options['path'] == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding=options['encoding'], newline='')
+        else:
+            try:
+                stream = io.open(options['path'], encoding=options['encoding'], newline='')
+            except IOError as e:
+                raise CommandError(e)
+
+        self.invalid = 0
+        imported = 0
+        with stream:
+            emails = self.get_emails(csv.reader(stream, delimiter=options['delimiter']),
+                                     options['column'], options['header'])
+            while True:
+                chunk = list(islice(emails, options['chunk_size']))
+                if not chunk:
+                    break
+                imported += len(EmailRecipient.bulk_get_or_create(chunk))
+                if options['verbosity'] > 1:
+                    self.stdout.write('Imported {} recipients'.format(imported))
+
+        self.stdout.write('Imported {} recipients, skipped {} invalid rows'.format(imported, self.invalid))
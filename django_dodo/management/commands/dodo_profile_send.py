@@ -0,0 +1,59 @@
+from __future__ import division
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_dodo.benchmarks import profiling
+from django_dodo.models import EmailTemplate
+
+
+class Command(BaseCommand):
+    """
+    Profile rendering and sending a template, to find the hot spots of
+    `render`, `replace_tokens` and `send_messages` without profiling live
+    workers. Messages go to synthetic recipients, through the in process
+    fake SES by default.
+    """
+    help = 'Profile rendering and sending synthetic messages of an email template'
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_id', type=int, help='The EmailTemplate to send')
+        parser.add_argument('--count', type=int, default=100, help='The number of messages to send')
+        parser.add_argument('--backend', default='fake',
+                            help="'fake' for the in process fake SES, 'null' to drop the messages, "
+                                 "'settings' for EMAIL_BACKEND, or the dotted path of a backend")
+        parser.add_argument('--latency', type=float, default=0, help='Seconds each fake SES call takes')
+        parser.add_argument('--render', choices=('compiled', 'live'),
+                            help='The render mode, DODO_COMPILED_RENDER by default')
+        parser.add_argument('--sort', default='cumulative', help='The pstats sort key')
+        parser.add_argument('--top', type=int, default=25, help='The number of functions and lines to print')
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError('--count must be at least 1')
+
+        try:
+            email_template = EmailTemplate.get_for_render(options['template_id'])
+        except EmailTemplate.DoesNotExist:
+            raise CommandError('EmailTemplate {} does not exist'.format(options['template_id']))
+
+        compiled = None if options['render'] is None else options['render'] == 'compiled'
+        backend = profiling.get_backend(options['backend'], latency=options['latency'])
+        results = profiling.profile_send(email_template, backend, count=options['count'], compiled=compiled,
+                                         sort=options['sort'], top=options['top'])
+
+        profile = results['profile']
+        self.stdout.write('{} messages in {:.3f}s, {:.1f} messages per second\n'.format(
+            results['messages'], profile['seconds'], profile['messages_per_second']))
+        self.stdout.write(profile['stats'])
+
+        memory = results.get('memory')
+        if memory is None:
+            self.stdout.write('tracemalloc is not available, memory use is not measured')
+            return
+
+        self.stdout.write('Peak memory: {:.1f} KiB'.format(memory['peak_bytes'] / 1024))
+        self.stdout.write('Retained per message: {:.0f} bytes in {:.1f} allocations'.format(
+            memory['retained_bytes_per_message'], memory['retained_blocks_per_message']))
+        self.stdout.write('Top allocating lines:')
+        for line in memory['top_allocations']:
+            self.stdout.write('  {}'.format(line))
@@ -1,18 +1,30 @@
 from __future__ import unicode_literals
 
 import base64
+import json
 import uuid
+from collections import defaultdict
 from datetime import timedelta
 import logging
 
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Lower
 # from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from django.contrib.auth.base_user import BaseUserManager
+from django.apps import apps
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core import urlresolvers, signing
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils.encoding import python_2_unicode_compatible
+from django.utils.functional import cached_property
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.template.loader import get_template
@@ -20,11 +32,20 @@ from django.template.loader import get_template
 from sortedm2m.fields import SortedManyToManyField
 from colorfield.fields import ColorField
 
+from django_dodo import config
 from django_dodo.backends.backends import SESBackend
-from django_dodo.email import send_mail
+from django_dodo.backends.throttling import get_backoff
+from django_dodo.email import build_mail, send_messages
+from django_dodo.services.amazon_ses import AmazonSEService
+from django_dodo.utils import metrics
+from django_dodo.lanes import MARKETING, TRANSACTIONAL, get_lane, get_lane_rate
 from django_dodo.tasks import send_user_email, send_market_email, send_network_email
 from django_dodo.utils.context import get_domain_context
-from django_dodo.utils.tokens import Tokens, get_user_by_email
+from django_dodo.utils.scheduling import plan_campaign
+from django_dodo.utils.render import (CompiledTemplate, bump_render_generation, get_compiled_template,
+                                      get_context_keys, get_optimized_html, get_render_generation,
+                                      get_text_from_html, reads_context)
+from django_dodo.utils.tokens import USER_REPLACER, USER_TOKENS, Tokens, get_user_by_email
 
 LOG = logging.getLogger(__name__)
 
@@ -87,25 +108,37 @@ class EmailStats(models.Model):
         obj.save()
 
     @classmethod
-    def update_send_stats(cls):
-        last_entry = None
-        send_stats = SESBackend().get_send_statistics()
-        send_quota = SESBackend().get_send_rates()
-        entries = cls.objects.all()
-        if entries.exists():
-            last_entry = entries[0]
+    def update_send_stats(cls, backend=None):
+        """
+        Store the send statistics of the provider, summed per day, with the
+        current quota on the latest day.
+        """
+        backend = backend or SESBackend()
+        days = defaultdict(lambda: dict.fromkeys(('DeliveryAttempts', 'Bounces', 'Complaints', 'Rejects'), 0))
+        for item in backend.get_send_statistics():
+            day = days[item['Timestamp'].split('T')[0]]
+            for key in day:
+                day[key] += int(item[key])
+
+        send_quota = backend.get_send_rates(current=True)
+        for date in sorted(days):
+            item = days[date]
+            defaults = {'delivery_attempts': item['DeliveryAttempts'],
+                        'bounces': item['Bounces'],
+                        'complaints': item['Complaints'],
+                        'rejects': item['Rejects']}
+            if date == max(days) and isinstance(send_quota, dict):
+                defaults.update(sent_24h=int(float(send_quota['SentLast24Hours'])),
+                                max_24h=int(float(send_quota['Max24HourSend'])),
+                                per_second_rate=int(float(send_quota['MaxSendRate'])))
+            cls.objects.update_or_create(timestamp=date, defaults=defaults)
 
-        for item in send_stats:
-            if last_entry and item['Timestamp'] == last_entry:
-                last_entry.delivery_attempts = item['DeliveryAttempts']
-                last_entry.bounces = item['Bounces']
-                last_entry.complaints = item['Complaints']
-                last_entry.rejects = item['Rejects']
-                last_entry.save()
-            elif last_entry and item['Timestamp'] > last_entry.timestamp:
-                cls.create_stat(item, send_quota=send_quota)
-            elif last_entry is None:
-                cls.create_stat(item, send_quota=send_quota)
+    @classmethod
+    def get_latest(cls):
+        """
+        The latest stats, or the defaults if none were fetched yet.
+        """
+        return cls.objects.first() or cls()
 
     @classmethod
     def get_send_stats(cls, filter_dt=timezone.now()-timedelta(days=30)):
@@ -186,6 +219,8 @@ class EmailWidget(EmailModel):
         (COLUMN_PIC, _('Column with pic'))
 
     )
+    # Everything the widget templates touch
+    RENDER_RELATED = ('theme', 'header_theme', 'body_theme', 'button__theme')
     TEXT_ALIGN_CHOICES = (
         ('left', 'left'),
         ('right', 'right'),
@@ -238,6 +273,15 @@ class EmailWidget(EmailModel):
     def is_brand(self):
         return self.widget_type == self.BRAND_LOGO
 
+    @classmethod
+    def get_render_widgets(cls, pks):
+        """
+        The widgets for `pks`, in that order, along with their themes and
+        button in a single query.
+        """
+        widgets = cls.objects.select_related(*cls.RENDER_RELATED).in_bulk(pks)
+        return [widgets[pk] for pk in pks if pk in widgets]
+
     def clean(self):
         if self.widget_type in [self.HEADER, self.PRODUCT_HEADER]:
             if not self.image:
@@ -317,6 +361,10 @@ class EmailTemplate(EmailModel):
     def __str__(self):
         return '{}: default={}'.format(self.get_email_type_display(), self.default_template)
 
+    @property
+    def lane(self):
+        return get_lane(self.email_type)
+
     @property
     def is_registration_invite(self):
         return self.email_type == self.REGISTRATION_INVITATION
@@ -328,7 +376,13 @@ class EmailTemplate(EmailModel):
     def widget_list(self):
         return [ew.widgets for ew in EmailContentItem.objects.filter(email_template=self).order_by('order')]
 
-    def get_context_data(self, extra_context=None):
+    def get_render_widgets(self):
+        """
+        The ordered widgets along with their themes and button, in a single query.
+        """
+        return list(self.widgets.select_related(*EmailWidget.RENDER_RELATED))
+
+    def get_context_data(self, extra_context=None, widgets=None):
         current_site = get_current_site(None)
         admin_prefix = 'admin.'
         site_name = current_site.name
@@ -343,29 +397,75 @@ class EmailTemplate(EmailModel):
             'site_name': site_name,
             'domain': domain,
             'email_template': self,
-            'widgets': self.widgets.all()
+            'widgets': self.get_render_widgets() if widgets is None else widgets
         }
         context.update(extra_context or {})
         return context
 
-    def render_subject(self, context):
+    @property
+    def html_template_name(self):
+        return 'django_dodo/{template}.html'.format(template=self.base_template)
+
+    @property
+    def text_template_name(self):
+        return 'django_dodo/base.txt'
+
+    def get_subject(self):
         if self.subject is None:
             return self.get_email_type_display()
-        return Tokens.replace_tokens(context, self.subject)
+        return self.subject
 
-    def render_html(self, context):
-        template = 'django_dodo/{template}.html'.format(template=self.base_template)
-        rendered_html = get_template(template).render(context)
+    def render_subject(self, context):
+        return Tokens.replace_tokens(context, self.get_subject())
+
+    def render_html_shell(self, context, optimize=None):
+        """
+        Render the HTML without replacing the tokens.
+
+        :param optimize: run the rendered HTML through `optimize_html`,
+            defaults to the DODO_OPTIMIZE_HTML setting
+        :return: a tuple of the HTML and the bytes the optimization saved
+        """
+        if optimize is None:
+            optimize = config.OPTIMIZE_HTML
+
+        rendered_html = get_template(self.html_template_name).render(context)
+        if not optimize:
+            return rendered_html, 0
+        return get_optimized_html(self, rendered_html)
+
+    def render_html(self, context, optimize=None):
+        rendered_html, saved = self.render_html_shell(context, optimize=optimize)
         return Tokens.replace_tokens(context, rendered_html)
 
-    def render_text(self, context, template='django_dodo/base.txt'):
-        rendered_text = get_template(template).render(context)
+    def render_text_shell(self, context, html=None):
+        """
+        Render the text without replacing the tokens. Unless DODO_TEXT_FROM_HTML
+        is off, this is derived from the rendered HTML, pass `html` when the
+        shell has already been rendered.
+        """
+        if not config.TEXT_FROM_HTML:
+            return get_template(self.text_template_name).render(context)
+
+        if html is None:
+            html, saved = self.render_html_shell(context)
+        return get_text_from_html(self, html)
+
+    def render_text(self, context, template=None):
+        if template:
+            rendered_text = get_template(template).render(context)
+        else:
+            rendered_text = self.render_text_shell(context)
         return Tokens.replace_tokens(context, rendered_text)
 
     def render_template(self, context):
-        html_body = self.render_html(context)
-        text_body = self.render_text(context)
-        subject = self.render_subject(context)
+        with metrics.timer('render_html'):
+            html, saved = self.render_html_shell(context)
+            text = self.render_text_shell(context, html=html)
+        with metrics.timer('replace_tokens'):
+            html_body = Tokens.replace_tokens(context, html)
+            text_body = Tokens.replace_tokens(context, text)
+            subject = self.render_subject(context)
         return {'subject': subject,
                 'body': html_body,
                 'html_body': html_body,
@@ -380,22 +480,96 @@ class EmailTemplate(EmailModel):
         context.update(token_context or {})
         return self.render_template(context)
 
-    def render(self, extra_context=None):
+    def compile(self, context=None):
+        """
+        Render everything that is the same for every recipient, leaving
+        the tokens in place.
+
+        :return: a CompiledTemplate
+        """
+        if context is None:
+            context = self.get_context_data()
+        html, saved = self.render_html_shell(context)
+        return CompiledTemplate(self.get_subject(),
+                                html,
+                                self.render_text_shell(context, html=html),
+                                html_bytes_saved=saved)
+
+    def get_compiled(self):
+        return get_compiled_template(self)
+
+    def create_render_bundle(self):
+        """
+        Snapshot the current widgets and themes for sending, see EmailRenderBundle.
+        """
+        return EmailRenderBundle.create_for_template(self)
+
+    def render(self, extra_context=None, compiled=None):
+        """
+        Render the email for a recipient.
+
+        In compiled mode the static parts of the email are rendered once per
+        template version and cached, `extra_context` is then only used for the
+        token replacement. A template reading any other variable of
+        `extra_context`, e.g. `{{ unsubscribe_link }}`, is rendered in full.
+        """
+        if compiled is None:
+            compiled = config.COMPILED_RENDER
+
+        if compiled:
+            compiled_template = self.get_compiled()
+            if not reads_context(self, compiled_template.version, extra_context):
+                return compiled_template.render(dict(extra_context or {}))
+
         context = self.get_context_data(extra_context=extra_context)
         return self.render_template(context)
 
+    def render_many(self, contexts, compiled=None):
+        """
+        Lazily render the email for each of the recipient contexts. The
+        site context and the widgets, or the compiled template in compiled
+        mode, are loaded once for the whole batch.
+
+        :param contexts: an iterable of extra context, one per recipient
+        :return: a generator of dicts with the subject, html_body and text_body
+        """
+        if compiled is None:
+            compiled = config.COMPILED_RENDER
+
+        compiled_template = self.get_compiled() if compiled else None
+        base_context = None
+        for extra_context in contexts:
+            if compiled and not reads_context(self, compiled_template.version, extra_context):
+                yield compiled_template.render(dict(extra_context or {}))
+                continue
+
+            if base_context is None:
+                base_context = self.get_context_data()
+            context = dict(base_context)
+            context.update(extra_context or {})
+            yield self.render_template(context)
+
     @classmethod
-    def get_email_template(cls, email_type):
-        objs = cls.objects.filter(release=True, email_type=email_type)
+    def get_render_queryset(cls):
+        return cls.objects.select_related('base_theme')
 
-        if objs.count() > 1:
-            default_obj = objs.filter(default_template=True)
-            if default_obj.exists():
-                return default_obj
-        elif objs.count() == 0:
+    @classmethod
+    def get_for_render(cls, pk):
+        """
+        Get the template ready to be rendered. Rendering it then only needs
+        one more query, for the widgets.
+        """
+        return cls.get_render_queryset().get(pk=pk)
+
+    @classmethod
+    def get_email_template(cls, email_type):
+        objs = list(cls.get_render_queryset().filter(release=True, email_type=email_type))
+        if not objs:
             return
-        elif objs.count() == 1:
-            return objs.get()
+
+        for obj in objs:
+            if obj.default_template:
+                return obj
 
         return objs[0]
 
@@ -411,6 +585,148 @@ class EmailTemplate(EmailModel):
         super(EmailTemplate, self).save(*args, **kwargs)
 
 
+@python_2_unicode_compatible
+class EmailRenderBundle(models.Model):
+    """
+    An immutable snapshot of a released EmailTemplate: the compiled subject,
+    HTML and text with the widget content and theme values resolved. Workers
+    read it from the cache, falling back to this table, so sending needs no
+    queries for template data and later edits to the widgets or themes do
+    not change what is sent until the template is released again.
+
+    The field values of the template, the widgets and their themes and
+    buttons are kept as well, to render the emails reading more context
+    than the tokens in full, from the same snapshot.
+    """
+    CACHE_KEY = 'django_dodo:render_bundle:{template_id}'
+
+    email_template = models.ForeignKey(EmailTemplate, related_name='render_bundles', on_delete=models.CASCADE)
+    email_type = models.CharField(max_length=3, choices=EmailTemplate.EMAIL_TYPES)
+    version = models.CharField(max_length=40)
+    created_at = models.DateTimeField(auto_now_add=True)
+    data = models.TextField()
+
+    class Meta:
+        ordering = ['-created_at', '-pk']
+
+    def __str__(self):
+        return '{} ({})'.format(self.email_template, self.version)
+
+    def get_compiled(self):
+        return CompiledTemplate.from_dict(json.loads(self.data))
+
+    @staticmethod
+    def _get_snapshot(context):
+        widget_related = _get_related_tree(EmailWidget.RENDER_RELATED)
+        snapshot = {'email_template': _dump_instance(context['email_template'], {'base_theme': {}}),
+                    'widgets': [_dump_instance(widget, widget_related) for widget in context['widgets']]}
+        # As read back from the table, to compare it with the latest bundle
+        return json.loads(json.dumps(snapshot, cls=DjangoJSONEncoder))
+
+    @staticmethod
+    def get_render_context(compiled):
+        """
+        Rebuild the template and its render context from the snapshot of
+        `compiled`, without queries.
+
+        :return: a tuple of the EmailTemplate and the context
+        """
+        email_template = _load_instance(compiled.snapshot['email_template'])
+        widgets = [_load_instance(data) for data in compiled.snapshot['widgets']]
+        return email_template, email_template.get_context_data(widgets=widgets)
+
+    @classmethod
+    def create_for_template(cls, email_template):
+        context = email_template.get_context_data()
+        compiled = email_template.compile(context)
+        compiled.version = get_render_generation()
+        compiled.snapshot = cls._get_snapshot(context)
+        obj = cls.objects.create(email_template=email_template,
+                                 email_type=email_template.email_type,
+                                 version=compiled.version,
+                                 data=json.dumps(compiled.to_dict()))
+        cache.set(cls.CACHE_KEY.format(template_id=email_template.pk), compiled, None)
+        return obj
+
+    @classmethod
+    def update_for_template(cls, email_template):
+        """
+        Create a bundle for the template unless the latest one is the same,
+        a release saves the template and then its widgets.
+
+        :return: the new bundle, or None if nothing changed
+        """
+        latest = cls.get_bundle(email_template.pk)
+        if latest is not None:
+            context = email_template.get_context_data()
+            compiled = email_template.compile(context)
+            if ((latest.subject, latest.html, latest.text, latest.snapshot) ==
+                    (compiled.subject, compiled.html, compiled.text, cls._get_snapshot(context))):
+                return
+        return cls.create_for_template(email_template)
+
+    @classmethod
+    def get_bundle(cls, email_template_id):
+        """
+        Get the compiled template of the latest bundle for the template.
+
+        :return: a CompiledTemplate, or None if the template was never released
+        """
+        cache_key = cls.CACHE_KEY.format(template_id=email_template_id)
+        compiled = cache.get(cache_key)
+        if compiled is None:
+            obj = cls.objects.filter(email_template_id=email_template_id).first()
+            if obj is None:
+                return
+            compiled = obj.get_compiled()
+            cache.set(cache_key, compiled, None)
+
+        return compiled
+
+
+def _get_related_tree(paths):
+    """
+    :return: nested dicts of the relations of `select_related` paths
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        for name in path.split('__'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _dump_instance(obj, related):
+    """
+    :return: the field values of `obj` and of its `related` instances
+    """
+    if obj is None:
+        return None
+    # Not the time of the last edit, which would make every save a new snapshot
+    fields = [field for field in obj._meta.concrete_fields if not getattr(field, 'auto_now', False)]
+    return {'model': obj._meta.label,
+            'fields': dict((field.attname, field.get_prep_value(field.value_from_object(obj))) for field in fields),
+            'related': dict((name, _dump_instance(getattr(obj, name), tree)) for name, tree in related.items())}
+
+
+def _load_instance(data):
+    """
+    :return: an unsaved instance from `_dump_instance` data, with its
+        related instances set
+    """
+    if data is None:
+        return None
+    model = apps.get_model(data['model'])
+    # The fields removed since the snapshot are skipped
+    fields = dict((field.attname, field.to_python(data['fields'][field.attname]))
+                  for field in model._meta.concrete_fields if field.attname in data['fields'])
+    obj = model(**fields)
+    obj._state.adding = False
+    for name, related in data['related'].items():
+        setattr(obj, name, _load_instance(related))
+    return obj
+
+
 @python_2_unicode_compatible
 class EmailContentItem(models.Model):
     order = models.PositiveIntegerField()
@@ -425,8 +741,29 @@ class EmailContentItem(models.Model):
         return '{} ({} - {})'.format(self.email_template, self.order, self.email_widget)
 
 
+class RecipientUser(object):
+    """
+    What the bulk sends read of the user of an EmailRecipient, kept in the
+    shared cache instead of the User so no credentials are pickled there.
+    """
+
+    def __init__(self, uuid, email, email_context):
+        self.uuid = uuid
+        self.email = email
+        self.email_context = email_context
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.uuid, user.email, user.get_email_context())
+
+    def get_email_context(self):
+        return dict(self.email_context)
+
+
 @python_2_unicode_compatible
 class EmailRecipient(models.Model):
+    USER_CACHE_KEY = 'django_dodo:recipient_user:{user_id}'
+
     user_id = models.UUIDField(blank=True, null=True)
     email = models.CharField(max_length=200, unique=True, db_index=True)
     added_at = models.DateTimeField(auto_now_add=True)
@@ -434,20 +771,137 @@ class EmailRecipient(models.Model):
     def __str__(self):
         return self.email
 
-    @property
+    def _is_user(self, user):
+        # The stored user_id is stale once the user's email changed
+        return user is not None and user.email.lower() == self.email.lower()
+
+    def _set_user_id(self, user, save=True):
+        """
+        :return: True if `user_id` changed
+        """
+        user_id = user.uuid if user is not None else None
+        if user_id == self.user_id:
+            return False
+
+        self.user_id = user_id
+        if save and self.pk:
+            EmailRecipient.objects.filter(pk=self.pk).update(user_id=user_id)
+        return True
+
+    @classmethod
+    def _cache_users(cls, users):
+        """
+        :return: `users` as RecipientUser, stored in the shared cache
+        """
+        users = [RecipientUser.from_user(user) for user in users]
+        cache.set_many(dict((cls.USER_CACHE_KEY.format(user_id=user.uuid), user) for user in users),
+                       config.USER_CACHE_TIMEOUT)
+        return users
+
+    def _get_user_by_email(self):
+        try:
+            user = User.get_user_by_email(self.email)
+        except User.DoesNotExist:
+            return None
+        return self._cache_users([user])[0]
+
+    @cached_property
     def user(self):
+        """
+        The User of the address, with one query by `user_id` when it is
+        known, otherwise looked up by email and `user_id` stored.
+        """
+        if self.user_id:
+            user = User.objects.filter(uuid=self.user_id).first()
+            if self._is_user(user):
+                return user
+
         try:
             user = User.get_user_by_email(self.email)
         except User.DoesNotExist:
-            return
+            user = None
+        self._set_user_id(user)
         return user
 
+    @cached_property
+    def recipient_user(self):
+        """
+        The RecipientUser of the address, from the shared cache by `user_id`
+        when it is known, otherwise looked up by email and `user_id` stored.
+        """
+        if self.user_id:
+            user = self.get_cached_users([self.user_id]).get(self.user_id)
+            if self._is_user(user):
+                return user
+
+        user = self._get_user_by_email()
+        self._set_user_id(user)
+        return user
+
+    @classmethod
+    def get_cached_users(cls, user_ids):
+        """
+        :return: a dict of the RecipientUser of `user_ids`, from the shared
+            cache or else with a single query
+        """
+        keys = dict((cls.USER_CACHE_KEY.format(user_id=user_id), user_id) for user_id in user_ids)
+        users = dict((keys[key], user) for key, user in cache.get_many(list(keys)).items())
+
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            users.update((user.uuid, user) for user in cls._cache_users(User.objects.filter(uuid__in=missing)))
+        return users
+
+    @classmethod
+    def prefetch_users(cls, recipients):
+        """
+        Resolve the `recipient_user` of many recipients with at most two user
+        queries, one by `user_id` for those missing from the shared cache and
+        one by email for the rest, and one update for the changed `user_id`.
+        As `recipient_user`, emails match whatever their case, and a stored
+        `user_id` is only cleared once `User.get_user_by_email` finds no user
+        either.
+        """
+        pending = [recipient for recipient in recipients if 'recipient_user' not in recipient.__dict__]
+        users = cls.get_cached_users(set(recipient.user_id for recipient in pending if recipient.user_id))
+
+        unresolved = []
+        for recipient in pending:
+            user = users.get(recipient.user_id)
+            if recipient._is_user(user):
+                recipient.__dict__['recipient_user'] = user
+            else:
+                unresolved.append(recipient)
+
+        if unresolved:
+            users = User.objects.annotate(email_lower=Lower('email')).filter(
+                email_lower__in=[recipient.email.lower() for recipient in unresolved])
+            by_email = dict((user.email.lower(), user) for user in cls._cache_users(users))
+            changed = []
+            for recipient in unresolved:
+                user = by_email.get(recipient.email.lower())
+                if user is None and recipient.user_id:
+                    user = recipient._get_user_by_email()
+                recipient.__dict__['recipient_user'] = user
+                if recipient._set_user_id(user, save=False) and recipient.pk:
+                    changed.append(recipient)
+            if changed:
+                cls.objects.filter(pk__in=[recipient.pk for recipient in changed]).update(user_id=Case(
+                    *[When(pk=recipient.pk, then=Value(recipient.user_id, output_field=models.UUIDField()))
+                      for recipient in changed]))
+        return recipients
+
     def get_token_context(self, registration=False):
         user = get_user_by_email(self.email, registration=registration)
         return {'system_tokens': user.get_email_context()}
 
+    @staticmethod
+    def normalize_email(email):
+        return BaseUserManager.normalize_email(email.strip())
+
     @classmethod
     def get_or_create(cls, email):
+        email = cls.normalize_email(email)
         try:
             obj = cls.objects.get(email=email)
         except cls.DoesNotExist:
@@ -470,6 +924,56 @@ class EmailRecipient(models.Model):
 
         return obj
 
+    @classmethod
+    def _insert_missing(cls, emails, user_ids):
+        objs = [cls(email=email, user_id=user_ids.get(email)) for email in emails]
+        # bulk_create(ignore_conflicts=True) is available from Django 2.2
+        if getattr(connections[cls.objects.db].features, 'supports_ignore_conflicts', False):
+            cls.objects.bulk_create(objs, ignore_conflicts=True)
+            return
+
+        existing = set(cls.objects.filter(email__in=emails).values_list('email', flat=True))
+        objs = [obj for obj in objs if obj.email not in existing]
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(objs)
+        except IntegrityError:
+            # Another process inserted some of them since, insert one by one
+            for obj in objs:
+                cls.objects.get_or_create(email=obj.email, defaults={'user_id': obj.user_id})
+
+    @classmethod
+    def bulk_get_or_create(cls, emails, batch_size=500):
+        """
+        Get or create the recipients of many addresses, with a constant
+        number of queries per batch: one for the users, one or two for the
+        insert, one to fill in the users of existing recipients and one to
+        fetch the recipients.
+
+        :param emails: an iterable of addresses, normalized and deduplicated
+        :return: a list of EmailRecipient, in the order of `emails`
+        """
+        normalized = []
+        seen = set()
+        for email in emails:
+            email = cls.normalize_email(email)
+            if email and email not in seen:
+                seen.add(email)
+                normalized.append(email)
+
+        recipients = {}
+        for start in range(0, len(normalized), batch_size):
+            batch = normalized[start:start + batch_size]
+            user_ids = dict(User.objects.filter(email__in=batch).values_list('email', 'uuid'))
+            cls._insert_missing(batch, user_ids)
+            if user_ids:
+                cls.objects.filter(email__in=list(user_ids), user_id__isnull=True).update(user_id=Case(
+                    *[When(email=email, then=Value(user_id, output_field=models.UUIDField()))
+                      for email, user_id in user_ids.items()]))
+            recipients.update((obj.email, obj) for obj in cls.objects.filter(email__in=batch))
+
+        return [recipients[email] for email in normalized]
+
 
 @python_2_unicode_compatible
 class EmailLink(models.Model):
@@ -540,10 +1044,31 @@ class AbstractEmailModel(models.Model):
     def get_context_data(self):
         return eval(self.context_data)
 
+    def render_email(self, extra_context=None):
+        """
+        Render from the released bundle of the template, without touching
+        the template tables, so edits made since the release do not change
+        the email. As with the compiled render, only the tokens of
+        `extra_context` vary per recipient, a template reading other
+        variables of it is rendered in full from the snapshot of the bundle.
+        """
+        with metrics.timer('template_lookup'):
+            compiled = EmailRenderBundle.get_bundle(self.email_template_id)
+            if compiled is None:
+                # Never released, snapshot it now as it is
+                compiled = EmailRenderBundle.create_for_template(self.email_template).get_compiled()
+
+        if get_context_keys(extra_context):
+            email_template, context = EmailRenderBundle.get_render_context(compiled)
+            if reads_context(email_template, compiled.version, extra_context, context=context):
+                context.update(extra_context)
+                return email_template.render_template(context)
+        return compiled.render(dict(extra_context or {}))
+
     @classmethod
     def get_email(cls, email_id):
         try:
-            obj = cls.objects.get(pk=email_id)
+            obj = cls.objects.select_related('email_template__base_theme', 'primary_to', 'sender').get(pk=email_id)
         except cls.DoesNotExist:
             return
         return obj
@@ -563,16 +1088,237 @@ class MarketEmail(AbstractEmailModel):
     def to_recipients(self):
         primary_to = self.primary_to.email
         to_recipients = self.to.all()
-        recipient_list = to_recipients.values_list('email', flat=True)
+        recipient_list = list(to_recipients.values_list('email', flat=True))
         if primary_to not in recipient_list:
-            recipient_list = recipient_list.append(primary_to)
+            recipient_list.append(primary_to)
 
         return recipient_list
 
+    def get_recipients(self):
+        """
+        :return: the recipients of `to` and `primary_to`, as `to_recipients`
+        """
+        return EmailRecipient.objects.filter(Q(pk__in=self.to.values('pk')) | Q(pk=self.primary_to_id))
+
+    def create_chunks(self, chunk_size=None):
+        """
+        Split the recipients into chunks of `chunk_size`, ordered by recipient
+        id. The chunks are only created once, later calls return the existing
+        ones so a restarted campaign picks up where it stopped.
+        """
+        chunk_size = chunk_size or config.CAMPAIGN_CHUNK_SIZE
+        with transaction.atomic():
+            # A concurrent run waits for this one, then finds its chunks
+            MarketEmail.objects.select_for_update().get(pk=self.pk)
+            chunks = list(self.chunks.all())
+            if chunks:
+                return chunks
+
+            recipient_ids = self.get_recipients().order_by('pk').values_list('pk', flat=True).iterator()
+            batch = []
+            for recipient_id in recipient_ids:
+                batch.append(recipient_id)
+                if len(batch) == chunk_size:
+                    chunks.append(MarketEmailChunk(market_email=self, index=len(chunks),
+                                                   start_id=batch[0], end_id=batch[-1], num_recipients=len(batch)))
+                    batch = []
+            if batch:
+                chunks.append(MarketEmailChunk(market_email=self, index=len(chunks),
+                                               start_id=batch[0], end_id=batch[-1], num_recipients=len(batch)))
+
+            MarketEmailChunk.objects.bulk_create(chunks)
+        return list(self.chunks.all())
+
+    def get_pending_chunks(self):
+        return self.chunks.filter(status__in=[MarketEmailChunk.PENDING, MarketEmailChunk.SENDING])
+
+    def get_send_plan(self, now=None):
+        """
+        Plan the pending chunks against the remaining 24 hour quota, less the
+        part reserved for transactional emails, at the marketing lane's rate.
+        The reserve always leaves campaigns some of the quota.
+
+        :return: a tuple of the pending chunks and their CampaignPlan
+        :raises ValueError: if the stats leave no quota or send rate
+        """
+        now = now or timezone.now()
+        stats = EmailStats.get_latest()
+        chunks = list(self.get_pending_chunks())
+        reserve = min(int(stats.max_24h * config.TRANSACTIONAL_QUOTA_RESERVE), max(0, stats.max_24h - 1))
+        plan = plan_campaign([chunk.num_recipients for chunk in chunks],
+                             max_24h=stats.max_24h,
+                             sent_24h=stats.sent_24h,
+                             send_rate=get_lane_rate(MARKETING, stats.per_second_rate),
+                             now=now,
+                             reserve=reserve)
+        return chunks, plan
+
+    def schedule_chunks(self, now=None):
+        """
+        Set when each pending chunk is released.
+
+        :return: the projected completion time
+        """
+        chunks, plan = self.get_send_plan(now=now)
+        for chunk, eta in zip(chunks, plan.etas):
+            chunk.scheduled_at = eta
+        with transaction.atomic():
+            for chunk in chunks:
+                chunk.save(update_fields=['scheduled_at'])
+        return plan.completion
+
+    def get_projected_completion(self):
+        return self.get_send_plan()[1].completion
+
     def send(self):
+        if config.OUTBOX:
+            return OutboxMessage.enqueue(self)
         send_market_email(self.id)
 
 
+@python_2_unicode_compatible
+class MarketEmailChunk(models.Model):
+    """
+    A fixed range of the recipients of a MarketEmail, sent by one Celery
+    subtask. The subtask claims the chunk with a conditional update, so a
+    redelivered task does not send it twice, and the status survives a
+    crash, so only unfinished chunks are sent again. A chunk only partly
+    sent is not sent again, as the recipients already sent are not known.
+    A chunk that failed is sent again, up to config.CAMPAIGN_CHUNK_MAX_ATTEMPTS
+    times.
+    """
+    PENDING = 'P'
+    SENDING = 'C'
+    SENT = 'S'
+    PARTIAL = 'A'
+    FAILED = 'F'
+    STATUS_CHOICES = (
+        (PENDING, _('Pending')),
+        (SENDING, _('Sending')),
+        (SENT, _('Sent')),
+        (PARTIAL, _('Partially sent')),
+        (FAILED, _('Failed')),
+    )
+
+    market_email = models.ForeignKey(MarketEmail, related_name='chunks', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField()
+    start_id = models.PositiveIntegerField(help_text='First EmailRecipient id of the chunk')
+    end_id = models.PositiveIntegerField(help_text='Last EmailRecipient id of the chunk')
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    num_recipients = models.PositiveIntegerField(default=0)
+    num_sent = models.PositiveIntegerField(default=0)
+    scheduled_at = models.DateTimeField(blank=True, null=True, help_text='When the chunk is released for sending')
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    timestamp_sent = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('market_email', 'index')
+        ordering = ['index']
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.market_email_id, self.index, self.get_status_display())
+
+    @classmethod
+    def get_pending(cls, chunk_id):
+        """
+        Claim the chunk for sending.
+
+        :return: the chunk, or None if it is not pending or another task claimed it
+        """
+        pending = cls.objects.filter(pk=chunk_id, status=cls.PENDING)
+        claimed = pending.update(status=cls.SENDING, claimed_at=timezone.now())
+        if not claimed:
+            return
+        return cls.objects.select_related('market_email__email_template').get(pk=chunk_id)
+
+    @classmethod
+    def release_stale(cls, timeout=None):
+        """
+        Put back the chunks of a subtask that died while sending them.
+        """
+        timeout = timeout or config.CAMPAIGN_CHUNK_CLAIM_TIMEOUT
+        stale = cls.objects.filter(status=cls.SENDING, claimed_at__lt=timezone.now() - timedelta(seconds=timeout))
+        return stale.update(status=cls.PENDING)
+
+    def get_recipients(self):
+        return self.market_email.get_recipients().filter(pk__gte=self.start_id, pk__lte=self.end_id).order_by('pk')
+
+    def recipients(self):
+        return list(self.get_recipients().values_list('email', flat=True))
+
+    def get_bulk_destinations(self):
+        """
+        :return: a list of (email, token values) tuples for the recipients
+        """
+        destinations = []
+        for recipient in EmailRecipient.prefetch_users(list(self.get_recipients())):
+            if recipient.recipient_user is not None:
+                context = recipient.recipient_user.get_email_context()
+            else:
+                context = {'user_email': recipient.email}
+            destinations.append((recipient.email, USER_REPLACER.get_values(context)))
+        return destinations
+
+    def send_bulk(self, service=None):
+        """
+        Send the chunk with SES bulk templated calls. The released template
+        is stored by SES, updated when a new version is released, and only
+        the token values of each recipient are sent.
+
+        :return: the number of emails sent
+        """
+        email_template = self.market_email.email_template
+        compiled = EmailRenderBundle.get_bundle(email_template.pk) or email_template.get_compiled()
+        template_name = 'dodo-{}'.format(email_template.pk)
+
+        service = service or AmazonSEService(lane=email_template.lane)
+        service.open()
+        try:
+            service.create_template(template_name, *compiled.to_provider_template(), version=compiled.version)
+            results = service.send_bulk_templated(settings.DEFAULT_FROM_EMAIL, template_name,
+                                                  self.get_bulk_destinations(),
+                                                  default_data=dict.fromkeys(USER_TOKENS, ''))
+        finally:
+            service.close()
+        return sum(results)
+
+    def mark_attempt(self):
+        self.attempts += 1
+        self.save(update_fields=['attempts'])
+
+    def get_retry_delay(self):
+        return config.CAMPAIGN_CHUNK_RETRY_DELAY * 2 ** max(0, self.attempts - 1)
+
+    def mark_sent(self, num_sent):
+        """
+        Record the result of a send. Nothing sent puts the chunk back to be
+        sent again, or marks it failed after config.CAMPAIGN_CHUNK_MAX_ATTEMPTS
+        attempts. Some of its recipients sent marks it partially sent.
+        """
+        if not num_sent:
+            if self.attempts < config.CAMPAIGN_CHUNK_MAX_ATTEMPTS:
+                self.status = self.PENDING
+                self.save(update_fields=['status'])
+                return
+
+            LOG.error('Giving up chunk %s after %s attempts', self.pk, self.attempts)
+            self.status = self.FAILED
+            self.save(update_fields=['status'])
+        elif num_sent < self.num_recipients:
+            LOG.warning('Sent %s of the %s emails of chunk %s', num_sent, self.num_recipients, self.pk)
+            self.status = self.PARTIAL
+        else:
+            self.status = self.SENT
+        if num_sent:
+            self.num_sent = num_sent
+            self.timestamp_sent = timezone.now()
+            self.save(update_fields=['status', 'num_sent', 'timestamp_sent'])
+
+        if not self.market_email.get_pending_chunks().exists():
+            MarketEmail.objects.filter(pk=self.market_email_id).update(timestamp_sent=timezone.now())
+
+
 @python_2_unicode_compatible
 class NetworkEmail(AbstractEmailModel):
     to = models.ManyToManyField(EmailRecipient, related_name='network_email_to_recipients')
@@ -585,9 +1331,9 @@ class NetworkEmail(AbstractEmailModel):
     def to_recipients(self):
         primary_to = self.primary_to.email
         to_recipients = self.to.all()
-        recipient_list = to_recipients.values_list('email', flat=True)
+        recipient_list = list(to_recipients.values_list('email', flat=True))
         if primary_to not in recipient_list:
-            recipient_list = recipient_list.append(primary_to)
+            recipient_list.append(primary_to)
 
         return recipient_list
 
@@ -598,14 +1344,24 @@ class NetworkEmail(AbstractEmailModel):
         return self.bcc.all().values_list('email', flat=True)
 
     @classmethod
-    def send(self, to_recipients, cc_recipients, bcc_recipients, email_type):
+    def send(cls, to_recipients, cc_recipients, bcc_recipients, email_type):
         if email_type in EmailTemplate.USER_EMAILS:
             return
         email_template = EmailTemplate.get_email_template(email_type)
-        to_list = []
-        for recipient in to_recipients:
-            to_list.append(EmailRecipient.get_or_create(recipient))
-        send_network_email(self.id)
+        to_list = EmailRecipient.bulk_get_or_create(to_recipients)
+        if not email_template or not to_list:
+            LOG.error('Cannot send %s to: %s', email_type, to_recipients)
+            return
+
+        email = cls.objects.create(email_template=email_template, primary_to=to_list[0])
+        email.to.add(*to_list)
+        email.cc.add(*EmailRecipient.bulk_get_or_create(cc_recipients or []))
+        email.bcc.add(*EmailRecipient.bulk_get_or_create(bcc_recipients or []))
+        if config.OUTBOX:
+            OutboxMessage.enqueue(email)
+        else:
+            send_network_email(email.id)
+        return email
 
 
 @python_2_unicode_compatible
@@ -652,6 +1408,10 @@ class UserEmail(AbstractEmailModel):
                                        primary_to=recipient,
                                        sender=sender,
                                        context_data=extra_context)
+            if config.OUTBOX:
+                OutboxMessage.enqueue(email)
+                return
+
             try:
                 email.send(extra_context=extra_context)
             except Exception as e:
@@ -660,35 +1420,34 @@ class UserEmail(AbstractEmailModel):
             LOG.error('\nCannot find %s for user: %s', email_type, user.email)
 
     def send(self, extra_context=None):
-        if extra_context is None:
-            extra_context = self.get_context_data()
+        email_template = self.email_template
+        with metrics.email_type(email_template.email_type), metrics.timer('send'):
+            if extra_context is None:
+                extra_context = self.get_context_data()
 
-        domain_context = get_domain_context()
-        extra_context.update(domain_context)
-        extra_context['user'] = self.primary_to.user
-        if self.sender:
-            extra_context['sender'] = self.sender.user
+            with metrics.timer('context'):
+                extra_context.update(get_domain_context())
+                extra_context['user'] = self.primary_to.user
+                if self.sender_id:
+                    extra_context['sender'] = self.sender.user
 
-        if not self.email_template:
-            # Get the latest template
-            email_template = EmailTemplate.get_email_template(self.email_template.email_type)
-        else:
-            email_template = self.email_template
+            try:
+                email_data = self.render_email(extra_context=extra_context)
+                with metrics.timer('build_message'):
+                    email_message = build_mail(email_data['subject'],
+                                               email_data['text_body'],
+                                               self.to_recipient,
+                                               html_body=email_data['html_body'])
+                send_messages([email_message], lane=email_template.lane)
+            except Exception as e:
+                LOG.error('Cannot send email, %s, %s', self.id, e)
+                metrics.increment('failed')
+                return False
 
-        try:
-            email_data = email_template.render(extra_context=extra_context)
-            send_mail(email_data['subject'],
-                      email_data['text_body'],
-                      self.to_recipient,
-                      html_body=email_data['html_body'])
-        except Exception as e:
-            LOG.error('Cannot send email, %s, %e', self.id, e)
-        else:
-            if email_template != self.email_template:
-                self.email_template = email_template
-
-            self.timestamp_sent = timezone.now()
-            self.save(update_fields=['timestamp_sent', 'email_template'])
+            with metrics.timer('save'):
+                self.timestamp_sent = timezone.now()
+                self.save(update_fields=['timestamp_sent'])
+            return True
 
     def resend(self, requester=None, extra_context=None):
         self.resend_requester = requester
@@ -696,3 +1455,207 @@ class UserEmail(AbstractEmailModel):
         self.save(update_fields=['resend_requester', 'timestamp_resend'])
         self.send(extra_context=extra_context)
 
+
+@python_2_unicode_compatible
+class OutboxMessage(models.Model):
+    """
+    A queued email. Dispatchers claim due messages in batches, with
+    SELECT ... FOR UPDATE SKIP LOCKED where the database supports it and a
+    conditional update otherwise, so each message is claimed by only one
+    dispatcher. Failed messages are retried with backoff up to
+    config.OUTBOX_MAX_ATTEMPTS.
+    """
+    PENDING = 'P'
+    CLAIMED = 'C'
+    SENT = 'S'
+    FAILED = 'F'
+    STATUS_CHOICES = (
+        (PENDING, _('Pending')),
+        (CLAIMED, _('Claimed')),
+        (SENT, _('Sent')),
+        (FAILED, _('Failed')),
+    )
+
+    USER_EMAIL = 'U'
+    MARKET_EMAIL = 'M'
+    NETWORK_EMAIL = 'N'
+    EMAIL_MODEL_CHOICES = (
+        (USER_EMAIL, _('User email')),
+        (MARKET_EMAIL, _('Market email')),
+        (NETWORK_EMAIL, _('Network email')),
+    )
+    LANE_EMAIL_MODELS = {
+        TRANSACTIONAL: [USER_EMAIL],
+        MARKETING: [MARKET_EMAIL, NETWORK_EMAIL],
+    }
+
+    email_model = models.CharField(max_length=1, choices=EMAIL_MODEL_CHOICES)
+    email_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    timestamp_sent = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        index_together = [('status', 'next_attempt_at')]
+        ordering = ['next_attempt_at', 'pk']
+
+    def __str__(self):
+        return '{} {} ({})'.format(self.get_email_model_display(), self.email_id, self.get_status_display())
+
+    @classmethod
+    def get_email_models(cls):
+        return {cls.USER_EMAIL: UserEmail, cls.MARKET_EMAIL: MarketEmail, cls.NETWORK_EMAIL: NetworkEmail}
+
+    @classmethod
+    def enqueue(cls, email):
+        email_models = dict((model, key) for key, model in cls.get_email_models().items())
+        return cls.objects.create(email_model=email_models[type(email)], email_id=email.pk)
+
+    @classmethod
+    def get_due(cls, lane=None):
+        due = cls.objects.filter(status=cls.PENDING, next_attempt_at__lte=timezone.now())
+        if lane:
+            due = due.filter(email_model__in=cls.LANE_EMAIL_MODELS[lane])
+        return due
+
+    @classmethod
+    def claim(cls, batch_size=None, worker='', lane=None):
+        """
+        Claim up to `batch_size` due messages for `worker`, only from `lane`
+        if given.
+
+        :return: the list of claimed messages
+        """
+        batch_size = batch_size or config.OUTBOX_BATCH_SIZE
+        token = uuid.uuid4().hex
+        claim = dict(status=cls.CLAIMED, claim_token=token, claimed_by=worker, claimed_at=timezone.now(),
+                     attempts=F('attempts') + 1)
+
+        if connections[cls.objects.db].features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                due = cls.get_due(lane).select_for_update(skip_locked=True)
+                pks = list(due.values_list('pk', flat=True)[:batch_size])
+                cls.objects.filter(pk__in=pks).update(**claim)
+        else:
+            # Only the dispatcher whose update still sees the row pending gets it
+            pks = list(cls.get_due(lane).values_list('pk', flat=True)[:batch_size])
+            cls.objects.filter(pk__in=pks, status=cls.PENDING).update(**claim)
+
+        return list(cls.objects.filter(claim_token=token))
+
+    @classmethod
+    def release_stale(cls, timeout=None):
+        """
+        Put back the messages of a dispatcher that died holding them.
+        """
+        timeout = timeout or config.OUTBOX_CLAIM_TIMEOUT
+        stale = cls.objects.filter(status=cls.CLAIMED, claimed_at__lt=timezone.now() - timedelta(seconds=timeout))
+        return stale.update(status=cls.PENDING, claim_token='')
+
+    @classmethod
+    def get_queue_depth(cls):
+        """
+        :return: a dict of the number of messages in each status
+        """
+        counts = dict((status, 0) for status, label in cls.STATUS_CHOICES)
+        counts.update(cls.objects.values_list('status').annotate(Count('pk')).order_by())
+        return counts
+
+    def mark_sent(self):
+        self.status = self.SENT
+        self.timestamp_sent = timezone.now()
+        self.save(update_fields=['status', 'timestamp_sent'])
+
+    def mark_failed(self, error=''):
+        if self.attempts >= config.OUTBOX_MAX_ATTEMPTS:
+            self.status = self.FAILED
+        else:
+            self.status = self.PENDING
+            backoff = get_backoff(self.attempts - 1, config.OUTBOX_RETRY_DELAY)
+            self.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+        self.last_error = error
+        self.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+
+    def send(self):
+        """
+        Send the queued email.
+
+        :return: True if it was sent
+        """
+        email = self.get_email_models()[self.email_model].get_email(self.email_id)
+        if email is None:
+            self.mark_failed('The email does not exist')
+            return False
+
+        try:
+            if self.email_model == self.USER_EMAIL:
+                sent = email.send()
+            elif self.email_model == self.MARKET_EMAIL:
+                send_market_email(email.pk)
+                sent = True
+            else:
+                send_network_email(email.pk)
+                sent = True
+        except Exception as e:
+            LOG.error('Cannot send outbox message %s: %s', self.pk, e)
+            self.mark_failed(str(e))
+            return False
+
+        if sent:
+            self.mark_sent()
+        else:
+            self.mark_failed('The email was not sent')
+        return sent
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_save, sender=EmailWidget)
+@receiver(post_save, sender=EmailTheme)
+@receiver(post_save, sender=EmailButton)
+@receiver(post_delete, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailWidget)
+@receiver(post_delete, sender=EmailTheme)
+@receiver(post_delete, sender=EmailButton)
+def invalidate_compiled_templates(sender, **kwargs):
+    bump_render_generation()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_recipient_user(sender, instance, **kwargs):
+    # Any change, e.g. to the email or the names used by the tokens
+    user_id = getattr(instance, 'uuid', None)
+    if user_id is not None:
+        cache.delete(EmailRecipient.USER_CACHE_KEY.format(user_id=user_id))
+
+
+@receiver(m2m_changed, sender=EmailTemplate.widgets.through)
+def invalidate_compiled_widgets(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_render_generation()
+
+
+@receiver(post_save, sender=EmailTemplate)
+def release_render_bundle(sender, instance, raw=False, **kwargs):
+    if instance.release and not raw:
+        _update_render_bundle(instance)
+
+
+@receiver(m2m_changed, sender=EmailTemplate.widgets.through)
+def release_widgets_render_bundle(sender, instance, action, reverse=False, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse and instance.release:
+        _update_render_bundle(instance)
+
+
+def _update_render_bundle(email_template):
+    # Never fail the save, the workers keep the previous bundle
+    try:
+        EmailRenderBundle.update_for_template(email_template)
+    except Exception:
+        LOG.exception('Cannot create the render bundle of email template %s', email_template.pk)
@@ -1,19 +1,82 @@
+import json
+import logging
+from xml.etree import ElementTree
+
+from boto.exception import BotoServerError
+from boto.regioninfo import RegionInfo
+from boto.ses import connect_to_region
 from boto.ses.connection import SESConnection
 
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.six.moves.urllib.parse import urlencode, urlparse
 
+from django_dodo import config
+from django_dodo.backends.rate_limit import get_max_send_rate
+from django_dodo.backends.throttling import ThrottledSender
 from django_dodo.services.base import EmailService
+from django_dodo.utils.concurrency import map_with_connections
+from django_dodo.utils.mime import get_raw_message
+
+logger = logging.getLogger(__name__)
+
+# The most destinations SES accepts in one SendBulkTemplatedEmail call
+BULK_DESTINATIONS = 50
+TEMPLATE_CACHE_KEY = 'django_dodo:ses_template:{name}'
+
+
+def get_ses_connection(aws_access_key_id, aws_secret_access_key, region_name=None):
+    """
+    A boto SES connection to the region, or to DODO_SES_ENDPOINT when set,
+    e.g. a local FakeSESServer.
+    """
+    if config.SES_ENDPOINT:
+        endpoint = urlparse(config.SES_ENDPOINT)
+        return SESConnection(aws_access_key_id=aws_access_key_id,
+                             aws_secret_access_key=aws_secret_access_key,
+                             region=RegionInfo(name=region_name or 'us-east-1', endpoint=endpoint.hostname),
+                             is_secure=endpoint.scheme == 'https',
+                             port=endpoint.port)
+    if region_name:
+        return connect_to_region(region_name,
+                                 aws_access_key_id=aws_access_key_id,
+                                 aws_secret_access_key=aws_secret_access_key)
+    return SESConnection(aws_access_key_id=aws_access_key_id,
+                         aws_secret_access_key=aws_secret_access_key)
+
+
+def parse_response(body):
+    """
+    Parse an SES query API response, dropping the XML namespaces.
+    """
+    root = ElementTree.fromstring(body)
+    for node in root.iter():
+        if '}' in node.tag:
+            node.tag = node.tag.split('}', 1)[1]
+    return root
 
 
 class AmazonSEService(EmailService):
 
     def __init__(self, *args, **kwargs):
         """
-        Initializes the Amazon SES email service.
+        Initializes the Amazon SES email service. The keyword arguments
+        `concurrency`, `connection_factory` which replaces the boto
+        connection, e.g. with FakeSES.connect, `rate_limiter` and `lane`,
+        whose token bucket the sends draw from, are all optional.
         """
         self.connection = None
         self.id = settings.EMAIL_SERVICES_CLIENT_ID
         self.key = settings.EMAIL_SERVICES_CLIENT_KEY
+        self.concurrency = kwargs.pop('concurrency', None) or config.SEND_CONCURRENCY
+        self.connection_factory = kwargs.pop('connection_factory', None)
+        self.sender = ThrottledSender(lambda: self.get_max_send_rate(),
+                                      rate_limiter=kwargs.pop('rate_limiter', None), lane=kwargs.pop('lane', None))
+
+    def connect(self):
+        if self.connection_factory:
+            return self.connection_factory()
+        return get_ses_connection(self.id, self.key)
 
     def open(self):
         """
@@ -23,8 +86,7 @@ class AmazonSEService(EmailService):
         if self.connection:
             return
 
-        self.connection = SESConnection(aws_access_key_id=self.id,
-                                        aws_secret_access_key=self.key)
+        self.connection = self.connect()
 
     def close(self):
         """
@@ -37,16 +99,147 @@ class AmazonSEService(EmailService):
         self.connection.close()
         self.connection = None
 
+    def get_send_quota(self):
+        self.open()
+        return self.connection.get_send_quota()
+
+    def get_max_send_rate(self):
+        """
+        The account's MaxSendRate, cached with the quota SESBackend uses.
+        """
+        return get_max_send_rate(lambda: self.get_send_quota()['GetSendQuotaResponse']['GetSendQuotaResult'])
+
+    def get_rate_limiter(self):
+        """
+        The token bucket shared with SESBackend, of the lane if one was given.
+        """
+        return self.sender.get_rate_limiter()
+
+    def get_controller(self):
+        return self.sender.get_controller()
+
+    def get_concurrency(self):
+        """
+        The configured concurrency, kept below the account's MaxSendRate.
+        """
+        if self.concurrency <= 1:
+            return 1
+
+        return max(1, min(self.concurrency, int(self.get_max_send_rate())))
+
+    def send_message(self, connection, message):
+        """
+        Sends one message, retrying with a jittered backoff while SES
+        throttles it, see ThrottledSender.
+        """
+        raw_message = get_raw_message(message)
+
+        def send():
+            connection.send_raw_email(
+                source=message.from_email,
+                destinations=message.recipients(),
+                raw_message=raw_message)
+            return True
+
+        return bool(self.sender.send(send))
+
+    def send_each(self, email_messages):
+        """
+        Sends the messages, in parallel on a bounded thread pool with one
+        connection per thread if a concurrency was configured. Once the
+        daily quota is exceeded the rest of the messages are not sent.
+
+        Returns True for each message sent, in input order.
+        """
+        if not self.connection:
+            self.open()
+
+        self.sender.start()
+
+        concurrency = self.get_concurrency()
+        if concurrency > 1 and len(email_messages) > 1:
+            return map_with_connections(self.send_message, email_messages, concurrency, self.connect)
+
+        return [self.send_message(self.connection, message) for message in email_messages]
+
     def send_messages(self, email_messages):
         """
         Sends one or more email messages using throught amazon SES
         using boto.
         """
+        return sum(1 for sent in self.send_each(list(email_messages)) if sent)
+
+    def request(self, action, params):
+        """
+        Make a call to the SES API for the actions boto does not wrap.
+
+        :return: the parsed XML response
+        """
         if not self.connection:
             self.open()
 
-        for message in email_messages:
-            self.connection.send_raw_email(
-                source=message.from_email,
-                destinations=message.recipients(),
-                raw_message=message.message().as_string())
+        params = dict(params, Action=action)
+        response = self.connection.make_request(
+            'POST', '/',
+            headers={'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'},
+            data=urlencode(sorted(params.items())))
+        body = response.read().decode('utf-8')
+        if response.status != 200:
+            self.connection._handle_error(response, body)
+        return parse_response(body)
+
+    def create_template(self, name, subject, html, text, version=None):
+        """
+        Registers a server side template, or updates it when its `version`
+        changed, so a template keeps a single SES template across releases.
+        """
+        version = version or ''
+        cache_key = TEMPLATE_CACHE_KEY.format(name=name)
+        if cache.get(cache_key) == version:
+            return
+
+        params = {'Template.TemplateName': name,
+                  'Template.SubjectPart': subject,
+                  'Template.HtmlPart': html,
+                  'Template.TextPart': text}
+        try:
+            self.request('CreateTemplate', params)
+        except BotoServerError as e:
+            if e.error_code != 'AlreadyExists':
+                raise
+            self.request('UpdateTemplate', params)
+        cache.set(cache_key, version, None)
+
+    def send_bulk_templated(self, source, template_name, destinations, default_data=None):
+        """
+        Sends a registered template to many destinations, in calls of up to
+        BULK_DESTINATIONS destinations each. A throttled call is retried
+        with a jittered backoff, as in send_message, and the calls stop once
+        the daily quota is exceeded.
+
+        :param destinations: a list of (email, replacement data dict) tuples
+        :return: True for each destination accepted by SES, in input order
+        """
+        self.sender.start()
+        results = []
+        for start in range(0, len(destinations), BULK_DESTINATIONS):
+            batch = destinations[start:start + BULK_DESTINATIONS]
+            params = {'Source': source,
+                      'Template': template_name,
+                      'DefaultTemplateData': json.dumps(default_data or {})}
+            for index, (email, data) in enumerate(batch, 1):
+                prefix = 'Destinations.member.{}.'.format(index)
+                params[prefix + 'Destination.ToAddresses.member.1'] = email
+                params[prefix + 'ReplacementTemplateData'] = json.dumps(data)
+
+            # SES counts each destination against the send rate
+            root = self.sender.send(lambda: self.request('SendBulkTemplatedEmail', params), tokens=len(batch))
+            if root is None:
+                results.extend([False] * len(batch))
+                continue
+
+            statuses = [member.findtext('Status') for member in root.findall('.//Status/member')]
+            results.extend(status == 'Success' for status in statuses)
+            results.extend([False] * (len(batch) - len(statuses)))
+
+        return results
@@ -0,0 +1,209 @@
+"""
+asyncio Amazon SES service. Talks to the SES query API directly over a
+small pool of keep-alive HTTP connections, so a single thread can keep
+hundreds of sends in flight. Requires aiohttp.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+from datetime import datetime
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from django.conf import settings
+from django.utils.six.moves.urllib.parse import urlencode, urlparse
+
+from django_dodo import config
+from django_dodo.backends.rate_limit import get_max_send_rate
+from django_dodo.backends.throttling import ThrottledSender
+from django_dodo.services.amazon_ses import parse_response
+from django_dodo.services.base import EmailServiceError
+from django_dodo.services.base_async import AsyncEmailService
+from django_dodo.utils.mime import get_raw_message
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = '2010-12-01'
+SERVICE_NAME = 'ses'
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign_request(access_key, secret_key, region, host, body, now=None):
+    """
+    Build the AWS Signature Version 4 headers for a form encoded POST to `/`.
+
+    :return: a dict of the headers to send
+    """
+    now = now or datetime.utcnow()
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = now.strftime('%Y%m%d')
+    content_type = 'application/x-www-form-urlencoded; charset=utf-8'
+    signed_headers = 'content-type;host;x-amz-date'
+
+    canonical_request = '\n'.join([
+        'POST', '/', '',
+        'content-type:{}'.format(content_type),
+        'host:{}'.format(host),
+        'x-amz-date:{}'.format(amz_date),
+        '',
+        signed_headers,
+        hashlib.sha256(body.encode('utf-8')).hexdigest(),
+    ])
+    scope = '{}/{}/{}/aws4_request'.format(date_stamp, region, SERVICE_NAME)
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ])
+
+    signing_key = _hmac(('AWS4' + secret_key).encode('utf-8'), date_stamp)
+    for part in (region, SERVICE_NAME, 'aws4_request'):
+        signing_key = _hmac(signing_key, part)
+    signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    return {
+        'Content-Type': content_type,
+        'X-Amz-Date': amz_date,
+        'Authorization': 'AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, Signature={}'.format(
+            access_key, scope, signed_headers, signature),
+    }
+
+
+class AsyncAmazonSEService(AsyncEmailService):
+    """
+    Sends through the SES query API with aiohttp. Up to `max_in_flight`
+    requests are outstanding at once, sharing `max_connections` keep-alive
+    connections. Every send draws from the same token bucket as SESBackend.
+    """
+
+    def __init__(self, region_name=None, endpoint=None, max_connections=None, max_in_flight=None,
+                 rate_limiter=None, lane=None, *args, **kwargs):
+        self.id = settings.EMAIL_SERVICES_CLIENT_ID
+        self.key = settings.EMAIL_SERVICES_CLIENT_KEY
+        self.region_name = region_name or getattr(settings, 'AWS_SES_REGION_NAME', None) or 'us-east-1'
+        self.endpoint = endpoint or config.SES_ENDPOINT or 'https://email.{}.amazonaws.com/'.format(self.region_name)
+        self.host = urlparse(self.endpoint).netloc
+        self.max_connections = max_connections or config.ASYNC_MAX_CONNECTIONS
+        self.max_in_flight = max_in_flight or config.ASYNC_MAX_IN_FLIGHT
+        self.max_send_rate = None
+        self.sender = ThrottledSender(lambda: self.max_send_rate, rate_limiter=rate_limiter, lane=lane)
+        self.session = None
+        self.semaphore = None
+
+    async def open(self):
+        """
+        Creates the HTTP session and its connection pool.
+        """
+        if self.session:
+            return
+        if aiohttp is None:
+            raise EmailServiceError('AsyncAmazonSEService requires aiohttp, install django-dodo[async]')
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def close(self):
+        if not self.session:
+            return
+
+        await self.session.close()
+        self.session = None
+        self.semaphore = None
+
+    async def request(self, action, params):
+        """
+        Make a signed call to the SES API.
+
+        :return: the parsed XML response
+        """
+        params = dict(params, Action=action, Version=API_VERSION)
+        body = urlencode(sorted(params.items()))
+        headers = sign_request(self.id, self.key, self.region_name, self.host, body)
+        async with self.session.post(self.endpoint, data=body.encode('utf-8'), headers=headers) as response:
+            content = await response.text()
+
+        root = parse_response(content)
+        if response.status >= 400:
+            code = root.findtext('.//Code') or str(response.status)
+            raise EmailServiceError('{}: {}'.format(code, root.findtext('.//Message') or ''))
+        return root
+
+    async def get_send_quota(self):
+        root = await self.request('GetSendQuota', {})
+        result = root.find('.//GetSendQuotaResult')
+        return dict((child.tag, child.text) for child in result)
+
+    async def get_rate_limiter(self):
+        if self.sender.rate_limiter is None and self.max_send_rate is None:
+            try:
+                quota = await self.get_send_quota()
+            except Exception as e:
+                quota = e
+
+            def fetch():
+                if isinstance(quota, Exception):
+                    raise quota
+                return quota
+
+            # The quota is cached with the one of the sync senders
+            loop = asyncio.get_event_loop()
+            self.max_send_rate = await loop.run_in_executor(None, get_max_send_rate, fetch)
+        return self.sender.get_rate_limiter()
+
+    async def acquire(self):
+        rate_limiter = await self.get_rate_limiter()
+        loop = asyncio.get_event_loop()
+        while True:
+            # The shared bucket is in the Django cache, which blocks
+            acquired, wait = await loop.run_in_executor(None, rate_limiter.try_acquire)
+            if acquired:
+                return
+            await asyncio.sleep(wait)
+
+    async def send_message(self, message):
+        params = {
+            'Source': message.from_email,
+            'RawMessage.Data': base64.b64encode(get_raw_message(message)).decode('ascii'),
+        }
+        for index, destination in enumerate(message.recipients(), 1):
+            params['Destinations.member.{}'.format(index)] = destination
+
+        # The coroutine counterpart of ThrottledSender.send, which handles the
+        # errors and the adapted rate, shared through the cache, in the executor
+        loop = asyncio.get_event_loop()
+        async with self.semaphore:
+            for attempt in range(config.THROTTLE_RETRIES + 1):
+                if self.sender.quota_exceeded.is_set():
+                    return False
+                await self.acquire()
+                try:
+                    await self.request('SendRawEmail', params)
+                except Exception as e:
+                    wait = await loop.run_in_executor(None, self.sender.on_error, e, attempt)
+                    if wait is None:
+                        return False
+                    await asyncio.sleep(wait)
+                    continue
+
+                await loop.run_in_executor(None, self.sender.on_success)
+                return True
+        return False
+
+    async def send_messages(self, email_messages):
+        """
+        Sends all the messages concurrently, until the daily quota is
+        exceeded.
+
+        Returns True for each message sent, in input order.
+        """
+        await self.open()
+        self.sender.start()
+        return list(await asyncio.gather(*[self.send_message(message) for message in email_messages]))
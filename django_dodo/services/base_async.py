@@ -0,0 +1,81 @@
+"""
+The asyncio base class of the services. async def needs Python 3.5, so
+it is kept out of base.py and only imported by the asyncio services.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _is_loop_running():
+    if hasattr(asyncio, 'get_running_loop'):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    # Before Python 3.7
+    try:
+        return asyncio.get_event_loop().is_running()
+    except RuntimeError:
+        return False
+
+
+class AsyncEmailService(object):
+    """
+    Base asyncio service, the coroutine counterpart of EmailService.
+    Services subclass this one to keep many sends in flight from a
+    single thread.
+
+    In the base class all the coroutines throw a NotImplementedError
+    """
+
+    async def open(self):
+        """
+        If the service is not initialized this is where the
+        service initialization should be implemented
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        If the service is initialized this should close it
+        making it unavailable.
+        """
+        raise NotImplementedError
+
+    async def send_messages(self, messages):
+        """
+        Sends a list of EmailMessage (or EmailMultiAlternatives)
+        instances concurrently using the service API
+        """
+        raise NotImplementedError
+
+    async def _send_messages_once(self, messages):
+        await self.open()
+        try:
+            return await self.send_messages(messages)
+        finally:
+            await self.close()
+
+    def _run_send_messages(self, messages):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self._send_messages_once(messages))
+        finally:
+            loop.close()
+
+    def send_messages_sync(self, messages):
+        """
+        Synchronous adapter for code that is not running an event loop,
+        such as a Django email backend. Opens the service, sends the
+        messages and closes it again on a private event loop.
+
+        Called from a thread already running a loop, the private loop runs
+        on a thread of its own, as two loops cannot run in one thread.
+        """
+        if not _is_loop_running():
+            return self._run_send_messages(messages)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(self._run_send_messages, messages).result()
@@ -0,0 +1,337 @@
+"""
+A local stand-in for the Amazon SES query API, for integration and load
+tests without AWS. The same FakeSES can be used in process, through
+FakeSESConnection, or over loopback HTTP, through FakeSESServer:
+
+    fake = FakeSES(max_send_rate=14, max_24h=50000, latency=0.05, error_rate=0.01)
+    backend = SESBackend(connection_factory=fake.connect)
+
+    with FakeSESServer(fake) as server:
+        # DODO_SES_ENDPOINT = server.endpoint
+        ...
+
+It handles SendEmail, SendRawEmail, SendBulkTemplatedEmail, CreateTemplate,
+UpdateTemplate, GetSendQuota and GetSendStatistics, enforcing the send rate and the 24 hour
+quota with the same errors SES returns.
+"""
+from __future__ import division
+
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from xml.etree import ElementTree
+
+from boto.ses.connection import SESConnection
+from django.utils.six.moves import BaseHTTPServer, socketserver
+from django.utils.six.moves.urllib.parse import parse_qsl
+
+NAMESPACE = 'http://ses.amazonaws.com/doc/2010-12-01/'
+DAY_SECONDS = 24 * 60 * 60
+# SES reports the send statistics in 15 minute data points
+DATA_POINT_SECONDS = 15 * 60
+
+THROTTLED = (400, 'Throttling', 'Maximum sending rate exceeded.')
+QUOTA_EXCEEDED = (400, 'Throttling', 'Daily message quota exceeded.')
+SERVICE_UNAVAILABLE = (503, 'ServiceUnavailable', 'Service is unavailable. Please try again later.')
+
+
+class FakeSESError(Exception):
+
+    def __init__(self, status, code, message):
+        super(FakeSESError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class FakeSES(object):
+    """
+    The state of a fake SES account.
+
+    :param max_send_rate: the messages per second allowed before throttling
+    :param max_24h: the messages allowed in any 24 hours
+    :param latency: the seconds each call takes, plus up to `latency_jitter`
+    :param error_rate: the share of calls failing as unavailable
+    :param throttle_rate: the share of calls throttled whatever the rate
+    :param keep_messages: keep the sent messages in `messages`, turn it off
+        for long load tests
+    """
+
+    def __init__(self, max_send_rate=14, max_24h=50000, latency=0, latency_jitter=0, error_rate=0,
+                 throttle_rate=0, keep_messages=True, seed=None, clock=time.time, sleep=time.sleep):
+        self.max_send_rate = max_send_rate
+        self.max_24h = max_24h
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.keep_messages = keep_messages
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.messages = []
+            self.templates = {}
+            self.sent = deque()
+            self.calls = defaultdict(int)
+            self.data_points = defaultdict(lambda: defaultdict(int))
+
+    @property
+    def sent_24h(self):
+        with self.lock:
+            self._expire(self.clock())
+            return len(self.sent)
+
+    def _expire(self, now):
+        while self.sent and self.sent[0] <= now - DAY_SECONDS:
+            self.sent.popleft()
+
+    def _count(self, key, now, count=1):
+        self.data_points[int(now // DATA_POINT_SECONDS) * DATA_POINT_SECONDS][key] += count
+
+    def _acquire(self, count):
+        """
+        Check the rate and the quota for `count` messages and record them.
+        """
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+            if self.throttle_rate and self.random.random() < self.throttle_rate:
+                raise FakeSESError(*THROTTLED)
+            if len(self.sent) + count > self.max_24h:
+                self._count('Rejects', now, count)
+                raise FakeSESError(*QUOTA_EXCEEDED)
+            in_last_second = 0
+            for sent in reversed(self.sent):
+                if sent <= now - 1:
+                    break
+                in_last_second += 1
+            if in_last_second + count > self.max_send_rate:
+                raise FakeSESError(*THROTTLED)
+            if self.error_rate and self.random.random() < self.error_rate:
+                raise FakeSESError(*SERVICE_UNAVAILABLE)
+
+            self.sent.extend([now] * count)
+            self._count('DeliveryAttempts', now, count)
+
+    def _record(self, action, params):
+        if self.keep_messages:
+            with self.lock:
+                self.messages.append(dict(params, Action=action))
+
+    def _wait(self):
+        delay = self.latency
+        if self.latency_jitter:
+            delay += self.random.uniform(0, self.latency_jitter)
+        if delay:
+            self.sleep(delay)
+
+    def handle(self, params):
+        """
+        Handle one query API call.
+
+        :param params: the form parameters of the call
+        :return: a tuple of the HTTP status and the XML body
+        """
+        action = params.get('Action')
+        self._wait()
+        with self.lock:
+            self.calls[action] += 1
+
+        handler = getattr(self, 'handle_{}'.format(action), None)
+        if handler is None:
+            return self.error_response(400, 'InvalidAction', 'Unknown action {}'.format(action))
+
+        try:
+            result = handler(params)
+        except FakeSESError as e:
+            return self.error_response(e.status, e.code, e.message)
+
+        root = ElementTree.Element('{}Response'.format(action), xmlns=NAMESPACE)
+        result_node = ElementTree.SubElement(root, '{}Result'.format(action))
+        self.build(result_node, result)
+        metadata = ElementTree.SubElement(root, 'ResponseMetadata')
+        ElementTree.SubElement(metadata, 'RequestId').text = str(uuid.uuid4())
+        return 200, ElementTree.tostring(root).decode('utf-8')
+
+    def build(self, node, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                self.build(ElementTree.SubElement(node, key), child)
+        elif isinstance(value, list):
+            for child in value:
+                self.build(ElementTree.SubElement(node, 'member'), child)
+        else:
+            node.text = str(value)
+
+    def error_response(self, status, code, message):
+        root = ElementTree.Element('ErrorResponse', xmlns=NAMESPACE)
+        error = ElementTree.SubElement(root, 'Error')
+        ElementTree.SubElement(error, 'Type').text = 'Sender' if status < 500 else 'Receiver'
+        ElementTree.SubElement(error, 'Code').text = code
+        ElementTree.SubElement(error, 'Message').text = message
+        ElementTree.SubElement(root, 'RequestId').text = str(uuid.uuid4())
+        return status, ElementTree.tostring(root).decode('utf-8')
+
+    def handle_SendEmail(self, params):
+        self._acquire(1)
+        self._record('SendEmail', params)
+        return {'MessageId': str(uuid.uuid4())}
+
+    def handle_SendRawEmail(self, params):
+        self._acquire(1)
+        self._record('SendRawEmail', params)
+        return {'MessageId': str(uuid.uuid4())}
+
+    def handle_CreateTemplate(self, params):
+        name = params['Template.TemplateName']
+        with self.lock:
+            if name in self.templates:
+                raise FakeSESError(400, 'AlreadyExists', 'Template {} already exists.'.format(name))
+            self.templates[name] = params
+        return {}
+
+    def handle_UpdateTemplate(self, params):
+        name = params['Template.TemplateName']
+        with self.lock:
+            if name not in self.templates:
+                raise FakeSESError(400, 'TemplateDoesNotExist', 'Template {} does not exist.'.format(name))
+            self.templates[name] = params
+        return {}
+
+    def handle_SendBulkTemplatedEmail(self, params):
+        name = params.get('Template')
+        if name not in self.templates:
+            raise FakeSESError(400, 'TemplateDoesNotExist', 'Template {} does not exist.'.format(name))
+
+        count = len([key for key in params if key.endswith('.ReplacementTemplateData')])
+        self._acquire(count)
+        self._record('SendBulkTemplatedEmail', params)
+        return {'Status': [{'Status': 'Success', 'MessageId': str(uuid.uuid4())} for _ in range(count)]}
+
+    def handle_GetSendQuota(self, params):
+        return {'Max24HourSend': float(self.max_24h),
+                'MaxSendRate': float(self.max_send_rate),
+                'SentLast24Hours': float(self.sent_24h)}
+
+    def handle_GetSendStatistics(self, params):
+        with self.lock:
+            data_points = [dict(counts, Timestamp=start) for start, counts in sorted(self.data_points.items())]
+
+        return {'SendDataPoints': [
+            {'Timestamp': datetime.utcfromtimestamp(data_point['Timestamp']).strftime('%Y-%m-%dT%H:%M:%SZ'),
+             'DeliveryAttempts': data_point.get('DeliveryAttempts', 0),
+             'Bounces': data_point.get('Bounces', 0),
+             'Complaints': data_point.get('Complaints', 0),
+             'Rejects': data_point.get('Rejects', 0)}
+            for data_point in data_points]}
+
+    def connect(self):
+        """
+        A boto SES connection answered in process by this fake.
+        """
+        return FakeSESConnection(self)
+
+
+class FakeResponse(object):
+    """
+    The parts of an httplib response boto reads.
+    """
+
+    def __init__(self, status, body):
+        self.status = status
+        self.reason = 'OK' if status == 200 else 'Error'
+        self.body = body.encode('utf-8')
+
+    def read(self):
+        return self.body
+
+    def getheader(self, name, default=None):
+        return default
+
+
+class FakeSESConnection(SESConnection):
+    """
+    A boto SESConnection whose requests never leave the process. Only the
+    transport is replaced, so boto's own request building, response parsing
+    and error mapping all run.
+    """
+
+    def __init__(self, fake, **kwargs):
+        kwargs.setdefault('aws_access_key_id', 'fake')
+        kwargs.setdefault('aws_secret_access_key', 'fake')
+        super(FakeSESConnection, self).__init__(**kwargs)
+        self.fake = fake
+
+    def _mexe(self, request, *args, **kwargs):
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        return FakeResponse(*self.fake.handle(dict(parse_qsl(body))))
+
+    def close(self):
+        pass
+
+
+class FakeSESRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+        status, body = self.server.fake.handle(params)
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FakeSESServer(object):
+    """
+    Serves a FakeSES on a loopback port, in a background thread. Point
+    DODO_SES_ENDPOINT at `endpoint` to send through it.
+    """
+
+    def __init__(self, fake=None, host='127.0.0.1', port=0):
+        self.fake = fake or FakeSES()
+        self.httpd = ThreadingHTTPServer((host, port), FakeSESRequestHandler)
+        self.httpd.fake = self.fake
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}/'.format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
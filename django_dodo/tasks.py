@@ -1,48 +1,137 @@
 from __future__ import unicode_literals
 
-from celery import shared_task
+import logging
+import os
+import socket
 
+from celery import group, shared_task
+from celery.signals import worker_process_shutdown, worker_shutdown
 
-@shared_task
+from django_dodo import config
+from django_dodo.email import close_worker_connections
+from django_dodo.utils import metrics
+
+LOG = logging.getLogger(__name__)
+
+# Each worker process keeps its email connection open between tasks
+worker_process_shutdown.connect(close_worker_connections)
+worker_shutdown.connect(close_worker_connections)
+
+
+@shared_task(queue=config.TRANSACTIONAL_QUEUE)
 def send_user_email(email_id):
     from django_dodo.models import UserEmail
-    from django_dodo.email import send_mail
+    from django_dodo.email import build_mail, send_messages
 
     email = UserEmail.get_email(email_id)
     if email is None:
         return
 
-    email_data = email.email_template.render()
-    send_mail(email_data['subject'], email_data['text_body'], email.to_recipient, html_body=email_data['html_body'])
+    with metrics.email_type(email.email_template.email_type), metrics.timer('task'):
+        email_data = email.render_email()
+        with metrics.timer('build_message'):
+            email_message = build_mail(email_data['subject'], email_data['text_body'], email.to_recipient,
+                                       html_body=email_data['html_body'])
+        send_messages([email_message], lane=email.email_template.lane)
 
 
-@shared_task
+@shared_task(queue=config.MARKETING_QUEUE)
 def send_market_email(email_sent_id):
-    from django_dodo.models import MarketEmail
-    from django_dodo.email import send_mail
+    """
+    Split the campaign into recipient chunks and send the unfinished ones
+    as a group of subtasks, or release them over time as the quota allows
+    when campaigns are scheduled. Running it again after a crash only sends
+    the chunks that were not sent yet.
+    """
+    from django_dodo.models import MarketEmail, MarketEmailChunk
 
     email = MarketEmail.get_email(email_sent_id)
     if email is None:
         return
 
-    email_data = email.email_template.render()
-    for recipient in email.to_recipients():
-        send_mail(email_data['subject'], email_data['text_body'], recipient, html_body=email_data['html_body'])
+    email.create_chunks()
+    MarketEmailChunk.release_stale()
+    if config.SCHEDULE_CAMPAIGNS:
+        try:
+            email.schedule_chunks()
+        except ValueError as e:
+            LOG.error('Cannot plan market email %s, trying again in %ss: %s',
+                      email_sent_id, config.CAMPAIGN_RETRY_DELAY, e)
+            send_market_email.apply_async((email_sent_id,), countdown=config.CAMPAIGN_RETRY_DELAY)
+            return
+        for chunk in email.get_pending_chunks():
+            send_market_email_chunk.apply_async((chunk.pk,), eta=chunk.scheduled_at)
+        return
 
+    chunk_ids = list(email.get_pending_chunks().values_list('pk', flat=True))
+    if chunk_ids:
+        group(send_market_email_chunk.s(chunk_id) for chunk_id in chunk_ids).apply_async()
 
-@shared_task
+
+@shared_task(queue=config.MARKETING_QUEUE)
+def send_market_email_chunk(chunk_id):
+    from django_dodo.models import MarketEmailChunk
+    from django_dodo.email import build_mass_mail, send_messages
+
+    chunk = MarketEmailChunk.get_pending(chunk_id)
+    if chunk is None:
+        return
+
+    chunk.mark_attempt()
+    email_template = chunk.market_email.email_template
+    with metrics.email_type(email_template.email_type), metrics.timer('task'):
+        try:
+            if config.BULK_TEMPLATED_SEND:
+                with metrics.timer('backend_call'):
+                    num_sent = chunk.send_bulk()
+                metrics.increment('sent', num_sent)
+            else:
+                email_data = chunk.market_email.render_email()
+                with metrics.timer('build_message'):
+                    email_messages = build_mass_mail(email_data['subject'], email_data['text_body'],
+                                                     chunk.recipients(), html_body=email_data['html_body'])
+                num_sent = send_messages(email_messages, lane=email_template.lane)
+        except Exception as e:
+            LOG.error('Cannot send market email chunk %s: %s', chunk_id, e)
+            num_sent = 0
+
+        with metrics.timer('save'):
+            chunk.mark_sent(num_sent)
+
+    if chunk.status == MarketEmailChunk.PENDING:
+        send_market_email_chunk.apply_async((chunk_id,), countdown=chunk.get_retry_delay())
+
+
+@shared_task(queue=config.MARKETING_QUEUE)
 def send_network_email(email_sent_id):
     from django_dodo.models import NetworkEmail
-    from django_dodo.email import send_mail
+    from django_dodo.email import build_mail, send_messages
 
     email = NetworkEmail.get_email(email_sent_id)
     if email is None:
         return
 
-    email_data = email.email_template.render()
-    send_mail(email_data['subject'],
-              email_data['text_body'],
-              email.to_recipients(),
-              html_body=email_data['html_body'],
-              cc=email.cc_recipients(),
-              bcc=email.bcc_recipients())
+    with metrics.email_type(email.email_template.email_type), metrics.timer('task'):
+        email_data = email.render_email()
+        with metrics.timer('build_message'):
+            email_message = build_mail(email_data['subject'],
+                                       email_data['text_body'],
+                                       email.to_recipients(),
+                                       html_body=email_data['html_body'],
+                                       cc=list(email.cc_recipients()),
+                                       bcc=list(email.bcc_recipients()))
+        send_messages([email_message], lane=email.email_template.lane)
+
+
+@shared_task
+def dispatch_outbox(batch_size=None, lane=None):
+    """
+    Claim a batch of due outbox messages, of a single lane if given, and
+    send them.
+
+    :return: the number of messages sent
+    """
+    from django_dodo.models import OutboxMessage
+
+    worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+    return sum(1 for message in OutboxMessage.claim(batch_size, worker=worker, lane=lane) if message.send())
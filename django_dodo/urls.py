@@ -1,9 +1,10 @@
 from django.conf.urls import url
 
-from .views import EmailLinkRedirectView
+from .views import EmailLinkRedirectView, MetricsView
 
 
 urlpatterns = [
     # url(r'^$', ContactMessageFormView.as_view(), name='contact'),
     url(r'^lnk/(?P<slug>[\w-]+)/$', EmailLinkRedirectView.as_view(), name='email-redirect'),
+    url(r'^metrics/$', MetricsView.as_view(), name='dodo-metrics'),
 ]
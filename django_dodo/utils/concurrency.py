@@ -0,0 +1,42 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+LOG = logging.getLogger(__name__)
+
+
+def map_with_connections(func, items, concurrency, connect):
+    """
+    Call `func(connection, item)` for every item on a bounded pool of
+    threads. Each thread opens its own connection with `connect()` the
+    first time it needs one, connections are never shared between threads
+    and are closed once every item is done.
+
+    :param concurrency: the number of threads
+    :return: the results, in the order of `items`
+    """
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def call(item):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = connect()
+            with lock:
+                connections.append(connection)
+        return func(connection, item)
+
+    pool = ThreadPool(max(1, min(concurrency, len(items))))
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                LOG.warning('Cannot close a sender connection: %s', e)
@@ -0,0 +1,91 @@
+"""
+Post-render optimizations for the HTML of an email. These run once per
+template version, see `EmailTemplate.render_html`.
+"""
+from __future__ import unicode_literals
+
+import re
+
+# Outlook conditional comments must be kept: <!--[if mso]>, <!-->, <!--<![endif]-->
+COMMENT_RE = re.compile(r'<!--(?!\[if|<!\[endif|>)(.*?)-->', re.S)
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+STYLE_ATTR_RE = re.compile(r'(?<![\w-])style\s*=\s*(["\'])(.*?)\1', re.I | re.S)
+# A declaration, with the semicolons of quoted strings and url(...) kept in it
+DECLARATION_RE = re.compile(r'(?:[^;\'"(]|\'[^\']*\'|"[^"]*"|\([^)]*\))+')
+IMPORTANT_RE = re.compile(r'!\s*important$', re.I)
+STYLE_BLOCK_RE = re.compile(r'(<style[^>]*>)(.*?)(</style>)', re.I | re.S)
+PRESERVE_RE = re.compile(r'(<(pre|textarea)\b.*?</\2>)', re.I | re.S)
+LINE_BREAK_RE = re.compile(r'[ \t\r\f\v]*\n\s*')
+SPACES_RE = re.compile(r'[ \t\r\f\v]+')
+CSS_SPACES_RE = re.compile(r'\s*([{};:,])\s*')
+
+
+def dedupe_style(style):
+    """
+    Normalize the declarations of a style attribute, dropping empty and
+    invalid declarations and keeping only the value of a property that
+    applies: the last one, unless an earlier one is `!important`.
+    """
+    declarations = []
+    seen = {}
+    for declaration in DECLARATION_RE.findall(style):
+        prop, colon, value = declaration.partition(':')
+        prop = prop.strip().lower()
+        value = ' '.join(value.split())
+        if not (colon and prop and value):
+            continue
+        important = bool(IMPORTANT_RE.search(value))
+        if prop in seen:
+            index, seen_important = seen[prop]
+            if seen_important and not important:
+                continue
+            declarations[index] = None
+        seen[prop] = (len(declarations), important)
+        declarations.append('{}:{}'.format(prop, value))
+
+    return ';'.join(declaration for declaration in declarations if declaration)
+
+
+def minify_css(css):
+    css = CSS_COMMENT_RE.sub('', css)
+    css = CSS_SPACES_RE.sub(r'\1', css)
+    # One rule per line keeps the lines short
+    return css.replace(';}', '}').replace('}', '}\n').strip()
+
+
+def collapse_whitespace(html):
+    """
+    Collapse runs of whitespace, keeping line breaks so the lines stay
+    well below the SMTP line length limit.
+    """
+    html = LINE_BREAK_RE.sub('\n', html)
+    return SPACES_RE.sub(' ', html)
+
+
+def optimize_html(html):
+    """
+    Strip the comments, minify the style blocks, dedupe the inline styles
+    and collapse the whitespace. The contents of <pre> and <textarea> are
+    left untouched.
+    """
+    parts = PRESERVE_RE.split(html)
+    optimized = []
+    # The split leaves the preserved elements at every third index, each followed by its tag name
+    for index in range(0, len(parts), 3):
+        part = COMMENT_RE.sub('', parts[index])
+        part = STYLE_BLOCK_RE.sub(lambda match: match.group(1) + minify_css(match.group(2)) + match.group(3), part)
+        part = STYLE_ATTR_RE.sub(lambda match: 'style={0}{1}{0}'.format(match.group(1), dedupe_style(match.group(2))),
+                                 part)
+        optimized.append(collapse_whitespace(part))
+        if index + 1 < len(parts):
+            optimized.append(parts[index + 1])
+
+    return ''.join(optimized).strip()
+
+
+def get_byte_savings(html, optimized_html):
+    """
+    :return: a tuple of the bytes saved and the original size in bytes
+    """
+    size = len(html.encode('utf-8'))
+    return size - len(optimized_html.encode('utf-8')), size
@@ -0,0 +1,165 @@
+"""
+Lightweight timing of each stage of sending an email. Stage timings are
+aggregated in process into histograms per stage and email type, and can be
+exported in the Prometheus text format or pushed to hooks:
+
+    with metrics.email_type(email_template.email_type):
+        with metrics.timer('render'):
+            ...
+
+Each process keeps its own metrics. Processes that do not serve HTTP, like
+Celery workers, can ship them with a hook, see DODO_METRICS_HOOKS.
+"""
+from __future__ import unicode_literals
+
+import bisect
+import threading
+from collections import defaultdict
+from timeit import default_timer
+
+from django.utils.module_loading import import_string
+
+from django_dodo import config
+
+# Seconds, from a token replacement to a slow provider call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram(object):
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    """
+    The histograms of the stage timings and the counters, keyed on the
+    stage or counter name and the email type.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.hooks = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = defaultdict(Histogram)
+            self.counters = defaultdict(int)
+
+    def get_email_type(self):
+        return getattr(self.local, 'email_type', '')
+
+    def get_hooks(self):
+        if self.hooks is None:
+            self.hooks = [import_string(path) for path in config.METRICS_HOOKS]
+        return self.hooks
+
+    def add_hook(self, hook):
+        """
+        Call `hook(kind, name, email_type, value)` for every observation,
+        `kind` being 'timer' or 'counter'.
+        """
+        self.get_hooks().append(hook)
+
+    def observe(self, stage, seconds, email_type=None):
+        if email_type is None:
+            email_type = self.get_email_type()
+        with self.lock:
+            self.histograms[(stage, email_type)].observe(seconds)
+        for hook in self.get_hooks():
+            hook('timer', stage, email_type, seconds)
+
+    def increment(self, name, value=1, email_type=None):
+        if not config.METRICS:
+            return
+        if email_type is None:
+            email_type = self.get_email_type()
+        with self.lock:
+            self.counters[(name, email_type)] += value
+        for hook in self.get_hooks():
+            hook('counter', name, email_type, value)
+
+    def render_prometheus(self):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        with self.lock:
+            histograms = sorted((key, list(h.counts), h.sum, h.count) for key, h in self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = ['# HELP dodo_stage_seconds Time spent in each stage of sending an email.',
+                 '# TYPE dodo_stage_seconds histogram']
+        for (stage, email_type), counts, total, count in histograms:
+            labels = 'stage="{}",email_type="{}"'.format(stage, email_type)
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append('dodo_stage_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, cumulative))
+            lines.append('dodo_stage_seconds_sum{{{}}} {!r}'.format(labels, total))
+            lines.append('dodo_stage_seconds_count{{{}}} {}'.format(labels, count))
+
+        lines.extend(['# HELP dodo_events_total Emails sent, failed, throttled and retried.',
+                      '# TYPE dodo_events_total counter'])
+        for (name, email_type), value in counters:
+            lines.append('dodo_events_total{{event="{}",email_type="{}"}} {}'.format(name, email_type, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class timer(object):
+    """
+    Time the block as `stage`, for the current email type unless one is
+    given. Does nothing when DODO_METRICS is off.
+    """
+    __slots__ = ('stage', 'email_type', 'start')
+
+    def __init__(self, stage, email_type=None):
+        self.stage = stage
+        self.email_type = email_type
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        if config.METRICS:
+            registry.observe(self.stage, default_timer() - self.start, email_type=self.email_type)
+
+
+class email_type(object):
+    """
+    Set the email type of the timers and counters of the block.
+    """
+    __slots__ = ('email_type', 'previous')
+
+    def __init__(self, email_type):
+        self.email_type = email_type
+
+    def __enter__(self):
+        self.previous = registry.get_email_type()
+        registry.local.email_type = self.email_type
+        return self
+
+    def __exit__(self, *exc_info):
+        registry.local.email_type = self.previous
+
+
+def increment(name, value=1, email_type=None):
+    registry.increment(name, value=value, email_type=email_type)
+
+
+def render_prometheus():
+    return registry.render_prometheus()
@@ -0,0 +1,72 @@
+"""
+MIME building for messages that only differ in their recipient.
+"""
+from __future__ import unicode_literals
+
+from email.utils import make_msgid
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import DNS_NAME, sanitize_address
+
+from django_dodo.utils import metrics
+
+# The headers set for each recipient, everything else is shared
+RECIPIENT_HEADERS = ('To', 'Message-ID', 'List-Unsubscribe')
+
+
+class MessageSkeleton(object):
+    """
+    The encoded MIME of an email, without its recipient headers. The body,
+    HTML and attachments are encoded once, each recipient's message is the
+    shared bytes with its own To, Message-ID and List-Unsubscribe headers.
+    """
+
+    def __init__(self, email_message):
+        message = email_message.message()
+        for header in RECIPIENT_HEADERS:
+            del message[header]
+
+        self.encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        self.headers, self.body = message.as_bytes().split(b'\n\n', 1)
+
+    def _header(self, name, value):
+        return '{}: {}'.format(name, value).encode('ascii')
+
+    def render(self, to, unsubscribe_url=None):
+        """
+        :return: the raw message for `to`, as bytes
+        """
+        headers = [self._header('To', sanitize_address(to, self.encoding)),
+                   self._header('Message-ID', make_msgid(domain=DNS_NAME))]
+        if unsubscribe_url:
+            headers.append(self._header('List-Unsubscribe', '<{}>'.format(unsubscribe_url)))
+        headers.append(self.headers)
+        return b'\n'.join(headers) + b'\n\n' + self.body
+
+
+class RecipientEmailMessage(EmailMultiAlternatives):
+    """
+    One recipient's copy of a shared message. Backends that send raw MIME
+    take its bytes from the skeleton, others fall back to `message()`.
+    """
+
+    def __init__(self, skeleton, unsubscribe_url=None, *args, **kwargs):
+        super(RecipientEmailMessage, self).__init__(*args, **kwargs)
+        self.skeleton = skeleton
+        self.unsubscribe_url = unsubscribe_url
+        if unsubscribe_url:
+            self.extra_headers['List-Unsubscribe'] = '<{}>'.format(unsubscribe_url)
+
+    def raw_message(self):
+        return self.skeleton.render(self.to[0], unsubscribe_url=self.unsubscribe_url)
+
+
+def get_raw_message(email_message):
+    """
+    The MIME of `email_message` as bytes, from its skeleton when it has one.
+    """
+    with metrics.timer('mime'):
+        if isinstance(email_message, RecipientEmailMessage):
+            return email_message.raw_message()
+        return email_message.message().as_bytes()
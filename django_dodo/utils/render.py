@@ -0,0 +1,225 @@
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+from time import time
+
+from django.core.cache import cache
+
+from django_dodo import config
+from django_dodo.utils import metrics
+from django_dodo.utils.html import get_byte_savings, optimize_html
+from django_dodo.utils.text import html_to_text
+from django_dodo.utils.tokens import TOKEN_KEYS, USER_REPLACER, Tokens
+
+LOG = logging.getLogger(__name__)
+
+RENDER_GENERATION_KEY = 'django_dodo:render_generation'
+COMPILED_TEMPLATE_KEY = 'django_dodo:compiled_template:{pk}:{version}'
+DERIVED_KEY = 'django_dodo:{name}:{pk}:{version}:{digest}'
+CONTEXT_READS_KEY = 'django_dodo:context_reads:{pk}:{version}:{digest}'
+
+
+def _new_generation():
+    return int(time() * 1000)
+
+
+def get_render_generation():
+    """
+    The current render generation. Any change to a template, widget, theme
+    or button moves to a new generation, which invalidates every compiled
+    template at once.
+    """
+    return cache.get_or_set(RENDER_GENERATION_KEY, _new_generation, None)
+
+
+def bump_render_generation():
+    try:
+        return cache.incr(RENDER_GENERATION_KEY)
+    except ValueError:
+        # The key was evicted, start from a value no earlier generation used
+        generation = _new_generation()
+        cache.set(RENDER_GENERATION_KEY, generation, None)
+        return generation
+
+
+class CompiledTemplate(object):
+    """
+    The recipient independent output of an EmailTemplate. The subject, HTML
+    and text have been rendered by Django, only the tokens are left to be
+    replaced for each recipient.
+
+    A released template also keeps the `snapshot` of the data it was
+    rendered from, to render it in full without queries, see EmailRenderBundle.
+    """
+
+    def __init__(self, subject, html, text, version=None, html_bytes_saved=0, snapshot=None):
+        self.subject = subject
+        self.html = html
+        self.text = text
+        self.version = version
+        self.html_bytes_saved = html_bytes_saved
+        self.snapshot = snapshot
+
+    def to_dict(self):
+        return {'subject': self.subject,
+                'html': self.html,
+                'text': self.text,
+                'version': self.version,
+                'html_bytes_saved': self.html_bytes_saved,
+                'snapshot': self.snapshot}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['subject'], data['html'], data['text'],
+                   version=data.get('version'),
+                   html_bytes_saved=data.get('html_bytes_saved', 0),
+                   snapshot=data.get('snapshot'))
+
+    def render(self, context):
+        with metrics.timer('replace_tokens'):
+            html_body = Tokens.replace_tokens(context, self.html)
+            subject = Tokens.replace_tokens(context, self.subject)
+            text_body = Tokens.replace_tokens(context, self.text)
+        return {'subject': subject,
+                'body': html_body,
+                'html_body': html_body,
+                'text_body': text_body}
+
+    def to_provider_template(self, replacer=USER_REPLACER):
+        """
+        The subject, HTML and text with each token turned into a `{{key}}`
+        placeholder, for a template stored by the email provider.
+
+        :return: a (subject, html, text) tuple
+        """
+        placeholders = dict((key, '{{%s}}' % key) for key in replacer.token_dict)
+        return tuple(replacer.replace(placeholders, part) for part in (self.subject, self.html, self.text))
+
+
+def get_compiled_template(email_template):
+    """
+    Get the compiled template for the current version of `email_template`,
+    compiling and caching it if needed.
+
+    :param email_template: the EmailTemplate to compile
+    :return: a CompiledTemplate
+    """
+    version = get_render_generation()
+    cache_key = COMPILED_TEMPLATE_KEY.format(pk=email_template.pk, version=version)
+    compiled = cache.get(cache_key)
+    if compiled is None:
+        compiled = email_template.compile()
+        compiled.version = version
+        cache.set(cache_key, compiled, config.RENDER_CACHE_TIMEOUT)
+
+    return compiled
+
+
+def get_derived(email_template, name, source, build):
+    """
+    Get `build(source)` for the rendered `source` of `email_template`. The
+    result is cached for the template version, so each distinct render is
+    only processed once.
+    """
+    digest = hashlib.md5(source.encode('utf-8')).hexdigest()
+    cache_key = DERIVED_KEY.format(name=name, pk=email_template.pk, version=get_render_generation(), digest=digest)
+    value = cache.get(cache_key)
+    if value is None:
+        value = build(source)
+        cache.set(cache_key, value, config.RENDER_CACHE_TIMEOUT)
+
+    return value
+
+
+class ContextProbe(object):
+    """
+    Stands in for the value of a context variable. Any attribute, item or
+    iteration of it gives the probe again, so a template reading the
+    variable renders differently than without it.
+    """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self
+
+    def __getitem__(self, key):
+        return self
+
+    def __iter__(self):
+        return iter((self,))
+
+    def __len__(self):
+        return 1
+
+    def __str__(self):
+        return 'django-dodo-context-probe'
+
+    __unicode__ = __str__
+
+
+def get_context_keys(extra_context):
+    """
+    :return: the sorted variables of `extra_context` that are not tokens
+    """
+    return sorted(key for key in extra_context or () if key not in TOKEN_KEYS)
+
+
+def reads_context(email_template, version, extra_context, context=None):
+    """
+    Whether the HTML or text of `email_template` reads a variable of
+    `extra_context` other than the tokens. A compiled template only varies
+    the tokens per recipient, so such a template must be rendered in full.
+
+    Checked once per template version and set of variables, by rendering
+    with and without a ContextProbe for each of them.
+
+    :param context: the context the template renders with, by default
+        its `get_context_data()`
+    """
+    keys = get_context_keys(extra_context)
+    if not keys:
+        return False
+
+    digest = hashlib.md5(','.join(keys).encode('utf-8')).hexdigest()
+    cache_key = CONTEXT_READS_KEY.format(pk=email_template.pk, version=version, digest=digest)
+    reads = cache.get(cache_key)
+    if reads is None:
+        if context is None:
+            context = email_template.get_context_data()
+        probed_context = dict(context)
+        probed_context.update(dict.fromkeys(keys, ContextProbe()))
+        try:
+            reads = _render_shells(email_template, context) != _render_shells(email_template, probed_context)
+        except Exception as e:
+            LOG.warning('Cannot check the context of email template %s, rendering it in full: %s',
+                        email_template.pk, e)
+            reads = True
+        cache.set(cache_key, reads, config.RENDER_CACHE_TIMEOUT)
+
+    return reads
+
+
+def _render_shells(email_template, context):
+    html, saved = email_template.render_html_shell(context, optimize=False)
+    if config.TEXT_FROM_HTML:
+        return html
+    return html, email_template.render_text_shell(context)
+
+
+def get_optimized_html(email_template, html):
+    """
+    :return: a tuple of the optimized HTML and the bytes saved
+    """
+    def build(source):
+        optimized_html = optimize_html(source)
+        saved, size = get_byte_savings(source, optimized_html)
+        LOG.info('Optimized the HTML of email template %s: saved %s of %s bytes', email_template.pk, saved, size)
+        return optimized_html, saved
+
+    return get_derived(email_template, 'optimized_html', html, build)
+
+
+def get_text_from_html(email_template, html):
+    return get_derived(email_template, 'html_text', html, html_to_text)
@@ -0,0 +1,55 @@
+"""
+Planning a campaign against the provider's 24 hour sending quota.
+"""
+from __future__ import division
+
+from datetime import timedelta
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class CampaignPlan(object):
+    """
+    When each chunk of a campaign is released, and when the last one is
+    expected to be sent.
+    """
+
+    def __init__(self, etas, completion):
+        self.etas = etas
+        self.completion = completion
+
+    def __repr__(self):
+        return '<CampaignPlan {} chunks, done at {}>'.format(len(self.etas), self.completion)
+
+
+def plan_campaign(chunk_sizes, max_24h, sent_24h, send_rate, now, reserve=0):
+    """
+    Spread the chunks over the quota. Chunks are released back to back at
+    `send_rate` while the remaining quota lasts, then as fast as the rolling
+    24 hour window frees quota up, `(max_24h - reserve) / 24h`.
+
+    :param chunk_sizes: the number of recipients of each chunk, in send order
+    :param reserve: the part of `max_24h` kept for transactional emails
+    :return: a CampaignPlan
+    :raises ValueError: if there is no send rate, or no quota left for campaigns
+    """
+    if send_rate <= 0:
+        raise ValueError('There is no send rate for campaigns')
+
+    budget = max(0, max_24h - reserve - sent_24h)
+    refill_rate = max(0, max_24h - reserve) / DAY_SECONDS
+    elapsed = 0
+    etas = []
+
+    for size in chunk_sizes:
+        if size > budget:
+            if not refill_rate:
+                raise ValueError('The quota leaves nothing for campaigns')
+            elapsed += (size - budget) / refill_rate
+            budget = size
+
+        etas.append(now + timedelta(seconds=elapsed))
+        budget -= size
+        elapsed += size / send_rate
+
+    return CampaignPlan(etas, now + timedelta(seconds=elapsed))
@@ -0,0 +1,127 @@
+"""
+Plain text alternative of a rendered HTML email.
+"""
+from __future__ import unicode_literals
+
+import re
+
+from django.utils.six import unichr
+from django.utils.six.moves.html_entities import name2codepoint
+from django.utils.six.moves.html_parser import HTMLParser
+
+SKIP_TAGS = ('head', 'title', 'style', 'script')
+BLOCK_TAGS = ('address', 'blockquote', 'div', 'li', 'ol', 'table', 'tr', 'ul')
+PARAGRAPH_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p')
+CELL_TAGS = ('td', 'th')
+# Elements without an end tag, so hiding one never hides what follows it
+VOID_TAGS = ('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+             'track', 'wbr')
+HIDDEN_RE = re.compile(r'display\s*:\s*none', re.I)
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
+class HtmlToText(HTMLParser):
+    """
+    Converts HTML into readable plain text. Block elements start new lines,
+    links are kept as `text (url)` and images are replaced with their alt
+    text. The head, scripts, styles and hidden elements are dropped.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.lines = []
+        self.words = []
+        self.skip_tag = None
+        self.skip_depth = 0
+        self.link = None
+
+    def newline(self, blank=False):
+        self.lines.append(' '.join(self.words))
+        self.words = []
+        if blank:
+            self.lines.append('')
+
+    def add_text(self, text):
+        if self.skip_depth:
+            return
+        if self.link is not None:
+            self.link['words'].extend(text.split())
+        else:
+            self.words.extend(text.split())
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_depth:
+            if tag == self.skip_tag:
+                self.skip_depth += 1
+            return
+
+        attrs = dict(attrs)
+        hidden = 'hidden' in attrs or HIDDEN_RE.search(attrs.get('style') or '')
+        if hidden and tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS or hidden:
+            self.skip_tag = tag
+            self.skip_depth = 1
+        elif tag == 'br':
+            self.newline()
+        elif tag in BLOCK_TAGS:
+            self.newline()
+        elif tag in PARAGRAPH_TAGS:
+            self.newline(blank=True)
+        elif tag == 'a':
+            self.link = {'href': (attrs.get('href') or '').strip(), 'words': []}
+        elif tag == 'img' and attrs.get('alt'):
+            self.add_text(attrs['alt'])
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ('br', 'img'):
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            if tag == self.skip_tag:
+                self.skip_depth -= 1
+            return
+
+        if tag == 'a' and self.link is not None:
+            link, self.link = self.link, None
+            text = ' '.join(link['words'])
+            href = link['href']
+            if href.startswith('mailto:') and href[len('mailto:'):] == text:
+                href = ''
+            if text and href and href != text:
+                self.words.append('{} ({})'.format(text, href))
+            elif text or href:
+                self.words.append(text or href)
+        elif tag in BLOCK_TAGS:
+            self.newline()
+        elif tag in PARAGRAPH_TAGS:
+            self.newline(blank=True)
+        elif tag in CELL_TAGS:
+            self.words.append('')
+
+    def handle_data(self, data):
+        self.add_text(data)
+
+    def handle_entityref(self, name):
+        if name in name2codepoint:
+            self.add_text(unichr(name2codepoint[name]))
+
+    def handle_charref(self, name):
+        try:
+            codepoint = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+        except ValueError:
+            return
+        self.add_text(unichr(codepoint))
+
+    def get_text(self):
+        self.newline()
+        lines = [' '.join(line.split()) for line in self.lines]
+        return BLANK_LINES_RE.sub('\n\n', '\n'.join(lines)).strip() + '\n'
+
+
+def html_to_text(html):
+    parser = HtmlToText()
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
@@ -1,6 +1,9 @@
+import re
+
 from django.apps import apps as django_apps
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.utils.encoding import force_text
 
 
 REGISTRATION_TOKENS = {
@@ -22,9 +25,69 @@ USER_TOKENS = {
     'email_management_url': '{ EMAIL_MANAGEMENT_URL }'
 }
 
+# The context keys replaced as tokens, everything else is rendered by Django
+TOKEN_KEYS = frozenset(REGISTRATION_TOKENS) | frozenset(INVITATION_TOKENS) | frozenset(USER_TOKENS)
+
 TOKEN_START = '{'
 TOKEN_END = '}'
 
+DOMAIN_URL = 'https://morgynstryker.com'
+
+
+class TokenReplacer(object):
+    """
+    Replaces all the tokens of a token dict in a single scan of the text,
+    using one compiled alternation of the tokens. Instances are immutable,
+    build one per token dict and share it.
+    """
+    __slots__ = ('token_dict', 'url_keys', '_keys', '_pattern')
+
+    def __init__(self, token_dict):
+        keys = dict((token, key) for key, token in token_dict.items())
+        # Longest first, so a token can never shadow a longer one it prefixes
+        tokens = sorted(keys, key=len, reverse=True)
+        object.__setattr__(self, 'token_dict', dict(token_dict))
+        object.__setattr__(self, 'url_keys', tuple(key for key in token_dict if key.endswith('_url')))
+        object.__setattr__(self, '_keys', keys)
+        object.__setattr__(self, '_pattern', re.compile('({})'.format('|'.join(re.escape(token) for token in tokens))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TokenReplacer is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('TokenReplacer is immutable')
+
+    def get_values(self, context, domain_url=DOMAIN_URL):
+        """
+        The replacement values for the tokens found in `context`, the `*_url`
+        values are made absolute. The context is left untouched.
+        """
+        values = dict((key, context[key]) for key in self.token_dict if key in context)
+        for key in self.url_keys:
+            if values.get(key):
+                values[key] = '{domain_url}{action_url}'.format(domain_url=domain_url, action_url=values[key])
+        return values
+
+    def replace(self, values, text):
+        """
+        :param values: the replacement value for each token key
+        :param text: the text that needs to have tokens replaced
+        :return: text that has had tokens replaced
+        """
+        # Splitting on a capturing pattern leaves the tokens at the odd indexes
+        parts = self._pattern.split(text)
+        if len(parts) == 1:
+            return text
+
+        lookup = dict((token, force_text(values[key])) for token, key in self._keys.items() if key in values)
+        parts[1::2] = [lookup.get(token, token) for token in parts[1::2]]
+        return ''.join(parts)
+
+
+REGISTRATION_REPLACER = TokenReplacer(REGISTRATION_TOKENS)
+INVITATION_REPLACER = TokenReplacer(INVITATION_TOKENS)
+USER_REPLACER = TokenReplacer(USER_TOKENS)
+
 
 def get_user_by_email(email, registration=False):
     """
@@ -94,12 +157,25 @@ class Tokens(object):
                 'user_first_name' not in token_context and
                 'sender_first_name' in token_context)
 
+    @classmethod
+    def get_token_replacer(cls, token_context):
+        if cls.is_invitation(token_context):
+            return INVITATION_REPLACER
+        elif cls.is_registration(token_context):
+            return REGISTRATION_REPLACER
+        elif 'activation_url' in token_context and 'user_first_name' in token_context:
+            raise ValueError('Cannot have user tokens and activation tokens together!')
+        return USER_REPLACER
+
     @classmethod
     def replace_tokens(cls, context, dirty_text):
         """
         This should get called after the email is rendered by Django.
         Why? Because of token injections!
 
+        All the tokens are replaced in a single pass and `context` is not
+        modified.
+
         :param context: the context data to replace
         :param dirty_text: the text that need to have tokens replaced
         :return: text that has had tokens replaced
@@ -107,26 +183,5 @@ class Tokens(object):
         if not (TOKEN_START in dirty_text and TOKEN_END in dirty_text):
             return dirty_text
 
-        token_context = context
-        if cls.is_invitation(token_context):
-            token_dict = INVITATION_TOKENS
-        elif cls.is_registration(token_context):
-            token_dict = REGISTRATION_TOKENS
-        elif 'activation_url' in token_context and 'user_first_name' in token_context:
-            raise ValueError('Cannot have user tokens and activation tokens together!')
-        else:
-            token_dict = USER_TOKENS
-
-        domain_url = token_dict.get('domain_url', 'https://morgynstryker.com')
-        for key, value in token_dict.items():
-            action_url = context.get(key)
-            if key.endswith('_url') and action_url:
-                context[key] = '{domain_url}{action_url}'.format(domain_url=domain_url, action_url=action_url)
-
-        clean_text = dirty_text
-        for key, value in token_context.items():
-            token = token_dict.get(key)
-            if token:
-                clean_text = clean_text.replace(token, value)
-
-        return clean_text
+        replacer = cls.get_token_replacer(context)
+        return replacer.replace(replacer.get_values(context), dirty_text)
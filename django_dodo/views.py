@@ -1,5 +1,10 @@
 from django.core.urlresolvers import NoReverseMatch, reverse
-from django.views.generic import RedirectView
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.generic import RedirectView, View
+
+from django_dodo import config
+from django_dodo.utils import metrics
 
 from .models import EmailLink
 
@@ -28,3 +33,21 @@ class EmailLinkRedirectView(RedirectView):
             url = "%s?%s" % (url, args)
 
         return url
+
+
+class MetricsView(View):
+    """
+    The stage timings and counters of this process, in the Prometheus text
+    format. Requires `Authorization: Bearer <DODO_METRICS_TOKEN>`, and is
+    not served when the token is not set.
+    """
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def get(self, request, *args, **kwargs):
+        if not config.METRICS_TOKEN:
+            raise Http404
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if not constant_time_compare(authorization, 'Bearer {}'.format(config.METRICS_TOKEN)):
+            return HttpResponseForbidden()
+
+        return HttpResponse(metrics.render_prometheus(), content_type=self.content_type)
@@ -13,9 +13,9 @@ settings.configure(
         "django.contrib.sessions",
         "django.contrib.sites",
         "django.contrib.admin",
-        "django_comments",
-        "testapp",
-        "custom_comments",
+        "django.contrib.messages",
+        "sortedm2m",
+        "django_dodo",
     ],
     MIDDLEWARE=(
         'django.contrib.sessions.middleware.SessionMiddleware',
@@ -27,7 +27,7 @@ settings.configure(
         'django.contrib.auth.middleware.AuthenticationMiddleware',
         'django.contrib.messages.middleware.MessageMiddleware',
     ),  # Django < 1.10
-    ROOT_URLCONF='testapp.urls',
+    ROOT_URLCONF='django_dodo.urls',
     TEMPLATES=[
         {
             'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -42,6 +42,10 @@ settings.configure(
     ],
     SECRET_KEY="it's a secret to everyone",
     SITE_ID=1,
+    DEFAULT_FROM_EMAIL='dodo@example.com',
+    MAIL_FROM_DOMAIN='example.com',
+    EMAIL_SERVICES_CLIENT_ID='',
+    EMAIL_SERVICES_CLIENT_KEY='',
 )
 
 from django.test.runner import DiscoverRunner
@@ -50,12 +54,33 @@ from django.test.runner import DiscoverRunner
 def main(test_labels=None):
     django.setup()
     runner = DiscoverRunner(failfast=True, verbosity=1)
-    failures = runner.run_tests(test_labels or ['django_dodo'], interactive=True)
+    failures = runner.run_tests(test_labels or ['tests'], interactive=True)
     sys.exit(failures)
 
 
+def benchmark(names=None):
+    """
+    Run the benchmarks against a test database and print the JSON results,
+    rendering with the fixture templates of the tests.
+    """
+    import json
+
+    django.setup()
+    from django_dodo import benchmarks
+    from tests.templates import fixture_templates
+
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        with fixture_templates():
+            print(json.dumps(benchmarks.run(names), indent=2, sort_keys=True))
+    finally:
+        runner.teardown_databases(old_config)
+
+
 if __name__ == '__main__':
-    test_labels = None
-    if len(sys.argv) > 1:
-        test_labels = sys.argv[1:]
-    main(test_labels)
+    args = sys.argv[1:]
+    if args[:1] == ['--benchmark']:
+        benchmark(args[1:] or None)
+    else:
+        main(args or None)
@@ -24,6 +24,9 @@ setup(
         'django-sortedm2m',
     ],
     extras_require={
+        'async': [
+            'aiohttp',
+        ],
         'test': [
             'factory_boy',
         ]
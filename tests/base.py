@@ -1,7 +1,7 @@
 from django.test import TestCase
 
-from django_pigeon.tests.factories import EmailTemplateFactory
-from django_pigeon.models import EmailTemplate
+from tests.factories import EmailTemplateFactory
+from django_dodo.models import EmailTemplate
 
 
 class EmailTestCase(TestCase):
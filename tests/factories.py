@@ -1,7 +1,7 @@
 from factory.django import DjangoModelFactory
 from factory import LazyAttribute, Sequence, SubFactory, post_generation
 
-from django_pigeon.models import EmailTemplate, EmailTheme, EmailWidget, EmailButton
+from django_dodo.models import EmailTemplate, EmailTheme, EmailWidget, EmailButton
 
 
 class EmailThemeFactory(DjangoModelFactory):
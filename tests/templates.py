@@ -0,0 +1,58 @@
+"""
+Fixture email templates for the tests and the benchmarks run by
+run_tests.py, served by a locmem loader so rendering does not depend on
+the project's templates. They read the same theme, widget and button
+fields as the real ones.
+"""
+from __future__ import unicode_literals
+
+from django.test.utils import override_settings
+
+BASE_HTML = (
+    '<html><head><title>{{ email_template.title }}</title></head>'
+    '<body style="background-color: {{ email_template.base_theme.background_color }};">'
+    '<p style="color: {{ email_template.base_theme.color }};">{{ email_template.pre_header }}</p>'
+    '<table>{% for widget in widgets %}{% include widget.path %}{% endfor %}</table>'
+    '</body></html>'
+)
+
+WIDGET_HTML = (
+    '<tr><td bgcolor="{{ widget.theme.background_color }}" style="padding: {{ widget.theme.outer_padding }};">'
+    '{% if widget.header %}<h2 style="color: {{ widget.header_theme.color }};">{{ widget.header }}</h2>{% endif %}'
+    '{% if widget.body %}<p style="font-size: {{ widget.body_theme.font_size }}px;">{{ widget.body|safe }}</p>'
+    '{% endif %}'
+    '{% if widget.button %}<a href="{{ widget.button.url_link }}" style="color: {{ widget.button.theme.color }};">'
+    '{{ widget.button.text }}</a>{% endif %}'
+    '</td></tr>'
+)
+
+# As the real one, it links to the per recipient unsubscribe page
+FOOTER_MARKETING_HTML = WIDGET_HTML.replace(
+    '</td></tr>', '<a href="{{ unsubscribe_link }}">Unsubscribe</a></td></tr>')
+
+BASE_TEXT = '{% for widget in widgets %}{{ widget.header }}\n{{ widget.body }}\n{% endfor %}'
+
+WIDGET_TYPES = ('brand', 'header', 'body', 'footer', 'footer_marketing', 'dual_column', 'column_pic',
+                'product_header')
+
+FIXTURE_TEMPLATES = dict(
+    [('django_dodo/{}.html'.format(name), BASE_HTML) for name in ('base', 'base2', 'base3', 'base4')] +
+    [('django_dodo/widgets/{}.html'.format(name), WIDGET_HTML) for name in WIDGET_TYPES] +
+    [('django_dodo/widgets/footer_marketing.html', FOOTER_MARKETING_HTML),
+     ('django_dodo/base.txt', BASE_TEXT)]
+)
+
+TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [('django.template.loaders.locmem.Loader', FIXTURE_TEMPLATES),
+                    'django.template.loaders.app_directories.Loader'],
+    },
+}]
+
+
+def fixture_templates():
+    """
+    Render with the fixture templates, as a decorator or context manager.
+    """
+    return override_settings(TEMPLATES=TEMPLATES)
@@ -0,0 +1,72 @@
+import json
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from django_dodo.admin import EmailTemplateAdmin
+from django_dodo.models import EmailTemplate, EmailWidget
+from tests.factories import EmailButtonFactory, EmailThemeFactory, EmailWidgetFactory
+from tests.templates import fixture_templates
+
+
+class RenderWidgetsTestCase(TestCase):
+
+    def test_one_query_in_order(self):
+        widgets = [EmailWidgetFactory(widget_type='body', button=EmailButtonFactory()) for _ in range(5)]
+        pks = [widget.pk for widget in reversed(widgets)] + [0]
+
+        with self.assertNumQueries(1):
+            loaded = EmailWidget.get_render_widgets(pks)
+            for widget in loaded:
+                self.assertIsNotNone(widget.theme.background_color)
+                self.assertIsNotNone(widget.header_theme.font_size)
+                self.assertIsNotNone(widget.body_theme.font_size)
+                self.assertIsNotNone(widget.button.theme.color)
+
+        self.assertEqual([widget.pk for widget in loaded], pks[:-1])
+
+
+@fixture_templates()
+class PreviewViewTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.model_admin = EmailTemplateAdmin(EmailTemplate, admin.site)
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.widget = EmailWidgetFactory(widget_type='body', header='Hello { USER_FIRST_NAME }')
+        self.data = {'base_template': EmailTemplate.TEMPLATE_1,
+                     'email_type': EmailTemplate.WEEKLY_NOTIFICATION,
+                     'base_theme': EmailThemeFactory().pk,
+                     'subject': 'Subject',
+                     'title': 'Title',
+                     'pre_header': 'Pre-header',
+                     'widgets': str(self.widget.pk)}
+
+    def preview(self, **data):
+        request = RequestFactory().post('/preview/', dict(self.data, **data))
+        request.user = self.user
+        response = self.model_admin.preview_view(request)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_repeated_preview_is_cached(self):
+        first = self.preview()
+        with self.assertNumQueries(0):
+            second = self.preview()
+
+        self.assertEqual(first, second)
+        self.assertIn('Hello Jane', first['html_body'])
+
+    def test_form_changes_are_not_cached(self):
+        self.preview()
+
+        self.assertEqual(self.preview(subject='Other subject')['subject'], 'Other subject')
+
+    def test_widget_edit_invalidates(self):
+        self.preview()
+        self.widget.header = 'Bye { USER_FIRST_NAME }'
+        self.widget.save()
+
+        self.assertIn('Bye Jane', self.preview()['html_body'])
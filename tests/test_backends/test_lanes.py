@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+
+from django_dodo import config
+from django_dodo.backends.backends import SESBackend
+from django_dodo.backends.rate_limit import LocalCache, get_lane_rate_limiter
+from django_dodo.lanes import MARKETING, TRANSACTIONAL, get_lane, get_lane_rate
+from django_dodo.models import EmailTemplate
+from tests.test_backends.test_rate_limit import FakeClock
+
+
+class LaneTestCase(SimpleTestCase):
+
+    def test_get_lane(self):
+        self.assertEqual(get_lane(EmailTemplate.PASSWORD_RESET), TRANSACTIONAL)
+        self.assertEqual(get_lane(EmailTemplate.IDENTITY_VERIFICATION), TRANSACTIONAL)
+        self.assertEqual(get_lane(EmailTemplate.WEEKLY_NOTIFICATION), MARKETING)
+
+    def test_lane_rates_share_the_send_rate(self):
+        transactional = get_lane_rate(TRANSACTIONAL, 20)
+        marketing = get_lane_rate(MARKETING, 20)
+
+        self.assertAlmostEqual(transactional, 20 * config.TRANSACTIONAL_RATE_SHARE)
+        self.assertAlmostEqual(transactional + marketing, 20)
+
+    def get_buckets(self, rate=10):
+        self.clock = FakeClock()
+        cache = LocalCache(clock=self.clock)
+        return [get_lane_rate_limiter(lane, rate, cache=cache, clock=self.clock)
+                for lane in (MARKETING, TRANSACTIONAL)]
+
+    def test_marketing_borrows_an_idle_share(self):
+        marketing, transactional = self.get_buckets()
+
+        self.assertEqual(sum(1 for _ in range(12) if marketing.try_acquire()[0]), 10)
+
+    def test_transactional_has_priority(self):
+        marketing, transactional = self.get_buckets()
+        self.assertTrue(transactional.try_acquire()[0])
+
+        # Marketing leaves the transactional share of the window
+        self.assertEqual(sum(1 for _ in range(10) if marketing.try_acquire()[0]), 7)
+        self.assertEqual(sum(1 for _ in range(10) if transactional.try_acquire()[0]), 2)
+
+        # And of the next one, as transactional emails were sent in the last window
+        self.clock.sleep(1)
+        self.assertEqual(sum(1 for _ in range(10) if marketing.try_acquire()[0]), 8)
+        self.clock.sleep(2)
+        self.assertEqual(sum(1 for _ in range(10) if marketing.try_acquire()[0]), 10)
+
+    def test_lanes_share_the_rate(self):
+        marketing, transactional = self.get_buckets()
+        while transactional.try_acquire()[0]:
+            pass
+
+        self.assertFalse(marketing.try_acquire()[0])
+
+    def test_backend_uses_its_lane(self):
+        backend = SESBackend(lane=TRANSACTIONAL)
+        backend.get_max_send_rate = lambda: 10
+
+        self.assertEqual(backend.get_rate_limiter().lane, TRANSACTIONAL)
+        self.assertEqual(backend.get_rate_limiter().rate, 10)
@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase
+
+from django_dodo.backends.rate_limit import LocalCache, TokenBucket
+
+
+class FakeClock(object):
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LocalCache(clock=self.clock)
+
+    def get_bucket(self, rate):
+        return TokenBucket(rate, cache=self.cache, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_buckets_share_the_rate(self):
+        buckets = [self.get_bucket(5), self.get_bucket(5)]
+
+        acquired = [bucket.try_acquire()[0] for _ in range(4) for bucket in buckets]
+
+        self.assertEqual(acquired.count(True), 5)
+
+    def test_acquire_waits_for_a_token(self):
+        bucket = self.get_bucket(2)
+        self.clock.now = 1000.25
+
+        waits = [bucket.acquire() for _ in range(5)]
+
+        self.assertEqual(waits, [0, 0, 0.5, 0.5, 0.5])
+
+    def test_no_burst_across_seconds(self):
+        bucket = self.get_bucket(10)
+        self.clock.now = 1000.9
+        self.assertEqual(bucket.acquire(10), 0)
+
+        # Only what was refilled since, not a second full bucket
+        self.clock.now = 1001.1
+        self.assertEqual(sum(1 for _ in range(10) if bucket.try_acquire()[0]), 2)
+
+    def test_slow_rate(self):
+        bucket = self.get_bucket(0.5)
+
+        self.assertEqual(bucket.try_acquire(), (True, 0))
+        self.assertEqual(bucket.try_acquire(), (False, 2.0))
+
+    def test_acquire_many(self):
+        bucket = self.get_bucket(4)
+
+        self.assertEqual(bucket.try_acquire(3), (True, 0))
+        self.assertEqual(bucket.try_acquire(2), (False, 0.25))
+        # More than the bucket holds is taken a bucket at a time
+        self.assertAlmostEqual(bucket.acquire(10), 2.25)
+
+    def test_locked_bucket(self):
+        bucket = self.get_bucket(5)
+        self.cache.add(TokenBucket.LOCK_KEY.format(name='ses'), True)
+
+        self.assertEqual(bucket.try_acquire(), (False, 0.01))
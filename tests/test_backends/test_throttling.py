@@ -0,0 +1,133 @@
+from unittest import mock
+
+from boto.exception import BotoServerError
+from boto.ses.exceptions import SESDailyQuotaExceededError, SESMaxSendingRateExceededError
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase
+
+from django_dodo.backends.backends import SESBackend
+from django_dodo.backends.rate_limit import LocalCache, TokenBucket
+from django_dodo.backends.throttling import QUOTA_EXCEEDED, THROTTLED, AIMDController, classify_error
+from django_dodo.services.base import EmailServiceError
+from tests.test_backends.test_rate_limit import FakeClock
+
+
+class ClassifyErrorTestCase(SimpleTestCase):
+
+    def test_boto_errors(self):
+        self.assertEqual(classify_error(SESMaxSendingRateExceededError(400, 'Bad Request')), THROTTLED)
+        self.assertEqual(classify_error(SESDailyQuotaExceededError(400, 'Bad Request')), QUOTA_EXCEEDED)
+        self.assertIsNone(classify_error(BotoServerError(400, 'Bad Request')))
+
+    def test_service_errors(self):
+        self.assertEqual(classify_error(EmailServiceError('Throttling: Maximum sending rate exceeded.')), THROTTLED)
+        self.assertEqual(classify_error(EmailServiceError('Throttling: Daily message quota exceeded.')),
+                         QUOTA_EXCEEDED)
+        self.assertIsNone(classify_error(EmailServiceError('MessageRejected: Email address is not verified.')))
+
+
+class AIMDControllerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(8, cache=LocalCache(clock=self.clock), clock=self.clock)
+        self.controller = AIMDController(self.bucket, 8, min_rate=1, clock=self.clock)
+
+    def test_throttle_halves_once_per_cooldown(self):
+        self.controller.on_throttle()
+        self.controller.on_throttle()
+
+        self.assertEqual(self.bucket.rate, 4)
+        self.clock.sleep(1)
+        self.controller.on_throttle()
+        self.assertEqual(self.bucket.rate, 2)
+
+    def test_rate_stays_in_bounds(self):
+        for _ in range(10):
+            self.clock.sleep(1)
+            self.controller.on_throttle()
+        self.assertEqual(self.bucket.rate, 1)
+
+        for _ in range(100):
+            self.controller.on_success()
+        self.assertEqual(self.bucket.rate, 8)
+
+    def test_success_increases_additively(self):
+        self.controller.on_throttle()
+        for _ in range(4):
+            self.controller.on_success()
+
+        self.assertEqual(self.bucket.rate, 5)
+
+
+class FakeConnection(object):
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.sent = 0
+
+    def send_email(self, *args, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent += 1
+
+
+@mock.patch('django_dodo.backends.throttling.time.sleep')
+class SESBackendThrottlingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        clock = FakeClock()
+        self.backend = SESBackend(rate_limiter=TokenBucket(100, cache=LocalCache(clock=clock), clock=clock))
+        self.message = EmailMessage('Subject', 'Body', 'from@example.com', ['to@example.com'])
+
+    def test_throttled_message_is_retried(self, sleep):
+        connection = FakeConnection([SESMaxSendingRateExceededError(400, 'Bad Request')])
+
+        self.assertTrue(self.backend._send_message(connection, self.message))
+        self.assertEqual(connection.sent, 1)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(self.backend.get_rate_limiter().rate, 50)
+
+    def test_quota_error_is_not_retried(self, sleep):
+        connection = FakeConnection([SESDailyQuotaExceededError(400, 'Bad Request')])
+
+        self.assertFalse(self.backend._send_message(connection, self.message))
+        self.assertFalse(sleep.called)
+
+    def test_quota_stops_the_batch(self, sleep):
+        connection = FakeConnection([SESDailyQuotaExceededError(400, 'Bad Request')])
+        self.backend.connection = connection
+        self.backend.concurrency = 1
+
+        self.assertEqual(self.backend.send_each([self.message] * 3), [False, False, False])
+        self.assertEqual(connection.sent, 0)
+        # A later batch is tried again
+        self.assertEqual(self.backend.send_each([self.message]), [True])
+
+
+class SharedRateTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        cache = LocalCache(clock=self.clock)
+        # The buckets and controllers of two worker processes
+        self.buckets = [TokenBucket(8, cache=cache, clock=self.clock) for _ in range(2)]
+        self.controllers = [AIMDController(bucket, 8, min_rate=1, clock=self.clock) for bucket in self.buckets]
+
+    def test_decrease_is_shared(self):
+        self.controllers[0].on_throttle()
+        self.controllers[1].on_throttle()
+
+        self.assertEqual(self.buckets[0].rate, 4)
+        self.clock.sleep(1)
+        self.buckets[1].try_acquire()
+        self.assertEqual(self.buckets[1].rate, 4)
+
+    def test_increase_starts_from_the_shared_rate(self):
+        self.controllers[0].on_throttle()
+        self.clock.sleep(1)
+        self.buckets[1].try_acquire()
+        for _ in range(4):
+            self.controllers[1].on_success()
+
+        self.assertEqual(self.buckets[1].rate, 5)
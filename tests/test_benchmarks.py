@@ -0,0 +1,56 @@
+import json
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from django_dodo import benchmarks
+from django_dodo.benchmarks.render import make_email_template
+from django_dodo.models import EmailTemplate
+from django_dodo.utils.render import CompiledTemplate
+from tests.templates import fixture_templates
+
+
+@fixture_templates()
+class BenchmarksTestCase(TestCase):
+
+    def test_results_are_json(self):
+        results = json.loads(json.dumps(benchmarks.run(['tokens', 'mime'])))
+
+        self.assertEqual(sorted(results['results']), ['mime', 'tokens'])
+        self.assertGreater(results['results']['mime']['full_seconds'], 0)
+
+    def test_render(self):
+        results = benchmarks.run_benchmark('render', widget_counts=(1, 5), number=1)
+
+        self.assertEqual(sorted(results), [1, 5])
+        self.assertGreater(results[5]['live']['renders_per_second'], 0)
+        self.assertLess(results[5]['compiled']['queries'], results[5]['live']['queries'])
+
+    def test_send(self):
+        results = benchmarks.run_benchmark('send', count=5)
+
+        self.assertEqual(len(results['backend']), 3)
+        self.assertGreater(results['chunk']['queries'], 0)
+
+    def test_rolled_back(self):
+        benchmarks.run_benchmark('render', widget_counts=(1,), number=1)
+
+        self.assertFalse(EmailTemplate.objects.exists())
+
+
+class ProfileSendTestCase(TestCase):
+
+    @mock.patch.object(EmailTemplate, 'get_compiled', return_value=CompiledTemplate(
+        'Hi { USER_FIRST_NAME }', '<p>{ USER_EMAIL }</p>', '{ USER_EMAIL }'))
+    def test_command(self, get_compiled):
+        email_template = make_email_template(1)
+        output = StringIO()
+        call_command('dodo_profile_send', str(email_template.pk), count=5, render='compiled', top=5, stdout=output)
+        output = output.getvalue()
+
+        self.assertIn('5 messages in', output)
+        self.assertIn('cumulative', output)
+        self.assertIn('Peak memory', output)
+        self.assertEqual(get_compiled.call_count, 11)
@@ -0,0 +1,96 @@
+import smtplib
+import threading
+from unittest import mock
+
+from django.core import mail
+from django.core.signals import request_finished
+from django.test import SimpleTestCase, override_settings
+
+from django_dodo.email import close_worker_connections, get_worker_connection, send_mass_mail_alternatives
+
+MESSAGES = [('Subject {}'.format(i), 'Body', ['user{}@example.com'.format(i)], '<p>Body</p>') for i in range(3)]
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class WorkerConnectionTestCase(SimpleTestCase):
+
+    def setUp(self):
+        close_worker_connections()
+        self.addCleanup(close_worker_connections)
+
+    def test_reused(self):
+        connection = get_worker_connection()
+
+        self.assertIs(get_worker_connection(), connection)
+        self.assertIsNot(get_worker_connection(lane='marketing'), connection)
+
+    def test_one_per_thread(self):
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(get_worker_connection()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(connections[0], get_worker_connection())
+
+    def test_closed_on_shutdown(self):
+        connection = get_worker_connection()
+        with mock.patch.object(connection, 'close') as close:
+            close_worker_connections()
+
+        close.assert_called_once_with()
+        self.assertIsNot(get_worker_connection(), connection)
+
+    def test_broken_connection_is_retried(self):
+        connection = get_worker_connection()
+        with mock.patch.object(connection, 'send_messages', side_effect=smtplib.SMTPServerDisconnected('Idle')):
+            self.assertEqual(send_mass_mail_alternatives(MESSAGES), 3)
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIsNot(get_worker_connection(), connection)
+
+    def test_rejected_batch_is_not_retried(self):
+        connection = get_worker_connection()
+        error = smtplib.SMTPRecipientsRefused({'user0@example.com': (550, b'No such user')})
+        with mock.patch.object(connection, 'send_messages', side_effect=error):
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                send_mass_mail_alternatives(MESSAGES)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIsNot(get_worker_connection(), connection)
+
+    def test_closed_at_request_end(self):
+        connection = get_worker_connection()
+        with mock.patch.object(connection, 'close') as close:
+            request_finished.send(sender=None)
+
+        close.assert_called_once_with()
+        self.assertIsNot(get_worker_connection(), connection)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SendMassMailAlternativesTestCase(SimpleTestCase):
+
+    def setUp(self):
+        close_worker_connections()
+        self.addCleanup(close_worker_connections)
+
+    def test_counts_sent(self):
+        self.assertEqual(send_mass_mail_alternatives(MESSAGES), 3)
+        self.assertEqual(send_mass_mail_alternatives(MESSAGES[:1]), 1)
+
+        self.assertEqual([message.subject for message in mail.outbox],
+                         ['Subject 0', 'Subject 1', 'Subject 2', 'Subject 0'])
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Body</p>', 'text/html')])
+
+    def test_counts_only_sent(self):
+        connection = mock.Mock()
+        connection.send_messages.return_value = 2
+
+        self.assertEqual(send_mass_mail_alternatives(MESSAGES, connection=connection), 2)
+        self.assertEqual(len(connection.send_messages.call_args[0][0]), 3)
+
+    def test_nothing_sent(self):
+        connection = mock.Mock()
+        connection.send_messages.return_value = None
+
+        self.assertEqual(send_mass_mail_alternatives([], connection=connection), 0)
@@ -0,0 +1,197 @@
+import os
+import tempfile
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+
+from django_dodo.models import EmailRecipient, RecipientUser, invalidate_recipient_user
+
+
+class BulkGetOrCreateTestCase(TestCase):
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        patcher = mock.patch('django_dodo.models.User')
+        self.User = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.User.objects.filter.return_value.values_list.return_value = [('jane@example.com', self.user_id)]
+
+    def test_normalizes_and_dedupes(self):
+        existing = EmailRecipient.objects.create(email='zoe@example.com')
+        recipients = EmailRecipient.bulk_get_or_create([' zoe@Example.com', 'jane@EXAMPLE.com', 'zoe@example.com',
+                                                        'sam@example.com'])
+
+        self.assertEqual([r.email for r in recipients], ['zoe@example.com', 'jane@example.com', 'sam@example.com'])
+        self.assertEqual(recipients[0].pk, existing.pk)
+        self.assertEqual(recipients[1].user_id, self.user_id)
+        self.assertIsNone(recipients[2].user_id)
+        self.assertEqual(EmailRecipient.objects.count(), 3)
+
+    def test_fills_in_existing_users(self):
+        EmailRecipient.objects.create(email='jane@example.com')
+        recipient, = EmailRecipient.bulk_get_or_create(['jane@example.com'])
+
+        self.assertEqual(recipient.user_id, self.user_id)
+
+    def test_queries_per_batch(self):
+        self.User.objects.filter.return_value.values_list.return_value = []
+        emails = ['user{}@example.com'.format(i) for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            EmailRecipient.bulk_get_or_create(emails, batch_size=20)
+
+        # The existing recipients, the insert in a savepoint and the fetch of each batch
+        self.assertLessEqual(len(queries), 3 * 5)
+        self.assertEqual(EmailRecipient.objects.count(), 50)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,email\nJane,jane@example.com\nBad,not-an-email\nSam,sam@example.com\nShort\n')
+        self.addCleanup(os.remove, f.name)
+        output = StringIO()
+        call_command('dodo_import_recipients', f.name, column='email', chunk_size=1, stdout=output)
+
+        self.assertIn('Imported 2 recipients, skipped 2 invalid rows', output.getvalue())
+        self.assertEqual(sorted(EmailRecipient.objects.values_list('email', flat=True)),
+                         ['jane@example.com', 'sam@example.com'])
+
+
+class FakeUser(object):
+
+    class DoesNotExist(Exception):
+        pass
+
+    def __init__(self, email):
+        self.uuid = uuid.uuid4()
+        self.email = email
+        self.first_name = email.split('@')[0].title()
+        self.password = 'pbkdf2_sha256$hash'
+
+    def get_email_context(self):
+        return {'user_email': self.email, 'user_first_name': self.first_name}
+
+
+class FakeQuerySet(list):
+
+    def first(self):
+        return self[0] if self else None
+
+
+class RecipientUserTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.jane = FakeUser('jane@example.com')
+        self.users = [self.jane, FakeUser('sam@example.com')]
+        patcher = mock.patch('django_dodo.models.User')
+        self.User = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.User.DoesNotExist = FakeUser.DoesNotExist
+        self.User.get_user_by_email.side_effect = self.get_user_by_email
+        self.User.objects.filter.side_effect = self.filter
+        self.User.objects.annotate.return_value.filter.side_effect = self.filter
+        self.aliases = {}
+
+    def get_user_by_email(self, email):
+        email = self.aliases.get(email, email)
+        for user in self.users:
+            if user.email.lower() == email.lower():
+                return user
+        raise FakeUser.DoesNotExist()
+
+    def filter(self, uuid=None, uuid__in=None, email_lower__in=None):
+        if uuid is not None:
+            return FakeQuerySet(user for user in self.users if user.uuid == uuid)
+        if uuid__in is not None:
+            return FakeQuerySet(user for user in self.users if user.uuid in uuid__in)
+        return FakeQuerySet(user for user in self.users if user.email.lower() in email_lower__in)
+
+    def test_user_by_user_id(self):
+        EmailRecipient.objects.create(email='jane@example.com', user_id=self.jane.uuid)
+        recipient = EmailRecipient.objects.get()
+
+        self.assertIs(recipient.user, self.jane)
+        self.assertIs(recipient.user, self.jane)
+        self.User.objects.filter.assert_called_once_with(uuid=self.jane.uuid)
+        self.assertFalse(self.User.get_user_by_email.called)
+
+    def test_user_stores_user_id(self):
+        EmailRecipient.objects.create(email='jane@example.com')
+
+        self.assertIs(EmailRecipient.objects.get().user, self.jane)
+        self.assertEqual(EmailRecipient.objects.get().user_id, self.jane.uuid)
+
+    def test_user_changed_email(self):
+        EmailRecipient.objects.create(email='jane@example.com', user_id=self.jane.uuid)
+        self.jane.email = 'jane@example.org'
+
+        self.assertIsNone(EmailRecipient.objects.get().user)
+        self.assertIsNone(EmailRecipient.objects.get().user_id)
+
+    def test_resolves_through_user_id_and_cache(self):
+        EmailRecipient.objects.create(email='jane@example.com', user_id=self.jane.uuid)
+
+        self.assertEqual(EmailRecipient.objects.get().recipient_user.uuid, self.jane.uuid)
+        self.assertEqual(EmailRecipient.objects.get().recipient_user.uuid, self.jane.uuid)
+        self.assertEqual(self.User.objects.filter.call_count, 1)
+        self.assertFalse(self.User.get_user_by_email.called)
+
+    def test_stores_user_id(self):
+        EmailRecipient.objects.create(email='jane@example.com')
+
+        self.assertEqual(EmailRecipient.objects.get().recipient_user.uuid, self.jane.uuid)
+        self.assertEqual(EmailRecipient.objects.get().user_id, self.jane.uuid)
+
+    def test_changed_email(self):
+        EmailRecipient.objects.create(email='jane@example.com', user_id=self.jane.uuid)
+        self.jane.email = 'jane@example.org'
+        invalidate_recipient_user(sender=None, instance=self.jane)
+
+        self.assertIsNone(EmailRecipient.objects.get().recipient_user)
+        self.assertIsNone(EmailRecipient.objects.get().user_id)
+
+    def test_prefetch_users(self):
+        EmailRecipient.objects.create(email='jane@example.com', user_id=self.jane.uuid)
+        EmailRecipient.objects.create(email='sam@example.com')
+        EmailRecipient.objects.create(email='zoe@example.com')
+        recipients = EmailRecipient.prefetch_users(list(EmailRecipient.objects.order_by('pk')))
+
+        self.assertEqual([r.recipient_user and r.recipient_user.email for r in recipients],
+                         ['jane@example.com', 'sam@example.com', None])
+        self.assertEqual(self.User.objects.filter.call_count, 1)
+        self.assertEqual(self.User.objects.annotate.return_value.filter.call_count, 1)
+        self.assertEqual(EmailRecipient.objects.get(email='sam@example.com').user_id, self.users[1].uuid)
+
+    def test_caches_only_the_email_context(self):
+        EmailRecipient.objects.create(email='jane@example.com')
+        user = EmailRecipient.objects.get().recipient_user
+        cached = cache.get(EmailRecipient.USER_CACHE_KEY.format(user_id=self.jane.uuid))
+
+        for obj in (user, cached):
+            self.assertIsInstance(obj, RecipientUser)
+            self.assertFalse(hasattr(obj, 'password'))
+            self.assertEqual(obj.get_email_context(), self.jane.get_email_context())
+
+    def test_prefetch_ignores_case(self):
+        self.jane.email = 'Jane@Example.com'
+        EmailRecipient.objects.create(email='jane@example.com')
+        recipient, = EmailRecipient.prefetch_users(list(EmailRecipient.objects.all()))
+
+        self.assertEqual(recipient.recipient_user.uuid, self.jane.uuid)
+        self.assertEqual(EmailRecipient.objects.get().user_id, self.jane.uuid)
+
+    def test_prefetch_keeps_user_id_found_by_user_lookup(self):
+        # A lookup by another address of the user, which the query by email misses
+        self.jane.email = 'jane@example.org'
+        self.aliases['jane@example.com'] = 'jane@example.org'
+        EmailRecipient.objects.create(email='jane@example.com', user_id=self.jane.uuid)
+        recipient, = EmailRecipient.prefetch_users(list(EmailRecipient.objects.all()))
+
+        self.assertEqual(recipient.recipient_user.uuid, self.jane.uuid)
+        self.assertEqual(EmailRecipient.objects.get().user_id, self.jane.uuid)
+        self.assertEqual(EmailRecipient.objects.get().recipient_user.uuid, self.jane.uuid)
@@ -0,0 +1,177 @@
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.test import TestCase
+
+from django_dodo.models import EmailRenderBundle, EmailTemplate, MarketEmail
+from django_dodo.utils.render import get_render_generation
+from tests.factories import EmailButtonFactory, EmailTemplateFactory, EmailWidgetFactory
+from tests.templates import fixture_templates
+
+
+class EmailTemplateRenderQueriesTestCase(TestCase):
+
+    def setUp(self):
+        widgets = [EmailWidgetFactory(widget_type='body', button=EmailButtonFactory()) for _ in range(10)]
+        self.email_template = EmailTemplateFactory(widgets=widgets)
+        # The current site is cached after the first lookup
+        Site.objects.clear_cache()
+        Site.objects.get_current()
+
+    def test_render_context_queries(self):
+        # One query for the template and its theme, one for the widgets, their themes and buttons
+        with self.assertNumQueries(2):
+            email_template = EmailTemplate.get_for_render(self.email_template.pk)
+            context = email_template.get_context_data()
+            self.assertIsNotNone(email_template.base_theme.color)
+            for widget in context['widgets']:
+                self.assertIsNotNone(widget.theme.background_color)
+                self.assertIsNotNone(widget.header_theme.font_size)
+                self.assertIsNotNone(widget.body_theme.font_size)
+                self.assertIsNotNone(widget.button.theme.color)
+
+    def test_render_widgets_order(self):
+        widgets = self.email_template.get_render_widgets()
+
+        self.assertEqual([widget.pk for widget in widgets],
+                         [widget.pk for widget in self.email_template.widgets.all()])
+
+
+@fixture_templates()
+class CompiledRenderTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.widget = EmailWidgetFactory(widget_type='body', body='Hi { USER_FIRST_NAME }')
+        self.email_template = EmailTemplateFactory(widgets=[self.widget])
+        Site.objects.clear_cache()
+        Site.objects.get_current()
+
+    def test_second_render_is_cached(self):
+        first = EmailTemplate.get_for_render(self.email_template.pk).get_compiled()
+        email_template = EmailTemplate.get_for_render(self.email_template.pk)
+        with self.assertNumQueries(0):
+            second = email_template.get_compiled()
+            rendered = email_template.render({'user_first_name': 'Jane'}, compiled=True)
+
+        self.assertEqual(first.version, second.version)
+        self.assertEqual(first.html, second.html)
+        self.assertIn('Hi Jane', rendered['html_body'])
+
+    def assertBumps(self, change):
+        generation = get_render_generation()
+        change()
+        self.assertNotEqual(get_render_generation(), generation)
+
+    def test_edits_bump_the_generation(self):
+        self.assertBumps(self.email_template.save)
+        self.assertBumps(self.widget.save)
+        self.assertBumps(self.widget.theme.save)
+        self.assertBumps(lambda: self.email_template.widgets.add(EmailWidgetFactory(widget_type='body')))
+        self.assertBumps(lambda: self.email_template.widgets.clear())
+
+    def test_edit_recompiles(self):
+        EmailTemplate.get_for_render(self.email_template.pk).get_compiled()
+        self.widget.body = 'Bye { USER_FIRST_NAME }'
+        self.widget.save()
+
+        compiled = EmailTemplate.get_for_render(self.email_template.pk).get_compiled()
+        self.assertIn('Bye { USER_FIRST_NAME }', compiled.html)
+
+
+@fixture_templates()
+class RenderManyTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.email_template = EmailTemplateFactory(
+            subject='Hi { USER_FIRST_NAME }',
+            widgets=[EmailWidgetFactory(widget_type='body', body='See <a href="{ PROFILE_URL }">you</a>')])
+        self.contexts = [{'user_first_name': 'Jane', 'profile_url': '/jane'},
+                         {'user_first_name': 'Sam', 'profile_url': '/sam'},
+                         {'user_first_name': 'Zoe', 'profile_url': '/zoe'}]
+
+    def assertRenders(self, compiled):
+        rendered = list(self.email_template.render_many(self.contexts, compiled=compiled))
+
+        self.assertEqual(len(rendered), 3)
+        self.assertEqual([email['subject'] for email in rendered], ['Hi Jane', 'Hi Sam', 'Hi Zoe'])
+        self.assertIn('/jane"', rendered[0]['html_body'])
+        self.assertIn('/sam"', rendered[1]['html_body'])
+        self.assertNotIn('/jane"', rendered[1]['html_body'])
+        self.assertNotIn('PROFILE_URL', rendered[2]['html_body'])
+        self.assertIn('/zoe"', rendered[2]['html_body'])
+
+    def test_live(self):
+        self.assertRenders(compiled=False)
+
+    def test_compiled(self):
+        self.assertRenders(compiled=True)
+
+    def test_loads_once(self):
+        self.email_template.get_compiled()
+        with self.assertNumQueries(0):
+            list(self.email_template.render_many(self.contexts, compiled=True))
+
+
+@fixture_templates()
+class RenderBundleTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.widget = EmailWidgetFactory(widget_type='footer_marketing', body='Hi { USER_FIRST_NAME }')
+        self.email_template = EmailTemplateFactory(widgets=[self.widget], release=True)
+        Site.objects.clear_cache()
+        Site.objects.get_current()
+
+    def test_created_on_release(self):
+        bundles = EmailRenderBundle.objects.filter(email_template=self.email_template)
+        count = bundles.count()
+        self.assertIn('Hi { USER_FIRST_NAME }', EmailRenderBundle.get_bundle(self.email_template.pk).html)
+
+        self.email_template.save()
+        self.assertEqual(bundles.count(), count)
+
+        self.email_template.widgets.add(EmailWidgetFactory(widget_type='body', body='More'))
+        self.assertEqual(bundles.count(), count + 1)
+        self.assertIn('More', EmailRenderBundle.get_bundle(self.email_template.pk).html)
+
+    def test_unreleased_has_no_bundle(self):
+        email_template = EmailTemplateFactory(widgets=[self.widget])
+
+        self.assertIsNone(EmailRenderBundle.get_bundle(email_template.pk))
+
+    def test_send_without_queries(self):
+        email = MarketEmail(email_template_id=self.email_template.pk)
+        EmailRenderBundle.get_bundle(self.email_template.pk)
+        with self.assertNumQueries(0):
+            rendered = email.render_email({'user_first_name': 'Jane'})
+
+        self.assertIn('Hi Jane', rendered['html_body'])
+
+    def test_context_read_by_template(self):
+        email = MarketEmail(email_template_id=self.email_template.pk)
+        rendered = email.render_email({'user_first_name': 'Jane', 'unsubscribe_link': '/unsubscribe/jane'})
+
+        self.assertIn('Hi Jane', rendered['html_body'])
+        self.assertIn('/unsubscribe/jane', rendered['html_body'])
+
+    def test_context_not_read_by_template(self):
+        email = MarketEmail(email_template=EmailTemplate.get_for_render(self.email_template.pk))
+        email.render_email({'user_first_name': 'Jane', 'sender': 'Sam'})
+        with self.assertNumQueries(0):
+            rendered = email.render_email({'user_first_name': 'Jane', 'sender': 'Sam'})
+
+        self.assertIn('Hi Jane', rendered['html_body'])
+
+    def test_context_read_from_the_released_snapshot(self):
+        email = MarketEmail(email_template_id=self.email_template.pk)
+        context = {'user_first_name': 'Jane', 'unsubscribe_link': '/unsubscribe/jane'}
+        email.render_email(context)
+        self.widget.body = 'Draft { USER_FIRST_NAME }'
+        self.widget.save()
+        with self.assertNumQueries(0):
+            rendered = email.render_email(context)
+
+        self.assertIn('Hi Jane', rendered['html_body'])
+        self.assertNotIn('Draft', rendered['html_body'])
+        self.assertIn('/unsubscribe/jane', rendered['html_body'])
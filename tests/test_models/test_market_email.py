@@ -0,0 +1,110 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from django_dodo import config
+from django_dodo.models import EmailRecipient, EmailStats, MarketEmail, MarketEmailChunk
+from django_dodo.tasks import send_market_email, send_market_email_chunk
+from tests.factories import EmailTemplateFactory
+
+
+class MarketEmailChunkTestCase(TestCase):
+
+    def setUp(self):
+        recipients = [EmailRecipient.objects.create(email='user{}@example.com'.format(i)) for i in range(7)]
+        self.email = MarketEmail.objects.create(email_template=EmailTemplateFactory(), primary_to=recipients[0])
+        self.email.to.add(*recipients[1:])
+
+    def test_create_chunks(self):
+        chunks = self.email.create_chunks(chunk_size=3)
+
+        self.assertEqual([chunk.num_recipients for chunk in chunks], [3, 3, 1])
+        self.assertEqual([chunk.index for chunk in chunks], [0, 1, 2])
+        self.assertEqual(sum((chunk.recipients() for chunk in chunks), []),
+                         ['user{}@example.com'.format(i) for i in range(7)])
+        # Created once, whatever the chunk size asked later
+        self.assertEqual(self.email.create_chunks(chunk_size=2), chunks)
+        # The primary recipient is chunked without being added to `to`
+        self.assertEqual(self.email.to.count(), 6)
+
+    def test_claimed_once(self):
+        chunk = self.email.create_chunks(chunk_size=3)[0]
+
+        self.assertEqual(MarketEmailChunk.get_pending(chunk.pk), chunk)
+        self.assertIsNone(MarketEmailChunk.get_pending(chunk.pk))
+        self.assertEqual(MarketEmailChunk.objects.get(pk=chunk.pk).status, MarketEmailChunk.SENDING)
+
+    def test_resume(self):
+        first, second, third = self.email.create_chunks(chunk_size=3)
+        MarketEmailChunk.get_pending(first.pk).mark_sent(3)
+        MarketEmailChunk.get_pending(second.pk)
+
+        self.assertEqual(list(self.email.get_pending_chunks()), [second, third])
+        # A live claim is kept, a stale one is released
+        self.assertEqual(MarketEmailChunk.release_stale(), 0)
+        MarketEmailChunk.objects.filter(pk=second.pk).update(claimed_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(MarketEmailChunk.release_stale(), 1)
+        self.assertIsNotNone(MarketEmailChunk.get_pending(second.pk))
+
+    def test_mark_sent(self):
+        first, second, third = self.email.create_chunks(chunk_size=3)
+        MarketEmailChunk.get_pending(first.pk).mark_sent(3)
+        MarketEmailChunk.get_pending(second.pk).mark_sent(2)
+
+        self.assertEqual(MarketEmailChunk.objects.get(pk=first.pk).status, MarketEmailChunk.SENT)
+        second = MarketEmailChunk.objects.get(pk=second.pk)
+        self.assertEqual((second.status, second.num_sent), (MarketEmailChunk.PARTIAL, 2))
+        self.assertIsNone(MarketEmail.objects.get(pk=self.email.pk).timestamp_sent)
+
+        # Nothing sent, the chunk is sent again
+        MarketEmailChunk.get_pending(third.pk).mark_sent(0)
+        self.assertEqual(MarketEmailChunk.objects.get(pk=third.pk).status, MarketEmailChunk.PENDING)
+        self.assertIsNone(MarketEmail.objects.get(pk=self.email.pk).timestamp_sent)
+
+        MarketEmailChunk.get_pending(third.pk).mark_sent(1)
+        self.assertIsNotNone(MarketEmail.objects.get(pk=self.email.pk).timestamp_sent)
+
+    @mock.patch.object(config, 'CAMPAIGN_CHUNK_MAX_ATTEMPTS', 2)
+    def test_failed_after_max_attempts(self):
+        chunk = self.email.create_chunks(chunk_size=7)[0]
+        for attempt in range(2):
+            chunk = MarketEmailChunk.get_pending(chunk.pk)
+            chunk.mark_attempt()
+            chunk.mark_sent(0)
+
+        self.assertEqual(MarketEmailChunk.objects.get(pk=chunk.pk).status, MarketEmailChunk.FAILED)
+        # Nothing left to send, the campaign is over
+        self.assertIsNotNone(MarketEmail.objects.get(pk=self.email.pk).timestamp_sent)
+
+    @mock.patch.object(config, 'BULK_TEMPLATED_SEND', False)
+    @mock.patch.object(config, 'CAMPAIGN_CHUNK_RETRY_DELAY', 10)
+    @mock.patch('django_dodo.tasks.send_market_email_chunk.apply_async')
+    @mock.patch('django_dodo.email.send_messages', side_effect=IOError('Connection reset'))
+    def test_failed_send_is_retried(self, send_messages, retry):
+        chunk = self.email.create_chunks(chunk_size=7)[0]
+        send_market_email_chunk(chunk.pk)
+        send_market_email_chunk(chunk.pk)
+
+        chunk = MarketEmailChunk.objects.get(pk=chunk.pk)
+        self.assertEqual((chunk.status, chunk.attempts), (MarketEmailChunk.PENDING, 2))
+        self.assertEqual(retry.call_args_list, [mock.call((chunk.pk,), countdown=10),
+                                                mock.call((chunk.pk,), countdown=20)])
+
+    @mock.patch.object(config, 'TRANSACTIONAL_QUOTA_RESERVE', 1)
+    def test_reserve_leaves_some_quota(self):
+        self.email.create_chunks(chunk_size=3)
+        chunks, plan = self.email.get_send_plan()
+
+        self.assertEqual(len(plan.etas), 3)
+
+    @mock.patch.object(config, 'SCHEDULE_CAMPAIGNS', True)
+    @mock.patch('django_dodo.tasks.send_market_email_chunk.apply_async')
+    @mock.patch('django_dodo.tasks.send_market_email.apply_async')
+    def test_unplannable_campaign_is_deferred(self, defer, send_chunk):
+        EmailStats.objects.create(timestamp=timezone.now().date(), max_24h=0)
+        send_market_email(self.email.pk)
+
+        defer.assert_called_once_with((self.email.pk,), countdown=config.CAMPAIGN_RETRY_DELAY)
+        self.assertFalse(send_chunk.called)
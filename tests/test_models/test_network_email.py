@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from django_dodo import config
+from django_dodo.models import EmailTemplate, NetworkEmail, OutboxMessage
+from tests.factories import EmailTemplateFactory
+
+
+class NetworkEmailSendTestCase(TestCase):
+
+    def setUp(self):
+        self.email_template = EmailTemplateFactory(email_type=EmailTemplate.WEEKLY_NOTIFICATION, release=True)
+        patcher = mock.patch('django_dodo.models.User')
+        self.addCleanup(patcher.stop)
+        patcher.start().objects.filter.return_value.values_list.return_value = []
+
+    @mock.patch('django_dodo.models.send_network_email')
+    def test_recipients(self, send_network_email):
+        email = NetworkEmail.send(['jane@Example.com', 'sam@example.com'], ['cc@example.com'], None,
+                                  EmailTemplate.WEEKLY_NOTIFICATION)
+
+        self.assertEqual(email.primary_to.email, 'jane@example.com')
+        self.assertEqual(sorted(email.to_recipients()), ['jane@example.com', 'sam@example.com'])
+        self.assertEqual(list(email.cc_recipients()), ['cc@example.com'])
+        self.assertEqual(list(email.bcc_recipients()), [])
+        self.assertEqual(email.email_template, self.email_template)
+        send_network_email.assert_called_once_with(email.id)
+
+    @mock.patch.object(config, 'OUTBOX', True)
+    @mock.patch('django_dodo.models.send_network_email')
+    def test_outbox(self, send_network_email):
+        email = NetworkEmail.send(['jane@example.com'], [], [], EmailTemplate.WEEKLY_NOTIFICATION)
+
+        self.assertEqual(OutboxMessage.objects.get().email_id, email.pk)
+        self.assertFalse(send_network_email.called)
+
+    @mock.patch('django_dodo.models.send_network_email')
+    def test_no_template(self, send_network_email):
+        self.assertIsNone(NetworkEmail.send(['jane@example.com'], [], [], EmailTemplate.DAILY_NOTIFICATION))
+        self.assertFalse(NetworkEmail.objects.exists())
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from django_dodo import config
+from django_dodo.models import OutboxMessage
+
+
+class OutboxMessageTestCase(TestCase):
+
+    def setUp(self):
+        self.messages = [OutboxMessage.objects.create(email_model=OutboxMessage.USER_EMAIL, email_id=i)
+                         for i in range(5)]
+
+    def test_claims_are_exclusive(self):
+        first = OutboxMessage.claim(3, worker='a')
+        second = OutboxMessage.claim(3, worker='b')
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(m.pk for m in first) & set(m.pk for m in second))
+        self.assertEqual(OutboxMessage.claim(3), [])
+        self.assertTrue(all(message.attempts == 1 for message in first + second))
+
+    def test_future_messages_are_not_due(self):
+        OutboxMessage.objects.update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(OutboxMessage.claim(10), [])
+
+    def test_mark_failed_backs_off(self):
+        message = OutboxMessage.claim(1)[0]
+        message.mark_failed('Throttling')
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertGreaterEqual(message.next_attempt_at, message.claimed_at)
+        self.assertEqual(message.last_error, 'Throttling')
+
+    def test_mark_failed_gives_up(self):
+        message = OutboxMessage.claim(1)[0]
+        message.attempts = config.OUTBOX_MAX_ATTEMPTS
+        message.mark_failed()
+
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+
+    def test_release_stale(self):
+        OutboxMessage.claim(2)
+        OutboxMessage.objects.filter(status=OutboxMessage.CLAIMED).update(
+            claimed_at=timezone.now() - timedelta(seconds=config.OUTBOX_CLAIM_TIMEOUT + 1))
+
+        self.assertEqual(OutboxMessage.release_stale(), 2)
+        self.assertEqual(OutboxMessage.get_queue_depth()[OutboxMessage.PENDING], 5)
+
+    def test_queue_depth(self):
+        OutboxMessage.claim(2)
+
+        depth = OutboxMessage.get_queue_depth()
+
+        self.assertEqual(depth[OutboxMessage.PENDING], 3)
+        self.assertEqual(depth[OutboxMessage.CLAIMED], 2)
+        self.assertEqual(depth[OutboxMessage.SENT], 0)
@@ -0,0 +1,124 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.utils.six.moves.urllib.parse import parse_qsl
+
+from django_dodo import config
+from django_dodo.backends.rate_limit import DEFAULT_MAX_SEND_RATE, LocalCache, TokenBucket
+from django_dodo.services.amazon_ses import BULK_DESTINATIONS, AmazonSEService
+from django_dodo.utils.render import CompiledTemplate
+
+BULK_RESPONSE = '''<SendBulkTemplatedEmailResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">
+  <SendBulkTemplatedEmailResult><Status>{}</Status></SendBulkTemplatedEmailResult>
+</SendBulkTemplatedEmailResponse>'''
+MEMBER = '<member><Status>{}</Status><MessageId>id</MessageId></member>'
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, status=200):
+        self.body = body.encode('utf-8')
+        self.status = status
+
+    def read(self):
+        return self.body
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.requests = []
+
+    def make_request(self, method, path, headers=None, data=None):
+        params = dict(parse_qsl(data))
+        self.requests.append(params)
+        if params['Action'] == 'CreateTemplate':
+            return FakeResponse('<CreateTemplateResponse/>')
+
+        count = len([key for key in params if key.endswith('ReplacementTemplateData')])
+        statuses = ['Success'] * count
+        if params['Destinations.member.1.Destination.ToAddresses.member.1'] == 'bounce@example.com':
+            statuses[0] = 'MessageRejected'
+        return FakeResponse(BULK_RESPONSE.format(''.join(MEMBER.format(status) for status in statuses)))
+
+
+@override_settings(EMAIL_SERVICES_CLIENT_ID='id', EMAIL_SERVICES_CLIENT_KEY='key')
+class BulkTemplatedTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cache = LocalCache()
+        # A stopped clock, so the bucket is not refilled during the test
+        self.bucket = TokenBucket(1000, cache=self.cache, clock=lambda: 1000.0)
+        self.service = AmazonSEService(rate_limiter=self.bucket)
+        self.service.connection = self.connection = FakeConnection()
+
+    def test_to_provider_template(self):
+        compiled = CompiledTemplate('Hi { USER_FIRST_NAME }', '<a href="{ PROFILE_URL }">x</a>', '{ USER_EMAIL }')
+
+        subject, html, text = compiled.to_provider_template()
+
+        self.assertEqual(subject, 'Hi {{user_first_name}}')
+        self.assertEqual(html, '<a href="{{profile_url}}">x</a>')
+        self.assertEqual(text, '{{user_email}}')
+
+    def test_template_is_created_once(self):
+        self.service.create_template('dodo-1-1', 'subject', 'html', 'text')
+        self.service.create_template('dodo-1-1', 'subject', 'html', 'text')
+
+        self.assertEqual(len(self.connection.requests), 1)
+        self.assertEqual(self.connection.requests[0]['Template.TemplateName'], 'dodo-1-1')
+
+    def test_send_bulk_templated_batches(self):
+        destinations = [('user{}@example.com'.format(i), {'user_email': 'user{}@example.com'.format(i)})
+                        for i in range(BULK_DESTINATIONS + 10)]
+        destinations[BULK_DESTINATIONS] = ('bounce@example.com', {})
+
+        results = self.service.send_bulk_templated('from@example.com', 'dodo-1-1', destinations)
+
+        self.assertEqual(len(self.connection.requests), 2)
+        self.assertEqual(len(results), len(destinations))
+        self.assertEqual(results.count(False), 1)
+        self.assertFalse(results[BULK_DESTINATIONS])
+        params = self.connection.requests[0]
+        self.assertEqual(json.loads(params['Destinations.member.2.ReplacementTemplateData']),
+                         {'user_email': 'user1@example.com'})
+        # A token for each destination
+        level, updated = self.cache.get(TokenBucket.KEY.format(name='ses'))
+        self.assertEqual(level, self.bucket.capacity - len(destinations))
+
+
+@override_settings(EMAIL_SERVICES_CLIENT_ID='id', EMAIL_SERVICES_CLIENT_KEY='key')
+class ConcurrencyTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.connection = FakeConnection()
+        self.connection.get_send_quota = mock.Mock(return_value={
+            'GetSendQuotaResponse': {'GetSendQuotaResult': {'MaxSendRate': '3.0'}}})
+
+    def test_quota_is_cached(self):
+        service = AmazonSEService(concurrency=8)
+        service.connection = self.connection
+
+        self.assertEqual(service.get_concurrency(), 3)
+        other = AmazonSEService(concurrency=2, connection_factory=lambda: self.connection)
+        self.assertEqual(other.get_concurrency(), 2)
+        self.assertEqual(self.connection.get_send_quota.call_count, 1)
+
+    def test_positional_arguments(self):
+        service = AmazonSEService('unused', lane='marketing')
+
+        self.assertEqual(service.concurrency, config.SEND_CONCURRENCY)
+        self.assertEqual(service.sender.lane, 'marketing')
+
+    def test_default_rate_without_quota(self):
+        self.connection.get_send_quota.side_effect = Exception('Forbidden')
+        service = AmazonSEService(concurrency=8)
+        service.connection = self.connection
+
+        self.assertEqual(service.get_max_send_rate(), DEFAULT_MAX_SEND_RATE)
+        self.assertEqual(service.get_concurrency(), DEFAULT_MAX_SEND_RATE)
+        self.assertEqual(service.get_rate_limiter().rate, DEFAULT_MAX_SEND_RATE)
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from django_dodo.backends.rate_limit import LocalCache, TokenBucket
+from django_dodo.services.amazon_ses_async import AsyncAmazonSEService
+from django_dodo.services.base_async import AsyncEmailService
+
+
+class EchoService(AsyncEmailService):
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_messages(self, messages):
+        await asyncio.sleep(0)
+        return [True for message in messages]
+
+
+class SendMessagesSyncTestCase(SimpleTestCase):
+
+    def test_without_a_loop(self):
+        self.assertEqual(EchoService().send_messages_sync(['a', 'b']), [True, True])
+
+    def test_from_a_running_loop(self):
+        async def send():
+            return EchoService().send_messages_sync(['a', 'b'])
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(send()), [True, True])
+        finally:
+            loop.close()
+
+
+class ThreadRecordingBucket(TokenBucket):
+
+    def try_acquire(self, tokens=1):
+        self.threads.add(threading.current_thread())
+        return super(ThreadRecordingBucket, self).try_acquire(tokens)
+
+
+@override_settings(EMAIL_SERVICES_CLIENT_ID='id', EMAIL_SERVICES_CLIENT_KEY='key')
+class AsyncAcquireTestCase(SimpleTestCase):
+
+    def test_cache_is_not_used_in_the_loop(self):
+        rate_limiter = ThreadRecordingBucket(100, cache=LocalCache())
+        rate_limiter.threads = set()
+        service = AsyncAmazonSEService(rate_limiter=rate_limiter)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(service.acquire())
+        finally:
+            loop.close()
+
+        self.assertEqual(len(rate_limiter.threads), 1)
+        self.assertNotIn(threading.current_thread(), rate_limiter.threads)
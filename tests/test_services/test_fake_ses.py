@@ -0,0 +1,125 @@
+from unittest import mock, skipIf
+
+from boto.ses.exceptions import SESDailyQuotaExceededError, SESMaxSendingRateExceededError
+from django.core.cache import cache
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.test import TestCase, override_settings
+
+from django_dodo import config
+from django_dodo.backends.backends import SESBackend
+from django_dodo.backends.rate_limit import LocalCache, TokenBucket
+from django_dodo.models import EmailStats
+from django_dodo.services import amazon_ses_async
+from django_dodo.services.amazon_ses import AmazonSEService
+from django_dodo.services.amazon_ses_async import AsyncAmazonSEService
+from django_dodo.services.fake_ses import FakeSES, FakeSESServer
+from tests.test_backends.test_rate_limit import FakeClock
+
+
+def get_messages(count):
+    messages = []
+    for i in range(count):
+        message = EmailMultiAlternatives('Subject', 'Body', 'from@example.com', ['to{}@example.com'.format(i)])
+        message.attach_alternative('<p>Body</p>', 'text/html')
+        messages.append(message)
+    return messages
+
+
+@override_settings(EMAIL_SERVICES_CLIENT_ID='id', EMAIL_SERVICES_CLIENT_KEY='key')
+class FakeSESTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        self.fake = FakeSES(max_send_rate=5, max_24h=8, clock=self.clock)
+
+    def test_connection_limits(self):
+        connection = self.fake.connect()
+        for _ in range(5):
+            connection.send_email('from@example.com', 'Subject', 'Body', ['to@example.com'])
+
+        with self.assertRaises(SESMaxSendingRateExceededError):
+            connection.send_email('from@example.com', 'Subject', 'Body', ['to@example.com'])
+
+        self.clock.sleep(1)
+        for _ in range(3):
+            connection.send_raw_email(b'Subject: x\n\nBody', 'from@example.com', ['to@example.com'])
+        with self.assertRaises(SESDailyQuotaExceededError):
+            connection.send_email('from@example.com', 'Subject', 'Body', ['to@example.com'])
+
+        quota = connection.get_send_quota()['GetSendQuotaResponse']['GetSendQuotaResult']
+        self.assertEqual(float(quota['SentLast24Hours']), 8)
+
+    def test_backend(self):
+        rate_limiter = TokenBucket(100, cache=LocalCache(clock=self.clock), clock=self.clock)
+        backend = SESBackend(connection_factory=self.fake.connect, rate_limiter=rate_limiter)
+        messages = get_messages(4) + [EmailMessage('Subject', 'Body', 'from@example.com', ['plain@example.com'])]
+
+        self.assertEqual(backend.send_messages(messages), 5)
+        self.assertEqual([message['Action'] for message in self.fake.messages], ['SendRawEmail'] * 4 + ['SendEmail'])
+
+    def test_update_send_stats(self):
+        connection = self.fake.connect()
+        for _ in range(3):
+            connection.send_email('from@example.com', 'Subject', 'Body', ['to@example.com'])
+
+        EmailStats.update_send_stats(SESBackend(connection_factory=self.fake.connect))
+
+        stats = EmailStats.get_latest()
+        self.assertEqual(stats.delivery_attempts, 3)
+        self.assertEqual(stats.sent_24h, 3)
+        self.assertEqual(stats.max_24h, 8)
+        self.assertEqual(stats.per_second_rate, 5)
+
+    def test_service_over_http(self):
+        with FakeSESServer(self.fake) as server, mock.patch.object(config, 'SES_ENDPOINT', server.endpoint):
+            service = AmazonSEService()
+            self.assertEqual(service.send_messages(get_messages(3)), 3)
+
+            service.create_template('dodo-1-1', 'Subject', '<p>{{user_email}}</p>', '{{user_email}}')
+            results = service.send_bulk_templated('from@example.com', 'dodo-1-1',
+                                                  [('a@example.com', {}), ('b@example.com', {})])
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual(self.fake.calls['SendRawEmail'], 3)
+        self.assertEqual(self.fake.sent_24h, 5)
+
+    def get_service(self):
+        rate_limiter = TokenBucket(100, cache=LocalCache(clock=self.clock), clock=self.clock)
+        return AmazonSEService(connection_factory=self.fake.connect, rate_limiter=rate_limiter)
+
+    def test_template_updated_on_release(self):
+        service = self.get_service()
+        service.create_template('dodo-1', 'Subject', '<p>{{user_email}}</p>', '{{user_email}}', version='1')
+        service.create_template('dodo-1', 'Subject', '<p>{{user_email}}</p>', '{{user_email}}', version='1')
+        service.create_template('dodo-1', 'Other', '<p>{{user_email}}</p>', '{{user_email}}', version='2')
+
+        self.assertEqual(self.fake.calls['CreateTemplate'], 2)
+        self.assertEqual(self.fake.calls['UpdateTemplate'], 1)
+        self.assertEqual(list(self.fake.templates), ['dodo-1'])
+        self.assertEqual(self.fake.templates['dodo-1']['Template.SubjectPart'], 'Other')
+
+    @mock.patch('django_dodo.backends.throttling.get_backoff', return_value=1)
+    def test_bulk_throttle_is_retried(self, get_backoff):
+        self.fake = FakeSES(max_send_rate=60, max_24h=1000, clock=self.clock)
+        service = self.get_service()
+        service.create_template('dodo-1', 'Subject', '<p>{{user_email}}</p>', '{{user_email}}')
+        destinations = [('user{}@example.com'.format(i), {}) for i in range(100)]
+
+        with mock.patch('django_dodo.backends.throttling.time.sleep', self.clock.sleep):
+            results = service.send_bulk_templated('from@example.com', 'dodo-1', destinations)
+
+        self.assertEqual(results, [True] * 100)
+        # The second call is throttled once, and the rate lowered
+        self.assertEqual(self.fake.calls['SendBulkTemplatedEmail'], 3)
+        self.assertLess(service.get_rate_limiter().rate, 100)
+
+    @skipIf(amazon_ses_async.aiohttp is None, 'aiohttp is not installed')
+    def test_async_service_over_http(self):
+        fake = FakeSES(max_send_rate=100)
+        rate_limiter = TokenBucket(100, cache=LocalCache())
+        with FakeSESServer(fake) as server:
+            service = AsyncAmazonSEService(endpoint=server.endpoint, rate_limiter=rate_limiter)
+            self.assertEqual(service.send_messages_sync(get_messages(20)), [True] * 20)
+
+        self.assertEqual(fake.calls['SendRawEmail'], 20)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from django_dodo.utils.concurrency import map_with_connections
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class MapWithConnectionsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.connections = []
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def connect(self):
+        connection = FakeConnection()
+        with self.lock:
+            self.connections.append(connection)
+        return connection
+
+    def send(self, connection, item):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        # The later items finish first
+        time.sleep(0.01 * (10 - item % 10))
+        with self.lock:
+            self.running -= 1
+        return item, connection
+
+    def test_results_in_input_order(self):
+        results = map_with_connections(self.send, list(range(20)), 4, self.connect)
+
+        self.assertEqual([item for item, connection in results], list(range(20)))
+
+    def test_concurrency(self):
+        results = map_with_connections(self.send, list(range(20)), 4, self.connect)
+
+        self.assertEqual(self.max_running, 4)
+        # One connection per thread, closed at the end
+        self.assertLessEqual(len(self.connections), 4)
+        self.assertEqual(set(connection for item, connection in results), set(self.connections))
+        self.assertTrue(all(connection.closed for connection in self.connections))
+
+    def test_fewer_items_than_threads(self):
+        map_with_connections(self.send, [1, 2], 8, self.connect)
+
+        self.assertLessEqual(self.max_running, 2)
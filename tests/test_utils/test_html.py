@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from django_dodo.utils.html import dedupe_style, get_byte_savings, optimize_html
+
+
+class OptimizeHtmlTestCase(TestCase):
+
+    def test_dedupe_style(self):
+        style = 'padding: 20px; font-size: 16px;; color: ; padding:  10px  5px; 20px'
+
+        self.assertEqual(dedupe_style(style), 'font-size:16px;padding:10px 5px')
+
+    def test_dedupe_style_keeps_important(self):
+        style = 'color: red !important; color: blue; margin: 0 ! important; margin: 1px !important'
+
+        self.assertEqual(dedupe_style(style), 'color:red !important;margin:1px !important')
+
+    def test_dedupe_style_keeps_quoted_semicolons(self):
+        style = "font-family: 'A;B', serif; background: url(data:image/png;base64,AAA=); color: red"
+
+        self.assertEqual(dedupe_style(style),
+                         "font-family:'A;B', serif;background:url(data:image/png;base64,AAA=);color:red")
+
+    def test_optimizes_single_quoted_styles(self):
+        html = '<td style=\'color: red; color: blue\' data-style="a; a">' \
+               '<p style="font-family: \'Helvetica\'; color: red;;">x</p></td>'
+
+        self.assertEqual(optimize_html(html), '<td style=\'color:blue\' data-style="a; a">'
+                                              '<p style="font-family:\'Helvetica\';color:red">x</p></td>')
+
+    def test_strips_comments_but_keeps_conditional_comments(self):
+        html = '<!-- note --><!--[if mso]><table><![endif]--><!--[if !mso]><!--><div></div><!--<![endif]-->'
+
+        self.assertEqual(optimize_html(html),
+                         '<!--[if mso]><table><![endif]--><!--[if !mso]><!--><div></div><!--<![endif]-->')
+
+    def test_collapses_whitespace_outside_pre(self):
+        html = '<table>\n    <tr>\n        <td>Hi   there</td>\n    </tr>\n</table>\n<pre>  keep\n    this</pre>'
+
+        optimized = optimize_html(html)
+
+        self.assertEqual(optimized, '<table>\n<tr>\n<td>Hi there</td>\n</tr>\n</table>\n<pre>  keep\n    this</pre>')
+        self.assertEqual(get_byte_savings(html, optimized), (len(html) - len(optimized), len(html)))
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase, override_settings
+
+from django_dodo import config
+from django_dodo.utils import metrics
+
+
+class MetricsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_timer_email_type(self):
+        with metrics.email_type('PR'):
+            with metrics.timer('render'):
+                pass
+            with metrics.email_type('WE'):
+                metrics.increment('sent')
+            metrics.increment('sent', 2)
+        metrics.increment('failed')
+
+        self.assertEqual(metrics.registry.histograms[('render', 'PR')].count, 1)
+        self.assertEqual(dict(metrics.registry.counters), {('sent', 'WE'): 1, ('sent', 'PR'): 2, ('failed', ''): 1})
+
+    def test_render_prometheus(self):
+        metrics.registry.observe('render', 0.003, email_type='PR')
+        metrics.registry.observe('render', 20, email_type='PR')
+        metrics.increment('sent', email_type='PR')
+        text = metrics.render_prometheus()
+
+        self.assertIn('# TYPE dodo_stage_seconds histogram', text)
+        self.assertIn('dodo_stage_seconds_bucket{stage="render",email_type="PR",le="0.0025"} 0', text)
+        self.assertIn('dodo_stage_seconds_bucket{stage="render",email_type="PR",le="0.005"} 1', text)
+        self.assertIn('dodo_stage_seconds_bucket{stage="render",email_type="PR",le="+Inf"} 2', text)
+        self.assertIn('dodo_stage_seconds_count{stage="render",email_type="PR"} 2', text)
+        self.assertIn('dodo_events_total{event="sent",email_type="PR"} 1', text)
+
+    def test_hook(self):
+        calls = []
+        metrics.registry.add_hook(lambda *args: calls.append(args))
+        self.addCleanup(metrics.registry.hooks.pop)
+        metrics.increment('throttled', email_type='NE')
+
+        self.assertEqual(calls, [('counter', 'throttled', 'NE', 1)])
+
+    def test_disabled(self):
+        with mock.patch.object(config, 'METRICS', False):
+            with metrics.timer('render'):
+                pass
+            metrics.increment('sent')
+
+        self.assertFalse(metrics.registry.histograms)
+        self.assertFalse(metrics.registry.counters)
+
+    @override_settings(ROOT_URLCONF='django_dodo.urls')
+    def test_view(self):
+        metrics.increment('sent', email_type='PR')
+        # Not served without a token
+        self.assertEqual(self.client.get(reverse('dodo-metrics')).status_code, 404)
+        with mock.patch.object(config, 'METRICS_TOKEN', 'secret'):
+            self.assertEqual(self.client.get(reverse('dodo-metrics')).status_code, 403)
+            response = self.client.get(reverse('dodo-metrics'), HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'dodo_events_total{event="sent",email_type="PR"} 1', response.content)
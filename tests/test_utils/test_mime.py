@@ -0,0 +1,35 @@
+import email
+
+from django.test import SimpleTestCase
+
+from django_dodo.email import build_mail, build_mass_mail
+from django_dodo.utils.mime import get_raw_message
+
+
+class MessageSkeletonTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.recipients = ['jane@example.com', 'Zo\xeb <zoe@example.com>']
+        self.email_messages = build_mass_mail('Hello', 'Text body', self.recipients, html_body='<p>Hello</p>',
+                                              unsubscribe_urls={'jane@example.com': 'https://example.com/u/1'})
+
+    def test_recipient_headers(self):
+        messages = [email.message_from_bytes(get_raw_message(message)) for message in self.email_messages]
+
+        self.assertEqual(messages[0]['To'], 'jane@example.com')
+        self.assertIn('zoe@example.com', messages[1]['To'])
+        self.assertEqual(messages[0]['List-Unsubscribe'], '<https://example.com/u/1>')
+        self.assertIsNone(messages[1]['List-Unsubscribe'])
+        self.assertNotEqual(messages[0]['Message-ID'], messages[1]['Message-ID'])
+        self.assertEqual(len(messages[0].get_all('To')), 1)
+
+    def test_matches_full_build(self):
+        raw = email.message_from_bytes(get_raw_message(self.email_messages[0]))
+        full = email.message_from_bytes(build_mail('Hello', 'Text body', 'jane@example.com',
+                                                   html_body='<p>Hello</p>').message().as_bytes())
+
+        self.assertEqual(raw['Subject'], full['Subject'])
+        self.assertEqual([part.get_content_type() for part in raw.walk()],
+                         [part.get_content_type() for part in full.walk()])
+        self.assertEqual([part.get_payload(decode=True) for part in raw.walk()][1:],
+                         [part.get_payload(decode=True) for part in full.walk()][1:])
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from django_dodo.utils.scheduling import DAY_SECONDS, plan_campaign
+
+NOW = datetime(2018, 1, 1)
+
+
+class PlanCampaignTestCase(SimpleTestCase):
+
+    def test_within_quota(self):
+        plan = plan_campaign([100, 100, 50], max_24h=10000, sent_24h=0, send_rate=10, now=NOW)
+
+        self.assertEqual(plan.etas, [NOW, NOW + timedelta(seconds=10), NOW + timedelta(seconds=20)])
+        self.assertEqual(plan.completion, NOW + timedelta(seconds=25))
+
+    def test_waits_for_quota(self):
+        # 100 left today, and the window frees up one per second
+        plan = plan_campaign([100, 100], max_24h=DAY_SECONDS, sent_24h=DAY_SECONDS - 100, send_rate=100, now=NOW)
+
+        self.assertEqual(plan.etas[0], NOW)
+        # Sending the first chunk takes 1s, the second chunk waits 100s for its quota
+        self.assertEqual(plan.etas[1], NOW + timedelta(seconds=101))
+        self.assertEqual(plan.completion, NOW + timedelta(seconds=102))
+
+    def test_reserve_is_kept(self):
+        plan = plan_campaign([10], max_24h=DAY_SECONDS, sent_24h=DAY_SECONDS - 100, send_rate=10, now=NOW, reserve=100)
+
+        self.assertEqual(plan.etas[0], NOW + timedelta(seconds=10 * DAY_SECONDS / (DAY_SECONDS - 100)))
+
+    def test_no_quota_for_campaigns(self):
+        with self.assertRaises(ValueError):
+            plan_campaign([10], max_24h=100, sent_24h=0, send_rate=10, now=NOW, reserve=100)
+
+    def test_no_send_rate(self):
+        with self.assertRaises(ValueError):
+            plan_campaign([10], max_24h=100, sent_24h=0, send_rate=0, now=NOW)
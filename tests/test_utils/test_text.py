@@ -0,0 +1,23 @@
+from django.test import TestCase
+
+from django_dodo.utils.text import html_to_text
+
+
+class HtmlToTextTestCase(TestCase):
+
+    def test_html_to_text(self):
+        html = ('<html><head><title>Title</title><style>td {color: red;}</style></head><body>'
+                '<div style="display: none;">Pre-header</div>'
+                '<table><tr><td>Hi { USER_FIRST_NAME },<br>welcome &amp; enjoy</td></tr></table>'
+                '<p>See <a href="{ PROFILE_URL }">your profile</a> <img src="logo.png" alt="Logo"></p>'
+                '</body></html>')
+
+        self.assertEqual(html_to_text(html),
+                         'Hi { USER_FIRST_NAME },\nwelcome & enjoy\n\nSee your profile ({ PROFILE_URL }) Logo\n')
+
+    def test_hidden_void_elements(self):
+        html = ('<p>Hello</p><img src="t.gif" style="display:none"><p>Important body</p>'
+                '<p>One<br hidden/>two<img src="t.gif" style="display: none"/><hr hidden>three</p>'
+                '<div hidden>Hidden</div><p>Last</p>')
+
+        self.assertEqual(html_to_text(html), 'Hello\n\nImportant body\n\nOne two three\n\nLast\n')
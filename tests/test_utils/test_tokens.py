@@ -1,7 +1,7 @@
 from unittest.mock import Mock
 from django.test import TestCase
 
-from django_pigeon.tokens import Tokens
+from django_dodo.utils.tokens import Tokens, TokenReplacer, USER_TOKENS
 
 
 class TokensTestCase(TestCase):
@@ -21,3 +21,23 @@ class TokensTestCase(TestCase):
         self.assertNotIn('ACTIVATION_URL', clean_text)
         self.assertIn(self.context['activation_url'], clean_text)
 
+    def test_replace_tokens_does_not_change_context(self):
+        self.context['activation_url'] = '/activation/test/code'
+
+        Tokens.replace_tokens(self.context, 'Here is a dirty link <a href="{ ACTIVATION_URL }">Dirty</a>')
+
+        self.assertEqual(self.context['activation_url'], '/activation/test/code')
+
+    def test_replace_tokens_user_tokens(self):
+        self.context.update({'user_first_name': 'Jane', 'user_full_name': 'Jane Doe'})
+
+        dirty_text = 'Hi { USER_FIRST_NAME }! Or is it { USER_FULL_NAME }? { SENDER_FIRST_NAME } says hi.'
+        clean_text = Tokens.replace_tokens(self.context, dirty_text)
+
+        self.assertEqual(clean_text, 'Hi Jane! Or is it Jane Doe? { SENDER_FIRST_NAME } says hi.')
+
+    def test_token_replacer_is_immutable(self):
+        replacer = TokenReplacer(USER_TOKENS)
+
+        with self.assertRaises(AttributeError):
+            replacer.token_dict = {}